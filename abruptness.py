@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" abruptness.py
+
+Vectorized computation of the abruptness of detected edges. For every edge pixel a
+linear regression is fitted to a chunk of the time series before and after the edge.
+The abruptness is the jump between the two intercepts (at the time of the edge),
+divided by the mean standard deviation of both chunks.
+"""
+# ---------------------------------------------------------------------------
+import numpy as np
+
+
+def _chunk_bounds(index, n_time, cutoff_length, chunk_max_length):
+    """Start and end (exclusive) time indices of the chunks before and after each
+    event, following the slicing of data[0:index-cutoff_length] and
+    data[index+cutoff_length+1:] in the original per-pixel loop.
+    """
+    # a negative stop of a python slice counts from the end of the time series
+    end1 = index - cutoff_length
+    end1 = np.where(end1 < 0, np.maximum(n_time + end1, 0), end1)
+    start1 = np.maximum(end1 - chunk_max_length, 0)
+
+    start2 = np.minimum(index + cutoff_length + 1, n_time)
+    end2 = np.minimum(start2 + chunk_max_length, n_time)
+    return start1, end1, start2, end2
+
+
+def _fit_chunks(data, years, time_ind, lat_ind, lon_ind, start, end, length):
+    """Least-squares fit of all chunks [start, end) at once, with the time axis
+    relative to the year of the event (same as scipy.stats.linregress).
+
+    Returns:
+        intercept, std (tuple of np.ndarray): intercept of the regression line and
+            the standard deviation of the data of every chunk
+    """
+    offset = np.arange(length)
+    ind = start[:, None] + offset[None, :]
+    valid = ind < end[:, None]
+    ind = np.where(valid, ind, 0)
+    n = valid.sum(axis=1)
+
+    x = np.where(valid, years[ind] - years[time_ind][:, None], 0.0)
+    y = np.where(valid, data[ind, lat_ind[:, None], lon_ind[:, None]], 0.0)
+
+    x_mean = x.sum(axis=1) / n
+    y_mean = y.sum(axis=1) / n
+    dx = np.where(valid, x - x_mean[:, None], 0.0)
+    dy = np.where(valid, y - y_mean[:, None], 0.0)
+
+    slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    intercept = y_mean - slope * x_mean
+    std = np.sqrt((dy * dy).sum(axis=1) / n)
+    return intercept, std
+
+
+def compute_abruptness(
+        mask, data, years, cutoff_length=2, chunk_max_length=30, chunk_min_length=15,
+        batch_size=100000):
+    """Compute the abruptness of all edge pixels in mask at once
+
+    Args:
+        mask (np.ndarray): boolean array (time, lat, lon) of detected edges
+        data (np.ndarray): (masked) data array of the same shape as mask
+        years (np.ndarray): time coordinate (e.g. year) of every time step
+    Optional:
+        cutoff_length (int): how many time steps to either side of the abrupt shift
+            are cut off (the index of the event itself is always cut off)
+        chunk_max_length (int): maximum length of chunk of time series to either
+            side of the event
+        chunk_min_length (int): minimum length of these chunks. Events with a shorter
+            chunk on either side get an abruptness of zero
+        batch_size (int): number of edge pixels processed at once, bounds the memory
+            of the intermediate (batch_size, chunk_max_length) arrays
+
+    Returns:
+        abruptness3d (np.ndarray): array of the same shape as mask, containing the
+            abruptness at each edge pixel and zero elsewhere
+    """
+    data = np.ma.getdata(data)
+    years = np.asarray(years, dtype=float)
+    n_time = data.shape[0]
+
+    abruptness3d = np.zeros(mask.shape, dtype=float)
+    time_ind, lat_ind, lon_ind = np.nonzero(mask)
+
+    for first in range(0, time_ind.size, batch_size):
+        batch = slice(first, first + batch_size)
+        t, lat, lon = time_ind[batch], lat_ind[batch], lon_ind[batch]
+
+        start1, end1, start2, end2 = _chunk_bounds(
+            t, n_time, cutoff_length, chunk_max_length
+        )
+        long_enough = (
+            (end1 - start1 >= chunk_min_length) & (end2 - start2 >= chunk_min_length)
+        )
+        if not long_enough.any():
+            continue
+        t, lat, lon = t[long_enough], lat[long_enough], lon[long_enough]
+        start1, end1 = start1[long_enough], end1[long_enough]
+        start2, end2 = start2[long_enough], end2[long_enough]
+
+        intercept1, std1 = _fit_chunks(
+            data, years, t, lat, lon, start1, end1, chunk_max_length
+        )
+        intercept2, std2 = _fit_chunks(
+            data, years, t, lat, lon, start2, end2, chunk_max_length
+        )
+
+        mean_std = (std1 + std2) / 2
+        abruptness3d[t, lat, lon] = np.abs(intercept1 - intercept2) / mean_std
+
+    return abruptness3d
+
+
+def event_summary(mask, abruptness3d, years):
+    """Summarise the detected events at every grid cell in a single reduction over
+    the edge pixels, without building any dense (time, lat, lon) intermediates
+
+    Args:
+        mask (np.ndarray): boolean array (time, lat, lon) of detected edges
+        abruptness3d (np.ndarray): abruptness at each edge pixel (see
+            compute_abruptness)
+        years (np.ndarray): time coordinate (e.g. year) of every time step
+
+    Returns:
+        summary (dict): arrays of shape (lat, lon) with
+            "abruptness": maximum abruptness at each grid cell,
+            "time_index": time index of the maximum abruptness (-1 if none),
+            "year": year of the maximum abruptness (0 if none),
+            "count": number of edge pixels (events) at each grid cell
+    """
+    n_lat, n_lon = mask.shape[1:]
+    years = np.asarray(years)
+    time_ind, lat_ind, lon_ind = np.nonzero(mask)
+    cell = lat_ind * n_lon + lon_ind
+    value = abruptness3d[time_ind, lat_ind, lon_ind]
+
+    count = np.bincount(cell, minlength=n_lat * n_lon)
+
+    # sort by grid cell, then by decreasing abruptness, then by time, such that the
+    # first entry of every grid cell is its (earliest) maximum
+    order = np.lexsort((time_ind, -value, cell))
+    cell_max, first = np.unique(cell[order], return_index=True)
+    value_max = value[order][first]
+    time_max = time_ind[order][first]
+
+    # only cells with a positive abruptness have a peak
+    peak = value_max > 0
+    cell_max, value_max, time_max = cell_max[peak], value_max[peak], time_max[peak]
+
+    abruptness = np.zeros(n_lat * n_lon, dtype=float)
+    abruptness[cell_max] = value_max
+    time_index = np.full(n_lat * n_lon, -1, dtype=int)
+    time_index[cell_max] = time_max
+    year = np.zeros(n_lat * n_lon, dtype=years.dtype)
+    year[cell_max] = years[time_max]
+
+    return {
+        "abruptness": abruptness.reshape(n_lat, n_lon),
+        "time_index": time_index.reshape(n_lat, n_lon),
+        "year": year.reshape(n_lat, n_lon),
+        "count": count.reshape(n_lat, n_lon)
+    }
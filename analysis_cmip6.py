@@ -20,27 +20,61 @@ import matplotlib
 import numpy as np
 
 import netCDF4
-from scipy import ndimage, stats
-import xarray as xr
-
-from hyper_canny import cp_edge_thinning, cp_double_threshold
 
 from hypercc.data.box import Box
 from hypercc.data.data_set import DataSet
 from hypercc.units import unit
-from hypercc.plotting import (
-    plot_mollweide, plot_orthographic_np, plot_plate_carree, earth_plot,
-    plot_signal_histogram)
-from hypercc.filters import (taper_masked_area, gaussian_filter, sobel_filter)
+from hypercc.plotting import (plot_plate_carree, earth_plot, plot_signal_histogram)
 from hypercc.calibration import (calibrate_sobel)
 
+from abruptness import event_summary
+from components import component_statistics, print_component_table
+from control_cache import ControlCache
+from coordinates import alias_coordinates
+from gradients import sobel_gradients, physical_gradient
+from figures import FigureRenderer
+from gradient_plots import plot_gradient_density
+from pipeline import edge_detection_graph, precision_check, smooth, taper
+from selection import read_selection
+from store import find_piControl, rebuild_index
+
 DIR_DATA = os.path.join("/nethome", "terps020", "cmip6", "data")
 DIR_FIG = os.path.join("/nethome", "terps020", "cmip6", "figures")
+DIR_CACHE = os.path.join("/nethome", "terps020", "cmip6", "cache")
+
+# whether the smoothed piControl data is also stored in the cache (large)
+CACHE_SMOOTH_CONTROL = False
+
+# data type of the whole edge detection pipeline. float64 gives the same results as
+# before, np.float32 (opt-in) halves the memory, see tests/test_precision.py for the
+# comparison of the edges and abruptness
+DTYPE = np.float64
+
+# whether to compare the gradients of a float32 DTYPE pipeline to float64 at run
+# time (slow, the data is read again in float64)
+CHECK_PRECISION = False
+
+# smoothing over continental boundaries: "iterative" (taper_masked_area of hypercc)
+# or "nearest" (single pass from the nearest valid grid cells, tapering.py, opt-in;
+# see tests/test_tapering.py for the comparison)
+TAPER_METHOD = "iterative"
+
+# number of threads of the Gaussian smoothing (smoothing.gaussian_smooth, hypercc's
+# gaussian_filter on bands of time steps), 1 runs serially. The result does not
+# depend on the number of threads
+SMOOTH_WORKERS = 1
+
+# maps are rendered in a batch by this many worker processes (1 renders serially in
+# this process, the batch runner already runs an analysis per core), as "pdf" or as
+# "png" (cheaper raster output)
+PLOT_WORKERS = 1
+PLOT_FORMAT = "pdf"
 
 
 def maybe_convert_lon_lat(fname):
-    """Assume that if fname starts with 'converted', lon and lat are already converted
-    to correct format
+    """Make sure fname has lat and lon coordinates. Files with x and y coordinates get
+    lat and lon as extra coordinate variables (x and y are kept, see coordinates.py)
+    instead of being copied
 
     Args:
         fname (str): fname without path specified
@@ -49,32 +83,38 @@ def maybe_convert_lon_lat(fname):
         fpath, fname (tuple): absolute path to file and file name
     """
     fpath = os.path.join(DIR_DATA, fname)
-    if fname.startswith("converted"):
-        return fpath, fname
-    ds_disk = xr.open_dataset(fpath)
-    ds_disk["lat"] = ds_disk.y
-    ds_disk["lon"] = ds_disk.x
-    fname = ".".join(["converted", fname])
-    fpath = os.path.join(
-        DIR_DATA,
-        "converted.CMIP.NOAA-GFDL.GFDL-ESM4.piControl.r1i1p1f1.SImon.siconc.gr.nc"
-    )
-    ds_disk.to_netcdf(fpath)
+    alias_coordinates(fpath)
     return fpath, fname
 
 
-if __name__ == '__main__':
-    variable = "tas"      # variable from CMIP6
-    model = "IPSL.IPSL-CM6A-LR"      # CMIP6 model
-    month = 13
-    fname = "CMIP.IPSL.IPSL-CM6A-LR.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+def analyse_cmip6(
+        fname, fname_piControl, variable, month=13, dir_fig=DIR_FIG,
+        smooth_workers=SMOOTH_WORKERS, plot_workers=PLOT_WORKERS):
+    """Run the edge detection on a single scenario file, calibrated on its piControl
+
+    Args:
+        fname (str): file name of the scenario in DIR_DATA, e.g.
+            "CMIP.IPSL.IPSL-CM6A-LR.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+        fname_piControl (str): file name of the associated piControl in DIR_DATA
+        variable (str): variable from CMIP6
+    Optional:
+        month (int or str): which month should be selected for the yearly time
+            series (1-12; 13 is annual mean; or a season, e.g. "DJF")
+        dir_fig (str): directory to save the figures in
+        smooth_workers (int): number of threads of the Gaussian smoothing, see
+            SMOOTH_WORKERS
+        plot_workers (int): number of processes rendering the maps, see PLOT_WORKERS
+    """
     fpath = os.path.join(DIR_DATA, fname)
-    fname_piControl = "CMIP.IPSL.IPSL-CM6A-LR.piControl.r1i1p1f1.Amon.tas.gr.nc"
     fpath_piControl = os.path.join(DIR_DATA, fname_piControl)
+    if not os.path.isdir(dir_fig):
+        os.makedirs(dir_fig)
     # fpath, fname = maybe_convert_lon_lat(fname)
     print("Using {}\n".format(fname))
 
-    # download dataset (check how the [month-1::12] selection exactly works)
+    # only the selected month (or the months of the annual or seasonal mean) is read
+    # from the file, the box gets one time step per year
+    data, time_slice = read_selection(fpath, variable, month, dtype=DTYPE)
     data_set = DataSet.cmip6(
         path=Path(fpath),
         variable=variable
@@ -82,7 +122,7 @@ if __name__ == '__main__':
 
     # print(data_set)
 
-    data_set = data_set[month-1::12]
+    data_set = data_set[time_slice]
 
     #data = data_set.files[0].data
     #print("\n\nPrinting data...\n")
@@ -96,16 +136,12 @@ if __name__ == '__main__':
     # print(box)
 
     if not box.rectangular:
-        print("box not rectangular")
-        exit(-1)
+        raise RuntimeError("box not rectangular")
 
     # calibration of the aspect ratio is based on which quartile of the gradients
     # for climate models, use 3, for idealised test cases, use 4
     quartile_calibration=3
 
-    # which month should be selected for the yearly time series (1-12; 13 is annual mean)
-    month = 13
-
     ## smoothing scales
     sigma_d = unit('100 km')     # space
     sigma_t = unit('10 year')    # time
@@ -127,12 +163,10 @@ if __name__ == '__main__':
 
     # check if box is rectangular
     if not box.rectangular:
-        print("Box is not rectangular. Stopping program...")
-        exit(-1)
+        raise RuntimeError("Box is not rectangular. Stopping program...")
 
-    # smooth over continental boundaries (only spatial, not time dimension)
-    data = data_set.data
-    yearly_box = box[month-1::12]
+    # the box already has one time step per year (see selection.selection_slice)
+    yearly_box = box
     #print("\n\nPrinting data.data...\n")
     #data = data_set.files[0].data.variables["tas"]
     #print(data_set.files[0].data.variables["tas"])
@@ -152,221 +186,235 @@ if __name__ == '__main__':
     #masked_data = masked_data.squeeze()
     #print(masked_data)
     #masked_data = np.ma.masked_array(masked_data)
-    taper_masked_area(data, [0, 5, 5], 50)
-
-    # smoothing is not applied in time, 5 grid boxes wide in space (lat and lon),
-    # iteration: 50 times
-    smooth_data = gaussian_filter(box, data, [sigma_t, sigma_d, sigma_d])
 
     # calibration
-    control_set = DataSet.cmip6(
-        path=Path(fpath_piControl),
-        variable=variable
-    )[month-1::12]
-    control_data = control_set.data
-    control_box = control_set.box
-    del control_set
-
-    # smooth over continental boundaries to avoid detecting edges at the coastlines
-    taper_masked_area(control_data, [0, 5, 5], 50)
-    smooth_control_data = gaussian_filter(control_box, control_data, [sigma_t, sigma_d, sigma_d])
-
-    # scaling_factor is the aspect ratio between space and time
-    # Here it is initialised as 1, but will be calibrated automatically later
-    print("# WARNING: scaling_factor for Sobel operator is not calibrated...")
-    scaling_factor = unit('1 km/year')
+    # the piControl run is the same for all scenarios of a model, so the calibration
+    # is cached and only computed for the first scenario
     sobel_delta_t = unit('1 year')                    # time scale
-    sobel_delta_d = sobel_delta_t * scaling_factor    # length scale
-    sobel_weights = [sobel_delta_t, sobel_delta_d, sobel_delta_d]
-
-    calibration = calibrate_sobel(
-        quartile_calibration, control_box, smooth_control_data, sobel_delta_t,
-        sobel_delta_d
+    control_cache = ControlCache(DIR_CACHE)
+    cache_key = control_cache.key(
+        fpath_piControl, variable, month, sigma_t, sigma_d, quartile_calibration,
+        taper_method=TAPER_METHOD, dtype=DTYPE
     )
+    cached_control = control_cache.load(cache_key)
+    if cached_control is not None:
+        print("Using cached piControl calibration...")
+        calibration = cached_control["calibration"]
+        thresholds = cached_control["thresholds"]
+    else:
+        control_data, control_slice = read_selection(
+            fpath_piControl, variable, month, dtype=DTYPE
+        )
+        control_set = DataSet.cmip6(
+            path=Path(fpath_piControl),
+            variable=variable
+        )[control_slice]
+        control_box = control_set.box
+        del control_set
+
+        # smooth over continental boundaries to avoid detecting edges at the coastlines
+        control_data = taper(control_data, method=TAPER_METHOD, cache_dir=DIR_CACHE)
+        smooth_control_data = smooth(
+            control_box, control_data, [sigma_t, sigma_d, sigma_d], workers=smooth_workers
+        )
+
+        # scaling_factor is the aspect ratio between space and time
+        # Here it is initialised as 1, but will be calibrated automatically later
+        print("# WARNING: scaling_factor for Sobel operator is not calibrated...")
+        scaling_factor = unit('1 km/year')
+        sobel_delta_d = sobel_delta_t * scaling_factor    # length scale
+        sobel_weights = [sobel_delta_t, sobel_delta_d, sobel_delta_d]
+
+        calibration = calibrate_sobel(
+            quartile_calibration, control_box, smooth_control_data, sobel_delta_t,
+            sobel_delta_d
+        )
+
+        for k, v in calibration.items():
+            print("{:10}: {}".format(k, v))
+        print("recommended setting for gamma: ", calibration['gamma'][quartile_calibration])
+
+        sb_control = sobel_gradients(control_box, smooth_control_data, sobel_weights)
+        signal_control = (1.0 / sb_control[3])
+
+        gamma_cal = calibration['gamma'][quartile_calibration]   #default in hypercc: 3
+
+        ## gradients in physical units
+        # space gradient in K / km
+        sgrad_phys = np.sqrt(
+            (physical_gradient(control_box, sb_control, sobel_weights, axis=(1, 2))**2).sum(axis=0)
+        )
+
+        # time gradient in K / year
+        tgrad = physical_gradient(control_box, sb_control, sobel_weights, axis=0)
+
+        ##### density diagram of gradients in piControl
+        #### set axis ranges
+        border=0.15
+        Smin=np.min(sgrad_phys)-(np.max(sgrad_phys)-np.min(sgrad_phys))*border
+        Smax=np.max(sgrad_phys)+(np.max(sgrad_phys)-np.min(sgrad_phys))*border
+        #Tmin=np.min(tgrad)-(np.max(tgrad)-np.min(tgrad))*border
+        #Tmax=np.max(tgrad)+(np.max(tgrad)-np.min(tgrad))*border
+
+        # for MPI-ESM temperature case
+        #Smin=-0.01
+        #Smax=0.6
+        Tmin=-0.6
+        Tmax=0.6
+
+        ## 2d histogram of gradients in space and time:
+        fig, ax = plot_gradient_density(sgrad_phys, tgrad, (Smin, Smax), (Tmin, Tmax))
+
+        plt.xlabel('K / km', fontsize=32)
+        plt.ylabel('K / yr', fontsize=32)
+
+        plt.tick_params(axis='both', which='major', labelsize=32)
+
+        ## max space gradient (4th quartile)
+        plt.axvline(x=np.max(sgrad_phys), ymin=0, ymax=1, color='r', linestyle="-")
+
+        ## max time gradient
+        plt.axhline(xmin=0, xmax=1, y=np.max(np.abs(tgrad)), color='r', linestyle="-")
+        plt.axhline(xmin=0, xmax=1, y=-np.max(np.abs(tgrad)), color='r', linestyle="-")
+
+        # selected quartile
+        plt.axvline(x=calibration['distance'][quartile_calibration], ymin=0, ymax=1, color='g', linestyle="--")
+        plt.axhline(xmin=0, xmax=1, y=calibration['time'][quartile_calibration], color='g', linestyle="--")
+        plt.axhline(xmin=0, xmax=1, y=-calibration['time'][quartile_calibration], color='g', linestyle="--")
+        fig.savefig(os.path.join(dir_fig, "gradients_piControl") + ".pdf", dpi=300, format="pdf")
+
+        ## defining the threshold parameters for hysteresis thresholding:
+        # each pixel with a the gradient above the upper threshold is labeled as a strong edge.
+        # each pixel that is above the lower threshold is labeled as a weak edge.
+        # all strong edges are kept as edges.
+        # all weak edges that are connected to strong edges are kept as edges, the others are dropped.
+
+        # set upper threshold as the combination of the maxima of gradients in space and time
+        mag_quartiles=np.sqrt((calibration['distance'] * gamma_cal)**2 + calibration['time']**2)
+        upper_threshold = mag_quartiles[4]
+
+        # set lower threshold to be half the upper threshold
+        lower_threshold = upper_threshold/2
+
+        ## equivalent space gradient in °C / yr (scaling_factor is in kilometer/year)
+        sgrad_scaled = sgrad_phys * gamma_cal                   # K/km * km/yr => K/yr
+
+        ##### density diagram of gradients in piControl as calibrated units
+
+        #matplotlib.rcParams['figure.figsize'] = (20, 20)
+        #matplotlib.rcParams.update({'font.size': 40})
+        matplotlib.rc('xtick', labelsize=32)
+        matplotlib.rc('ytick', labelsize=32)
+        plt.tick_params(axis='both', which='major', labelsize=32)
+
+        #### set axis ranges (adjusted to the specific example of MPI-ESM, temp, mon 4)
+        Smin=-0.01
+        Smax=0.6
+        Tmin=-0.6
+        Tmax=0.6
+
+        ## 2d histogram of gradients in space and time:
+        fig, ax = plot_gradient_density(sgrad_scaled, tgrad, (Smin, Smax), (Tmin, Tmax))
+
+        plt.xlabel('K / yr')
+        plt.ylabel('K / yr')
+
+        ## max space gradient (rescaled)
+        plt.axvline(x=np.max(sgrad_scaled), ymin=0, ymax=1, color='r', linestyle="-")
 
-    for k, v in calibration.items():
-        print("{:10}: {}".format(k, v))
-    print("recommended setting for gamma: ", calibration['gamma'][quartile_calibration])
-
-    sb_control = sobel_filter(control_box, smooth_control_data, weight=sobel_weights)
-    pixel_sb_control = sobel_filter(control_box, smooth_control_data, physical=False)
-    pixel_sb_control[3] = sb_control[3]
-    signal_control = (1.0 / sb_control[3])
-
-    gamma_cal = calibration['gamma'][quartile_calibration]   #default in hypercc: 3
-    scaling_factor = gamma_cal * unit('1 km/year')
-    sobel_delta_d = sobel_delta_t * scaling_factor
-    sobel_weights = [sobel_delta_t, sobel_delta_d, sobel_delta_d]
-
-    ## gradients in physical units
-    # space gradient in K / km
-    sgrad_phys = np.sqrt(sb_control[1]**2 + sb_control[2]**2) / sb_control[3]
-
-    # time gradient in K / year
-    tgrad = sb_control[0]/sb_control[3]
-
-    ##### scatter diagram of gradients in piControl
-    ## scatter plot of gradients in space and time:
-    fig = plt.figure()
-    plt.scatter(sgrad_phys, tgrad, s=0.1, marker = '.');
-
-    plt.xlabel('K / km', fontsize=32)
-    plt.ylabel('K / yr', fontsize=32)
-
-    plt.tick_params(axis='both', which='major', labelsize=32)
-
-    #### set axis ranges
-    border=0.15
-    Smin=np.min(sgrad_phys)-(np.max(sgrad_phys)-np.min(sgrad_phys))*border
-    Smax=np.max(sgrad_phys)+(np.max(sgrad_phys)-np.min(sgrad_phys))*border
-    #Tmin=np.min(tgrad)-(np.max(tgrad)-np.min(tgrad))*border
-    #Tmax=np.max(tgrad)+(np.max(tgrad)-np.min(tgrad))*border
-
-    # for MPI-ESM temperature case
-    #Smin=-0.01
-    #Smax=0.6
-    Tmin=-0.6
-    Tmax=0.6
-
-    plt.xlim(Smin, Smax)
-    plt.ylim(Tmin, Tmax)
-
-    ## max space gradient (4th quartile)
-    plt.axvline(x=np.max(sgrad_phys), ymin=0, ymax=1, color='r', linestyle="-")
-
-    ## max time gradient
-    plt.axhline(xmin=0, xmax=1, y=np.max(np.abs(tgrad)), color='r', linestyle="-")
-    plt.axhline(xmin=0, xmax=1, y=-np.max(np.abs(tgrad)), color='r', linestyle="-")
-
-    # selected quartile
-    plt.axvline(x=calibration['distance'][quartile_calibration], ymin=0, ymax=1, color='g', linestyle="--")
-    plt.axhline(xmin=0, xmax=1, y=calibration['time'][quartile_calibration], color='g', linestyle="--")
-    plt.axhline(xmin=0, xmax=1, y=-calibration['time'][quartile_calibration], color='g', linestyle="--")
-    fig.savefig(os.path.join(DIR_FIG, "gradients_piControl") + ".pdf", dpi=300, format="pdf")
-
-    ## defining the threshold parameters for hysteresis thresholding:
-    # each pixel with a the gradient above the upper threshold is labeled as a strong edge.
-    # each pixel that is above the lower threshold is labeled as a weak edge.
-    # all strong edges are kept as edges.
-    # all weak edges that are connected to strong edges are kept as edges, the others are dropped.
-
-    # set upper threshold as the combination of the maxima of gradients in space and time
-    mag_quartiles=np.sqrt((calibration['distance'] * gamma_cal)**2 + calibration['time']**2)
-    upper_threshold = mag_quartiles[4]
-
-    # set lower threshold to be half the upper threshold
-    lower_threshold = upper_threshold/2
-
-    ## equivalent space gradient in °C / yr (scaling_factor is in kilometer/year)
-    sgrad_scaled = sgrad_phys * gamma_cal                   # K/km * km/yr => K/yr
-
-    ##### scatter diagram of gradients in piControl as calibrated units
-
-    #matplotlib.rcParams['figure.figsize'] = (20, 20)
-    #matplotlib.rcParams.update({'font.size': 40})
-    matplotlib.rc('xtick', labelsize=32)
-    matplotlib.rc('ytick', labelsize=32)
-    plt.tick_params(axis='both', which='major', labelsize=32)
+        ## max time gradient
+        plt.axhline(xmin=0, xmax=1, y=np.max(np.abs(tgrad)), color='r', linestyle="-")
+        plt.axhline(xmin=0, xmax=1, y=-np.max(np.abs(tgrad)), color='r', linestyle="-")
 
-    ## scatter plot of gradients in space and time:
-    fig = plt.figure()
-    plt.scatter(sgrad_scaled, tgrad, s=0.1, marker = '.');
-
-    plt.xlabel('K / yr')
-    plt.ylabel('K / yr')
-
-    ## max space gradient (rescaled)
-    plt.axvline(x=np.max(sgrad_scaled), ymin=0, ymax=1, color='r', linestyle="-")
+        # quartiles
+        plt.axvline(x=calibration['distance'][quartile_calibration]*gamma_cal, ymin=0, ymax=1, color='g', linestyle="--")
+        plt.axhline(xmin=0, xmax=1, y=calibration['time'][quartile_calibration], color='g', linestyle="--")
+        plt.axhline(xmin=0, xmax=1, y=-calibration['time'][quartile_calibration], color='g', linestyle="--")
 
-    ## max time gradient
-    plt.axhline(xmin=0, xmax=1, y=np.max(np.abs(tgrad)), color='r', linestyle="-")
-    plt.axhline(xmin=0, xmax=1, y=-np.max(np.abs(tgrad)), color='r', linestyle="-")
 
-    # quartiles
-    plt.axvline(x=calibration['distance'][quartile_calibration]*gamma_cal, ymin=0, ymax=1, color='g', linestyle="--")
-    plt.axhline(xmin=0, xmax=1, y=calibration['time'][quartile_calibration], color='g', linestyle="--")
-    plt.axhline(xmin=0, xmax=1, y=-calibration['time'][quartile_calibration], color='g', linestyle="--")
+        #### circle showing the threshold values of hysteresis thresholding
+        dp = np.linspace(-np.pi/2, np.pi/2, 100)
 
+        radius=upper_threshold
+        dt = radius * np.sin(dp)
+        dx = radius * np.cos(dp)
+        plt.plot(dx, dt, c='k')
+
+        ## circle showing the lower threshold:
+        radius=lower_threshold
+        dt = radius * np.sin(dp)
+        dx = radius * np.cos(dp)
+        plt.plot(dx, dt, c='k')
 
-    #### circle showing the threshold values of hysteresis thresholding
-    dp = np.linspace(-np.pi/2, np.pi/2, 100)
+        plt.xlim(Smin, Smax)
+        plt.ylim(Tmin, Tmax)
+        fig.savefig(os.path.join(dir_fig, "gradients_piControl_calibrated_units") + ".pdf", dpi=300, format="pdf")
 
-    radius=upper_threshold
-    dt = radius * sin(dp)
-    dx = radius * cos(dp)
-    plt.plot(dx, dt, c='k')
+        thresholds = {"upper": upper_threshold, "lower": lower_threshold}
+        control_cache.store(
+            cache_key, calibration, thresholds,
+            smooth_data=smooth_control_data if CACHE_SMOOTH_CONTROL else None
+        )
 
-    ## circle showing the lower threshold:
-    radius=lower_threshold
-    dt = radius * sin(dp)
-    dx = radius * cos(dp)
-    plt.plot(dx, dt, c='k')
-
-    #### set axis ranges (adjusted to the specific example of MPI-ESM, temp, mon 4)
-    Smin=-0.01
-    Smax=0.6
-    Tmin=-0.6
-    Tmax=0.6
-
-    plt.xlim(Smin, Smax)
-    plt.ylim(Tmin, Tmax)
-    fig.savefig(os.path.join(DIR_FIG, "gradients_piControl_calibrated_units") + ".pdf", dpi=300, format="pdf")
+    gamma_cal = calibration['gamma'][quartile_calibration]   #default in hypercc: 3
+    scaling_factor = gamma_cal * unit('1 km/year')
+    sobel_delta_d = sobel_delta_t * scaling_factor
+    sobel_weights = [sobel_delta_t, sobel_delta_d, sobel_delta_d]
 
-    sb = sobel_filter(box, smooth_data, weight=sobel_weights)
-    pixel_sb = sobel_filter(box, smooth_data, physical=False)
-    pixel_sb[3] = sb[3]
+    upper_threshold = thresholds["upper"]
+    lower_threshold = thresholds["lower"]
 
     # # Careful! Not calibrated!
     # print("# WARNING: hysteresis thresholds are not calibrated...")
     # upper_threshold = 0.6
     # lower_threshold = 0.3
 
-    # use directions of pixel based sobel transform and magnitudes from calibrated physical sobel.
-    dat = pixel_sb.transpose([3,2,1,0]).copy()
-    mask = cp_edge_thinning(dat)
-    thinned = mask.transpose([2, 1, 0])
-    dat = sb.transpose([3,2,1,0]).copy()
+    cutoff_length=2       # how many years to either side of the abrupt shift are cut off (the index of the event itself is always cut off)
+    chunk_max_length=30   # maximum length of chunk of time series to either side of the event
+    chunk_min_length=15   # minimum length of these chunks
 
-    thinned *= ~data.mask
-    thinned[:10] = 0
-    thinned[-10:] = 0
+    years = np.array([d.year for d in box.dates])
 
-    ## edge thinning
-    edges = cp_double_threshold(data=dat, mask=thinned.transpose([2,1,0]), a=1/upper_threshold, b=1/lower_threshold)
-    m = edges.transpose([2, 1, 0])
+    # edge detection as a graph of memoized stages:
+    # smooth over continental boundaries (only spatial, not time dimension, 5 grid boxes
+    # wide in space (lat and lon), iteration: 50 times), gaussian smoothing, sobel
+    # (directions of pixel based sobel transform and magnitudes from calibrated
+    # physical sobel), edge thinning, hysteresis thresholding, labelling and abruptness
+    graph = edge_detection_graph(
+        box, data, years, sigma_t, sigma_d, sobel_weights, upper_threshold,
+        lower_threshold, cutoff_length=cutoff_length, chunk_max_length=chunk_max_length,
+        chunk_min_length=chunk_min_length, cache_dir=DIR_CACHE, dtype=DTYPE,
+        smooth_workers=smooth_workers, taper_method=TAPER_METHOD
+    )
+    if CHECK_PRECISION and np.dtype(DTYPE) != np.float64:
+        passed, _ = precision_check(
+            box, read_selection(fpath, variable, month)[0], sigma_t, sigma_d, sobel_weights, dtype=DTYPE
+        )
+        if not passed:
+            print("# WARNING: {} gradients differ from float64...".format(np.dtype(DTYPE).name))
+    smooth_data = graph.get("smooth")
+    sb = graph.get("sobel")
+    m = graph.get("edges")
+
+    # maps are queued and rendered together at the end, the grid is projected only
+    # once per projection
+    renderer = FigureRenderer(box, fmt=PLOT_FORMAT, dpi=300, workers=plot_workers)
 
     ## a first look at the data (first time step)
-    fig = plot_mollweide(box, data_set.data[0])
-    fig.savefig(os.path.join(DIR_FIG, "data_time0_mollweide") + ".pdf", dpi=300, format="pdf")
-    fig = plot_orthographic_np(box, data_set.data[0])
-    fig.savefig(os.path.join(DIR_FIG, "data_time0orthographic_np") + ".pdf", dpi=300, format="pdf")
+    renderer.add(os.path.join(dir_fig, "data_time0_mollweide"), data[0], projection="mollweide")
+    renderer.add(os.path.join(dir_fig, "data_time0orthographic_np"), data[0])
 
     ## define colour scale for plotting with white where variable is 0
     my_cmap = matplotlib.cm.get_cmap('rainbow')
     matplotlib.rcParams['figure.figsize'] = (25,10)
     my_cmap.set_under('w')
 
-    ## count how many separate edges can be distinguished
-    # Here, result is one large event in the Arctic Ocean
-    # This occurs because it is the same sea ice edge that shifts in space over time.
-    labels, n_features = ndimage.label(m, ndimage.generate_binary_structure(3, 3))
-    print(n_features)
-    big_enough = [x for x in range(1, n_features+1) if (labels==x).sum() > 100]
-    print(big_enough)
-    labels = np.where(np.isin(labels, big_enough), labels, 0)
-    print(labels.max(axis=0))
-    print(np.sum(m, axis=0))
-    #plot_plate_carree(yearly_box, labels.max(axis=0), cmap=my_cmap, vmin=0.1)
-    fig = plot_orthographic_np(yearly_box, labels.max(axis=0), cmap=my_cmap, vmin=0.1)
-    fig.savefig(os.path.join(DIR_FIG, "labels_orthographic_np") + ".pdf", dpi=300, format="pdf")
-
     ## event count plot: how many years are part of the edge at each grid cell
     #plot_plate_carree(yearly_box, np.sum(m, axis=0), cmap=my_cmap, vmin=0.1)
-    fig = plot_orthographic_np(yearly_box, np.sum(m, axis=0), cmap=my_cmap, vmin=0.1)
-    fig.savefig(os.path.join(DIR_FIG, "event_count_ortographic_np") + ".pdf", dpi=300, format="pdf")
+    renderer.add(os.path.join(dir_fig, "event_count_ortographic_np"), np.sum(m, axis=0), cmap=my_cmap, vmin=0.1)
 
     ## calculate maximum excess time gradient at each grid cell (i.e. gradient after removing the mean trend)
-    tgrad=sb[0]/sb[3]
+    tgrad = physical_gradient(box, sb, sobel_weights, axis=0)
     maxm=np.nanmax(m, axis=0)
 
     tgrad_residual = tgrad - np.mean(tgrad, axis=0)   # remove time mean
@@ -374,93 +422,42 @@ if __name__ == '__main__':
     maxTgrad = maxTgrad * maxm
 
     #plot_plate_carree(box, maxTgrad, cmap=my_cmap, vmin=1e-30)
-    fig = plot_orthographic_np(box, maxTgrad, cmap=my_cmap, vmin=1e-30)
-    fig.savefig(os.path.join(DIR_FIG, "maxTgrad_ortographic_np") + ".pdf", dpi=300, format="pdf")
+    renderer.add(os.path.join(dir_fig, "maxTgrad_ortographic_np"), maxTgrad, cmap=my_cmap, vmin=1e-30)
 
-    cutoff_length=2       # how many years to either side of the abrupt shift are cut off (the index of the event itself is always cut off)
-    chunk_max_length=30   # maximum length of chunk of time series to either side of the event
-    chunk_min_length=15   # minimum length of these chunks
+    print(np.count_nonzero(m))
+    abruptness3d = graph.get("abruptness")
 
-    years = np.array([d.year for d in box.dates])
-    edges = cp_double_threshold(data=dat, mask=thinned.transpose([2,1,0]), a=1/upper_threshold, b=1/lower_threshold)
-    m = edges.transpose([2, 1, 0])
-    idx = np.where(m)
-    indices=np.asarray(idx)
-    abruptness3d=m*0.0
-
-    shapeidx=np.shape(idx)
-    nofresults=shapeidx[1]
-    print(nofresults)
-
-    for result in range(nofresults):
-        [dim0,dim1,dim2]=indices[:,result]
-
-        if m[dim0, dim1, dim2] == 1:
-            index=dim0
-            chunk1_data=data[0:index-cutoff_length,dim1,dim2]
-            chunk2_data=data[index+cutoff_length+1:,dim1,dim2]
-            chunk1_years=years[0:index-cutoff_length]
-            chunk2_years=years[index+cutoff_length+1:]
-
-            if np.size(chunk1_data) > chunk_max_length:
-                chunk1_start=np.size(chunk1_data)-chunk_max_length
-            else:
-                chunk1_start=0
-            if np.size(chunk2_data) > chunk_max_length:
-                chunk2_end=chunk_max_length
-            else:
-                chunk2_end=np.size(chunk2_data)
-
-            chunk1_data_short=chunk1_data[chunk1_start:]
-            chunk2_data_short=chunk2_data[0:chunk2_end]
-
-            N1=np.size(chunk1_data_short)
-            N2=np.size(chunk2_data_short)
-
-            if not ((N1 < chunk_min_length) or (N2 < chunk_min_length)):
-                chunk1_years_short=chunk1_years[chunk1_start:]-years[dim0]
-                chunk2_years_short=chunk2_years[0:chunk2_end]-years[dim0]
-
-                slope_chunk1, intercept_chunk1, r_value, p_value, std_err = stats.linregress(chunk1_years_short, chunk1_data_short)
-                chunk1_regline=intercept_chunk1 + slope_chunk1*chunk1_years_short
-
-                slope_chunk2, intercept_chunk2, r_value, p_value, std_err = stats.linregress(chunk2_years_short, chunk2_data_short)
-                chunk2_regline=intercept_chunk2 + slope_chunk2*chunk2_years_short
-
-                mean_std=(np.nanstd(chunk1_data_short)+np.nanstd(chunk2_data_short))/2
-                abruptness3d[dim0,dim1,dim2]=abs(intercept_chunk1-intercept_chunk2)/mean_std
-
-    abruptness = np.max(abruptness3d,axis=0)
+    # maximum abruptness, its year and the number of events at each grid cell
+    summary = event_summary(m, abruptness3d, years)
+    abruptness = summary["abruptness"]
     print(abruptness)
 
+    ## count how many separate edges can be distinguished
+    # Here, result is one large event in the Arctic Ocean
+    # This occurs because it is the same sea ice edge that shifts in space over time.
+    labels, n_features = graph.get("labels")
+    print(n_features)
+    # keep only events with more than 100 pixels, and tabulate their statistics
+    labels, events = component_statistics(labels, n_features, abruptness3d, size_threshold=100)
+    print(events["label"])
+    print_component_table(events)
+    print(labels.max(axis=0))
+    print(np.sum(m, axis=0))
+    #plot_plate_carree(yearly_box, labels.max(axis=0), cmap=my_cmap, vmin=0.1)
+    renderer.add(os.path.join(dir_fig, "labels_orthographic_np"), labels.max(axis=0), cmap=my_cmap, vmin=0.1)
+
     # map of the maximum abruptness at each point
     #plot_plate_carree(box, abruptness, cmap=my_cmap, vmin=1e-30)
-    fig = plot_orthographic_np(box, abruptness, cmap=my_cmap, vmin=1e-30)
-    fig.savefig(os.path.join(DIR_FIG, "abruptness_ortographic_np") + ".pdf", dpi=300, format="pdf")
+    renderer.add(os.path.join(dir_fig, "abruptness_ortographic_np"), abruptness, cmap=my_cmap, vmin=1e-30)
 
     ## year in which the maximum of abruptness occurs at each point
-    idx = np.where(m)
-    indices=np.asarray(idx)
-
-    mask_max=m*0
-
-    shapeidx=np.shape(idx)
-    nofresults=shapeidx[1]
-
-    # mask_max is like m but only shows the time points with the maximum abruptness at each grid cell
-    for result in range(nofresults):
-        [dim0,dim1,dim2]=indices[:,result]
-        if ( abruptness3d[dim0, dim1, dim2] == abruptness[dim1,dim2]) and abruptness[dim1,dim2] > 0:
-            mask_max[dim0, dim1, dim2] = 1
-
-
-    years_maxpeak=(years[:,None,None]*mask_max).sum(axis=0)
+    years_maxpeak = summary["year"]
 
     minval = np.min(years_maxpeak[np.nonzero(years_maxpeak)])
     maxval= np.max(years_maxpeak)
     #plot_plate_carree(yearly_box, years_maxpeak,  cmap=my_cmap, vmin=minval, vmax=maxval) #, vmin=2000, vmax=2200)
-    fig = plot_orthographic_np(yearly_box, years_maxpeak,  cmap=my_cmap, vmin=minval, vmax=maxval)
-    fig.savefig(os.path.join(DIR_FIG, "years_maxpeak_ortographic_np") + ".pdf", dpi=300, format="pdf")
+    renderer.add(os.path.join(dir_fig, "years_maxpeak_ortographic_np"), years_maxpeak, cmap=my_cmap, vmin=minval, vmax=maxval)
+    renderer.render()
 
     ## Show (part of) the time series of the original data at the grid cell with the largest abruptness
     # red: original data
@@ -482,9 +479,11 @@ if __name__ == '__main__':
     ax.plot(years_window, ts, 'k', years_window, ts_smooth, 'b--')
 
     ## determine year of abrupt shift
-    index=np.where(abruptness3d[:,latind,lonind]==abruptness_max)
+    index=summary["time_index"][latind,lonind]
 
-    ax.axvline(x=years_window[index], ymin=0, ymax=1, color='r', linestyle="--")
+    # -1 if no edge has a positive abruptness, years_window[-1] would be the last year
+    if index >= 0:
+        ax.axvline(x=years_window[index], ymin=0, ymax=1, color='r', linestyle="--")
 
     plt.ylabel('Sea-ice concentration (%)')
     plt.xlabel('Time [year]')
@@ -503,4 +502,24 @@ if __name__ == '__main__':
     ypos=ymax-0.025*yrange
     xpos=xmin+0.01*xrange
     ax.text(xpos,ypos,'abruptness: '+ '{:f}'.format(abruptness_max),color='r', size=30)
-    fig.savefig(os.path.join(DIR_FIG, "ts") + ".pdf", dpi=300, format="pdf")
+    fig.savefig(os.path.join(dir_fig, "ts") + ".pdf", dpi=300, format="pdf")
+
+    graph.report()
+
+
+if __name__ == '__main__':
+    variable = "tas"      # variable from CMIP6
+    model = "IPSL.IPSL-CM6A-LR"      # CMIP6 model
+    month = 13
+    fname = "CMIP.IPSL.IPSL-CM6A-LR.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+    # piControl of the same model, member, table, variable and grid in the store. The
+    # index is (re)built if it is missing or does not have the piControl yet, e.g.
+    # when the files were copied into DIR_DATA by hand
+    fpath_piControl = find_piControl(DIR_DATA, fname)
+    if fpath_piControl is None:
+        rebuild_index(DIR_DATA)
+        fpath_piControl = find_piControl(DIR_DATA, fname)
+    if fpath_piControl is None:
+        raise RuntimeError("No associated piControl in {} for {}".format(DIR_DATA, fname))
+    fname_piControl = os.path.basename(fpath_piControl)
+    analyse_cmip6(fname, fname_piControl, variable, month=month)
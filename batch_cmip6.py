@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" batch_cmip6.py
+
+Run the edge detection (analysis_cmip6.analyse_cmip6) for many CMIP6 simulations on
+a pool of worker processes within a single (SLURM) job. Jobs that share a piControl
+run are grouped: the first job of every group runs first and fills the piControl
+cache, after which the other jobs of the group skip the control pipeline. Failed
+jobs are retried, and a summary report is printed and written to a json file.
+
+Every job runs in a fresh worker process (max_tasks_per_child=1). When a worker dies
+(e.g. out of memory), the pool breaks and all jobs that were still running are
+interrupted. These jobs are run again, each in its own pool, such that only the job
+that kills its worker uses up an attempt.
+
+Usage:
+    python3 batch_cmip6.py --variable tas --scenario 1pctCO2
+    python3 batch_cmip6.py --jobs jobs.txt
+where every line of jobs.txt is "model scenario variable member [table grid
+[activity]]", e.g.
+    IPSL.IPSL-CM6A-LR 1pctCO2 tas r1i1p1f1 Amon gr
+    GFDL-ESM4 ssp585 tas r1i1p1f1 Amon gr1 ScenarioMIP
+"""
+# ---------------------------------------------------------------------------
+import argparse
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import json
+import os
+import time
+import traceback
+
+# render figures without a display, before pyplot is imported by analysis_cmip6
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from analysis_cmip6 import analyse_cmip6, DIR_DATA, DIR_FIG
+from store import INDEX_NAME, dataset_facets, find_datasets, rebuild_index
+
+# model is the source_id, optionally preceded by the institution_id, e.g.
+# "IPSL.IPSL-CM6A-LR", as in the file names of the data
+Job = namedtuple(
+    "Job", ["model", "scenario", "variable", "member", "table", "grid", "activity"],
+    defaults=["CMIP"]
+)
+
+
+def job_fname(job, experiment_id=None):
+    """File name of the (preprocessed) data of a job in DIR_DATA
+
+    Args:
+        job (Job): job
+    Optional:
+        experiment_id (str): experiment to use instead of the scenario of the job,
+            e.g. "piControl" (which is in the CMIP activity for every scenario)
+    Returns:
+        fname (str): e.g. "CMIP.IPSL.IPSL-CM6A-LR.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+    """
+    activity = "CMIP" if experiment_id == "piControl" else job.activity
+    return ".".join([
+        activity, job.model, experiment_id or job.scenario, job.member, job.table,
+        job.variable, job.grid, "nc"
+    ])
+
+
+def job_name(job):
+    """Name of a job, also used as directory name for its figures"""
+    return ".".join([job.model, job.scenario, job.member, job.table, job.variable, job.grid])
+
+
+def read_jobs(fpath):
+    """Read jobs from a text file with one "model scenario variable member [table grid
+    [activity]]" per line. Empty lines and lines starting with # are ignored.
+    """
+    jobs = []
+    with open(fpath, "r") as reader:
+        for line in reader:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            model, scenario, variable, member = fields[:4]
+            table, grid = fields[4:6] if len(fields) >= 6 else ("Amon", "gr")
+            jobs.append(Job(model, scenario, variable, member, table, grid, *fields[6:7]))
+    return jobs
+
+
+def find_jobs(dir, variable, scenario):
+    """Create a job for every scenario data set of the given variable in the store
+
+    Args:
+        dir (str): directory of the store (see store.py) with the preprocessed data,
+            its index is built first if it does not have one
+        variable (str): variable from CMIP6
+        scenario (str): experiment_id of the scenario
+    Returns:
+        jobs (list): list of Job
+    """
+    if not os.path.isfile(os.path.join(dir, INDEX_NAME)):
+        rebuild_index(dir)
+    jobs = []
+    for fpath in find_datasets(dir, experiment_id=scenario, variable_id=variable):
+        facets = dataset_facets(fpath)
+        model = ".".join(
+            facets[facet] for facet in ("institution_id", "source_id") if facet in facets
+        )
+        jobs.append(Job(
+            model, scenario, variable, facets["member_id"], facets["table_id"],
+            facets["grid_label"], facets["activity_id"]
+        ))
+    return jobs
+
+
+def group_by_piControl(jobs):
+    """Group jobs by the piControl run they are calibrated on
+
+    Returns:
+        groups (OrderedDict): piControl file name -> list of jobs
+    """
+    groups = OrderedDict()
+    for job in jobs:
+        groups.setdefault(job_fname(job, "piControl"), []).append(job)
+    return groups
+
+
+def default_workers():
+    """Number of worker processes: the cores allocated by SLURM or else available
+    to this process
+    """
+    if "SLURM_CPUS_ON_NODE" in os.environ:
+        return int(os.environ["SLURM_CPUS_ON_NODE"])
+    return len(os.sched_getaffinity(0))
+
+
+def run_job(job, month):
+    """Run a single job in a worker process
+
+    Returns:
+        result (dict): with the status ("success" or "failed"), duration and, if
+            failed, the traceback
+    """
+    start = time.time()
+    try:
+        analyse_cmip6(
+            job_fname(job), job_fname(job, "piControl"), job.variable, month=month,
+            dir_fig=os.path.join(DIR_FIG, job_name(job)),
+            # the jobs already use all cores, smooth and plot on a single core per job
+            smooth_workers=1, plot_workers=1
+        )
+        result = {"status": "success"}
+    except Exception:
+        result = {"status": "failed", "error": traceback.format_exc()}
+    finally:
+        plt.close("all")
+    result["duration"] = time.time() - start
+    return result
+
+
+def run_isolated(job, month, run=run_job):
+    """Run a single job in its own worker process, such that a worker that dies
+    only fails this job
+
+    Returns:
+        result (dict): see run_job
+    """
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        try:
+            return executor.submit(run, job, month).result()
+        except BrokenProcessPool:
+            return {"status": "failed", "error": "worker process died"}
+
+
+def run_phase(jobs, month, workers, run=run_job):
+    """Run jobs on a process pool with a fresh worker process for every job
+
+    Args:
+        jobs (list): list of Job
+        month (int): selected month
+        workers (int): number of worker processes
+    Optional:
+        run (callable): function running a single job in a worker, see run_job
+
+    Yields:
+        job, result (tuple): for every job as soon as it is finished
+    """
+    pending = list(jobs)
+    interrupted = []
+    while pending:
+        futures = {}
+        with ProcessPoolExecutor(
+                max_workers=min(workers, len(pending)), max_tasks_per_child=1) as executor:
+            try:
+                for job in pending:
+                    futures[executor.submit(run, job, month)] = job
+            except BrokenProcessPool:
+                # a worker died while the jobs were submitted, the jobs that were not
+                # submitted are tried in a new pool
+                pass
+            pending = pending[len(futures):]
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    yield job, future.result()
+                except BrokenProcessPool:
+                    # a worker died (e.g. out of memory), which takes down all jobs
+                    # that were still running in the pool
+                    interrupted.append(job)
+
+    # it is unknown which of the interrupted jobs killed its worker, run each of them
+    # in its own pool
+    if interrupted:
+        with ThreadPoolExecutor(max_workers=min(workers, len(interrupted))) as executor:
+            futures = {
+                executor.submit(run_isolated, job, month, run): job for job in interrupted
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+
+def run_jobs(jobs, month=13, workers=None, retries=1, run=run_job):
+    """Run jobs on a process pool, retrying failed jobs
+
+    Args:
+        jobs (list): list of Job
+    Optional:
+        month (int): selected month (1-12; 13 is annual mean)
+        workers (int): number of worker processes, default: all available cores
+        retries (int): how often a failed job is tried again
+        run (callable): function running a single job in a worker, see run_job
+
+    Returns:
+        report (dict): job name -> result of the last attempt, including the number
+            of attempts
+    """
+    workers = workers or default_workers()
+    report = {}
+    attempts = {job: 0 for job in jobs}
+
+    pending = list(jobs)
+    while pending:
+        # first job of every piControl group runs first and fills the cache
+        groups = group_by_piControl(pending)
+        phases = [
+            [group[0] for group in groups.values()],
+            [job for group in groups.values() for job in group[1:]]
+        ]
+        pending = []
+        for phase in phases:
+            if not phase:
+                continue
+            for job, result in run_phase(phase, month, workers, run=run):
+                attempts[job] += 1
+                result["attempts"] = attempts[job]
+                report[job_name(job)] = result
+                print("{:60}: {} ({:.0f} s)".format(
+                    job_name(job), result["status"], result.get("duration", 0)
+                ), flush=True)
+                if result["status"] == "failed" and attempts[job] <= retries:
+                    pending.append(job)
+    return report
+
+
+def print_report(report):
+    """Print a summary of the batch"""
+    succeeded = [name for name, result in report.items() if result["status"] == "success"]
+    failed = [name for name, result in report.items() if result["status"] != "success"]
+    total_duration = sum(result.get("duration", 0) for result in report.values())
+    print(f"\n{len(succeeded)} out of {len(report)} jobs succeeded "
+          f"(total compute time {total_duration:.0f} s).")
+    for name in failed:
+        print(f"\nFAILED {name} after {report[name]['attempts']} attempt(s):")
+        print(report[name].get("error", ""))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--jobs", help="text file with one job per line")
+    parser.add_argument("--variable", default="tas", help="variable from CMIP6")
+    parser.add_argument("--scenario", default="1pctCO2", help="experiment_id")
+    parser.add_argument("--month", type=int, default=13, help="1-12; 13 is annual mean")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--retries", type=int, default=1, help="retries per failed job")
+    parser.add_argument(
+        "--report", default="batch_cmip6_report.json", help="json file for the report"
+    )
+    args = parser.parse_args()
+
+    if args.jobs:
+        jobs = read_jobs(args.jobs)
+    else:
+        jobs = find_jobs(DIR_DATA, args.variable, args.scenario)
+    print(f"Running {len(jobs)} jobs on {args.workers or default_workers()} workers...\n")
+
+    report = run_jobs(jobs, month=args.month, workers=args.workers, retries=args.retries)
+    print_report(report)
+    with open(args.report, "w") as writer:
+        json.dump(report, writer, indent=2)
@@ -0,0 +1,25 @@
+#!/bin/bash -l
+#
+#SBATCH -J batch_cmip6
+#SBATCH -p normal
+#SBATCH -t 24:00:00
+#SBATCH -N 1
+#SBATCH -n 1
+#SBATCH --exclusive
+#SBATCH -o log_batch_cmip6.%j.o
+#SBATCH -e log_batch_cmip6.%j.e
+
+# Created by: Sjoerd Terpstra
+# Date: 10/2026
+
+# Runs the edge detection of all models of a scenario as one job: batch_cmip6.py
+# starts a worker process per core of the node (SLURM_CPUS_ON_NODE)
+
+scen="1pctCO2"
+var="tas"
+
+conda activate cmip6-hypercc
+srun python3 batch_cmip6.py --scenario ${scen} --variable ${var} \
+  --report batch_cmip6_${var}_${scen}.${SLURM_JOB_ID}.json
+
+exit
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" components.py
+
+Statistics of the connected components (events) found by ndimage.label in the
+(time, lat, lon) edge mask. All statistics are computed in a single pass over the
+labelled volume, instead of scanning the whole volume once per label. Also the
+per time step region connected to a seed point (flood filling), labelled for whole
+blocks of time steps at once.
+"""
+# ---------------------------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import ndimage
+
+# connectivity within a time step only: 8 neighbours in (lat, lon), none in time
+SPATIAL_STRUCTURE = np.zeros((3, 3, 3), dtype=bool)
+SPATIAL_STRUCTURE[1] = True
+
+
+def component_statistics(labels, n_features, abruptness3d=None, size_threshold=100):
+    """Compute per-event statistics and remove small events
+
+    Args:
+        labels (np.ndarray): integer array (time, lat, lon) as returned by
+            ndimage.label
+        n_features (int): number of labels
+    Optional:
+        abruptness3d (np.ndarray): abruptness at each edge pixel, used for the peak
+            abruptness of each event
+        size_threshold (int): events must have more than size_threshold voxels to
+            be kept
+
+    Returns:
+        labels, table (tuple): labels with the small events set to zero (the other
+            events keep their label) and a dict of arrays with one entry per kept
+            event:
+            "label", "size" (number of voxels), "time_start", "time_end"
+            (inclusive time indices), "lat_min", "lat_max", "lon_min", "lon_max"
+            (inclusive bounding box indices), "centroid_time", "centroid_lat",
+            "centroid_lon" (mean index) and "abruptness" (peak abruptness, only if
+            abruptness3d is given)
+    """
+    size = np.bincount(labels.ravel(), minlength=n_features + 1)
+    kept = np.flatnonzero(size[1:] > size_threshold) + 1
+
+    # lookup table removing the small events in a single pass over the volume
+    lookup = np.zeros(n_features + 1, dtype=labels.dtype)
+    lookup[kept] = kept
+    labels = lookup[labels]
+
+    # find_objects returns the bounding box of every label as tuple of slices
+    objects = ndimage.find_objects(labels, max_label=n_features)
+    bounds = np.array(
+        [[(s.start, s.stop - 1) for s in objects[label - 1]] for label in kept],
+        dtype=int
+    ).reshape(-1, 3, 2)
+
+    # centroids from the voxels of the kept events only
+    voxels = np.flatnonzero(labels)
+    voxel_labels = labels.ravel()[voxels]
+    time_ind, lat_ind, lon_ind = np.unravel_index(voxels, labels.shape)
+    centroid = [
+        np.bincount(voxel_labels, weights=ind, minlength=n_features + 1)[kept]
+        / size[kept]
+        for ind in (time_ind, lat_ind, lon_ind)
+    ]
+
+    table = {
+        "label": kept,
+        "size": size[kept],
+        "time_start": bounds[:, 0, 0],
+        "time_end": bounds[:, 0, 1],
+        "lat_min": bounds[:, 1, 0],
+        "lat_max": bounds[:, 1, 1],
+        "lon_min": bounds[:, 2, 0],
+        "lon_max": bounds[:, 2, 1],
+        "centroid_time": centroid[0],
+        "centroid_lat": centroid[1],
+        "centroid_lon": centroid[2]
+    }
+
+    if abruptness3d is not None:
+        peak = np.zeros(n_features + 1, dtype=float)
+        np.maximum.at(peak, voxel_labels, abruptness3d.ravel()[voxels])
+        table["abruptness"] = peak[kept]
+
+    return labels, table
+
+
+def print_component_table(table):
+    """Print the per-event table returned by component_statistics
+
+    Args:
+        table (dict): per-event statistics
+    """
+    keys = list(table.keys())
+    print(" ".join("{:>13}".format(key) for key in keys))
+    for row in zip(*[table[key] for key in keys]):
+        print(" ".join(
+            "{:>13.4g}".format(value) if isinstance(value, float) else
+            "{:>13}".format(value) for value in row
+        ))
+
+
+def connected_to_seed(edges, coast, seed, out=None, block_size=240, workers=1):
+    """Per time step, the edges that are connected to a seed point via the edges and
+    the coast, like skimage's flood_fill of (edges | coast) from the seed for every
+    time step, without the coast itself
+
+    Args:
+        edges (array like): boolean edge mask (time, lat, lon)
+        coast (array like): boolean mask (lat, lon) or (time, lat, lon) of the
+            coast, e.g. the land-sea mask, which must contain the seed
+        seed (tuple): (lat, lon) index of the seed point
+    Optional:
+        out (array like): boolean output (time, lat, lon), e.g. a memory mapped file
+        block_size (int): number of time steps labelled at once
+        workers (int): number of threads labelling blocks in parallel
+
+    Returns:
+        out (array like): boolean mask of the connected edges. Time steps at which
+            the seed is not part of edges | coast have no connected edges
+    """
+    n_time = edges.shape[0]
+    if out is None:
+        out = np.empty(edges.shape, dtype=bool)
+    coast = np.asarray(coast, dtype=bool)
+    if coast.ndim == 2:
+        coast = coast[None]
+
+    def fill(start):
+        stop = min(start + block_size, n_time)
+        block_coast = coast if coast.shape[0] == 1 else coast[start:stop]
+        region = np.asarray(edges[start:stop], dtype=bool) | block_coast
+        labels, _ = ndimage.label(region, SPATIAL_STRUCTURE)
+        seed_labels = labels[(slice(None),) + tuple(seed)]
+        connected = (labels == seed_labels[:, None, None]) & (seed_labels[:, None, None] > 0)
+        out[start:stop] = connected & ~block_coast
+
+    starts = range(0, n_time, block_size)
+    if workers == 1:
+        for start in starts:
+            fill(start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fill, starts))
+    return out
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" control_cache.py
+
+On-disk cache for the piControl part of the edge detection (tapering, smoothing and
+Sobel calibration). The piControl run is the same for every scenario of a model, so
+the calibration only has to be done once. Entries are keyed by the content hash of
+the control file together with the settings of the pipeline, and the least recently
+used entries are removed when the cache exceeds its maximum size. The cache can be
+shared by processes (e.g. the batch workers): the hash index and the entries are
+guarded by file locks, such that no update of the index is lost and no entry is
+removed while it is being read.
+"""
+# ---------------------------------------------------------------------------
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+from selection import selection_months
+
+HASH_BLOCK_SIZE = 16 * 1024**2
+
+
+@contextmanager
+def _locked(lock_path, exclusive=True):
+    """Lock a file shared by the processes using the cache, exclusive for writers and
+    shared for readers
+    """
+    with open(lock_path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class ControlCache:
+    """Size-bounded LRU cache of piControl calibrations
+
+    Args:
+        dir (str): directory of the cache
+    Optional:
+        max_size (int): maximum total size of the cache in bytes
+    """
+
+    def __init__(self, dir, max_size=20 * 1024**3):
+        self.dir = dir
+        self.max_size = max_size
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir)
+        self._hash_index_path = os.path.join(self.dir, "hashes.json")
+        self._entries_lock_path = os.path.join(self.dir, "entries.lock")
+
+    def _read_hash_index(self):
+        if not os.path.isfile(self._hash_index_path):
+            return {}
+        with open(self._hash_index_path, "r") as reader:
+            return json.load(reader)
+
+    def file_hash(self, fpath):
+        """Return the sha256 of the content of fpath. Hashing a large control file
+        takes a while, so the hash is remembered for as long as the size and
+        modification time of the file do not change.
+
+        Args:
+            fpath (str): path to file
+        Returns:
+            digest (str): hexadecimal sha256 of the file content
+        """
+        fpath = os.path.abspath(fpath)
+        stat = os.stat(fpath)
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+
+        hash_index = self._read_hash_index()
+        if fpath in hash_index and hash_index[fpath]["stamp"] == stamp:
+            return hash_index[fpath]["digest"]
+
+        # hash without holding the lock, other processes can use the index meanwhile
+        sha256 = hashlib.sha256()
+        with open(fpath, "rb") as reader:
+            for block in iter(lambda: reader.read(HASH_BLOCK_SIZE), b""):
+                sha256.update(block)
+        digest = sha256.hexdigest()
+
+        # read the index again under the lock, such that the entries that other
+        # processes added in the meantime are kept
+        with _locked(self._hash_index_path + ".lock"):
+            hash_index = self._read_hash_index()
+            hash_index[fpath] = {"stamp": stamp, "digest": digest}
+            # write to a temporary file first, such that processes sharing the cache
+            # never read a partially written index
+            tmp_path = f"{self._hash_index_path}.{os.getpid()}"
+            with open(tmp_path, "w") as writer:
+                json.dump(hash_index, writer)
+            os.replace(tmp_path, self._hash_index_path)
+        return digest
+
+    def key(
+            self, fpath, variable, month, sigma_t, sigma_d, quartile,
+            taper_method="iterative", dtype=np.float64):
+        """Return the cache key for a control file and the pipeline settings
+
+        Args:
+            fpath (str): path to the piControl file
+            variable (str): variable from CMIP6
+            month (int or str): selected month (1-12; 13 is annual mean) or season
+            sigma_t (pint.Quantity): smoothing scale in time
+            sigma_d (pint.Quantity): smoothing scale in space
+            quartile (int): quartile used for the calibration
+        Optional:
+            taper_method (str): method used to smooth over continental boundaries
+            dtype (np.dtype): data type in which the control data was processed
+        Returns:
+            key (str): cache key
+        """
+        settings = json.dumps({
+            "content": self.file_hash(fpath),
+            "variable": variable,
+            # the mean over these months (offsets from January of every year, see
+            # selection.selection_months), e.g. twelve months for month 13
+            "selection": {"months": list(selection_months(month)), "reduction": "mean"},
+            "sigma_t": str(sigma_t),
+            "sigma_d": str(sigma_d),
+            "quartile": int(quartile),
+            "taper_method": taper_method,
+            "dtype": np.dtype(dtype).name
+        }, sort_keys=True)
+        return hashlib.sha256(settings.encode()).hexdigest()
+
+    def load(self, key):
+        """Return the cached entry for key, or None if there is no such entry
+
+        Returns:
+            entry (dict): with "calibration", "thresholds" and, if stored,
+                "smooth_data" (masked array)
+        """
+        entry_dir = os.path.join(self.dir, key)
+        entry_path = os.path.join(entry_dir, "entry.pkl")
+        # entries are not evicted while they are read
+        with _locked(self._entries_lock_path, exclusive=False):
+            if not os.path.isfile(entry_path):
+                return None
+
+            with open(entry_path, "rb") as reader:
+                entry = pickle.load(reader)
+
+            data_path = os.path.join(entry_dir, "smooth_data.npy")
+            if os.path.isfile(data_path):
+                entry["smooth_data"] = np.ma.masked_array(
+                    np.load(data_path),
+                    mask=np.load(os.path.join(entry_dir, "smooth_mask.npy"))
+                )
+
+            # mark entry as recently used
+            os.utime(entry_path)
+        return entry
+
+    def store(self, key, calibration, thresholds, smooth_data=None):
+        """Store an entry and evict the least recently used entries if the cache
+        became too large
+
+        Args:
+            key (str): cache key (see ControlCache.key)
+            calibration (dict): calibration as returned by calibrate_sobel
+            thresholds (dict): thresholds for the hysteresis thresholding
+        Optional:
+            smooth_data (np.ndarray): smoothed control data
+        """
+        entry_dir = os.path.join(self.dir, key)
+        with _locked(self._entries_lock_path):
+            if not os.path.isdir(entry_dir):
+                os.makedirs(entry_dir)
+
+            if smooth_data is not None:
+                np.save(
+                    os.path.join(entry_dir, "smooth_data.npy"), np.ma.getdata(smooth_data)
+                )
+                np.save(
+                    os.path.join(entry_dir, "smooth_mask.npy"),
+                    np.ma.getmaskarray(smooth_data)
+                )
+
+            # write entry.pkl last, such that an entry is only valid once complete
+            entry_path = os.path.join(entry_dir, "entry.pkl")
+            with open(f"{entry_path}.{os.getpid()}", "wb") as writer:
+                pickle.dump({"calibration": calibration, "thresholds": thresholds}, writer)
+            os.replace(f"{entry_path}.{os.getpid()}", entry_path)
+
+            self._evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_size"""
+        with _locked(self._entries_lock_path):
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total_size = 0
+        for key in os.listdir(self.dir):
+            entry_dir = os.path.join(self.dir, key)
+            entry_path = os.path.join(entry_dir, "entry.pkl")
+            if not os.path.isfile(entry_path):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(entry_dir, fname))
+                for fname in os.listdir(entry_dir)
+            )
+            entries.append((os.path.getmtime(entry_path), size, entry_dir))
+            total_size += size
+
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_dir)
+            total_size -= size
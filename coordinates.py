@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" coordinates.py
+
+Coordinate aliases for files of which the coordinates are not called lat and lon,
+e.g. the sea ice output of GFDL-ESM4 on x and y. Instead of writing a full copy of
+the data set with extra lat and lon variables, the aliases are either added to the
+file itself as coordinate variables next to the original ones (only the coordinates
+are written, so hypercc's DataSet finds them) or presented under their alias when
+the file is opened with xarray.
+
+Example:
+    alias_coordinates(fpath)            # adds lat and lon, for DataSet.cmip6
+    ds = open_aliased(fpath)            # lazy, the file is not changed
+"""
+# ---------------------------------------------------------------------------
+import netCDF4
+import xarray as xr
+
+# coordinate name: name of the coordinate in the file
+LON_LAT_ALIASES = {
+    "lat": "y",
+    "lon": "x"
+}
+
+
+def missing_aliases(names, aliases=LON_LAT_ALIASES):
+    """Aliases of which the coordinate is missing and the source is present
+
+    Args:
+        names (iterable): names of the variables in the file
+    Optional:
+        aliases (dict): coordinate name: name of the coordinate in the file
+
+    Returns:
+        aliases (dict): the subset of aliases that has to be applied
+    """
+    names = set(names)
+    return {
+        name: source for name, source in aliases.items()
+        if name not in names and source in names
+    }
+
+
+def alias_dataset(ds, aliases=LON_LAT_ALIASES):
+    """Add the aliases as coordinates of an xarray data set, without copying data
+
+    Args:
+        ds (xr.Dataset): data set
+    Optional:
+        aliases (dict): coordinate name: name of the coordinate in the file
+
+    Returns:
+        ds (xr.Dataset): data set with the alias coordinates, the same as
+            ds["lat"] = ds.y, ds["lon"] = ds.x
+    """
+    aliases = missing_aliases(ds.variables, aliases)
+    return ds.assign_coords({name: ds[source] for name, source in aliases.items()})
+
+
+def open_aliased(fpath, aliases=LON_LAT_ALIASES, **kwargs):
+    """Open a netCDF file with xarray with the aliases as coordinates, the data is
+    only read when it is used
+
+    Args:
+        fpath (str): path to the netCDF file
+    Optional:
+        aliases (dict): coordinate name: name of the coordinate in the file
+        **kwargs: passed to xr.open_dataset
+
+    Returns:
+        ds (xr.Dataset): data set
+    """
+    ds = xr.open_dataset(fpath, **kwargs)
+    aliased = alias_dataset(ds, aliases)
+    # closing the aliased data set closes the file
+    aliased.set_close(ds.close)
+    return aliased
+
+
+def alias_coordinates(fpath, aliases=LON_LAT_ALIASES):
+    """Add the aliases to a netCDF file as coordinates, e.g. lat as a copy of y and
+    lon as a copy of x (like ds["lat"] = ds.y). The original coordinates are kept
+    and the data is not rewritten, only the (small) alias variables are added and
+    listed in the "coordinates" attribute of the variables on their dimensions.
+    Files that already have the coordinates are not changed.
+
+    Args:
+        fpath (str): path to the netCDF file
+    Optional:
+        aliases (dict): coordinate name: name of the coordinate in the file
+
+    Returns:
+        added (dict): the applied aliases (empty if the file was not changed)
+    """
+    with netCDF4.Dataset(fpath, "r") as dataset:
+        added = missing_aliases(dataset.variables, aliases)
+    if not added:
+        return added
+
+    with netCDF4.Dataset(fpath, "a") as dataset:
+        for name, source in added.items():
+            variable = dataset.variables[source]
+            variable.set_auto_maskandscale(False)
+            alias = dataset.createVariable(
+                name, variable.dtype, variable.dimensions,
+                fill_value=getattr(variable, "_FillValue", None)
+            )
+            alias.set_auto_maskandscale(False)
+            alias.setncatts({
+                attr: variable.getncattr(attr) for attr in variable.ncattrs()
+                if attr != "_FillValue"
+            })
+            alias[...] = variable[...]
+
+        # the variables on the dimensions of the aliases refer to them as coordinates
+        for variable in dataset.variables.values():
+            if variable.name in added or variable.name in dataset.dimensions:
+                continue
+            names = [
+                name for name in added
+                if set(dataset.variables[name].dimensions) <= set(variable.dimensions)
+            ]
+            if not names:
+                continue
+            coordinates = getattr(variable, "coordinates", "").split()
+            coordinates += [name for name in names if name not in coordinates]
+            variable.setncattr("coordinates", " ".join(coordinates))
+    return added
@@ -8,17 +8,43 @@
 Download climate data wget scripts using esgf-pyclient
 """
 # ---------------------------------------------------------------------------
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import os
 import sys
+import threading
+import time
 
 from pyesgf.logon import LogonManager
 from pyesgf.search import SearchConnection
+from pyesgf.search.context import FileSearchContext
+
+from drs_index import drs_index
+from esgf_catalog import CATALOG_NAME, SearchCatalog
 
 URL_NODES = [
     "https://esgf-data.dkrz.de/esg-search",
     "https://esgf-node.llnl.gov/esg-search"
 ]
 
+# number of search results of which the wget script is requested at the same time
+SEARCH_WORKERS = 8
+
+# seconds after which the search results in the catalog are refreshed (one day)
+CATALOG_TTL = 24 * 3600
+
+
+def wget_fname(dataset_id):
+    """Obtain file name with all the important descriptors in the name, i.e.
+    CMIP.model.scenario.member_id.table_id.variable_id.grid_label, e.g.
+    "CMIP.CAMS-CSM1-0.1pctCO2.r1i1p1f1.Amon.tas.gn" (without the .sh extension)
+
+    Args:
+        dataset_id [string]: dataset_id of a search result
+    """
+    fname = dataset_id.split(".")
+    ind = [1, 3, 4, 5, 6, 7, 8]
+    return ".".join([fname[i] for i in ind])
+
 
 def download_wget(file_ctx, facets, dir, override=False, verbose=False):
     """Dowload single wget script for a given result
@@ -35,13 +61,7 @@ def download_wget(file_ctx, facets, dir, override=False, verbose=False):
         success [boolean]: whether dowload was successful
     """
 
-    # obtain file name with all the important descriptors in the name, i.e.
-    # CMIP.model.scenario.member_id.table_id.variable_id.grid_label, e.g.
-    # "CMIP.CAMS-CSM1-0.1pctCO2.r1i1p1f1.Amon.tas.gn"
-    fname = list(file_ctx.facet_constraints.items())[0][1].split(".")
-    ind = [1, 3, 4, 5, 6, 7, 8]
-    fname = [fname[i] for i in ind]
-    fname = ".".join(fname)
+    fname = wget_fname(list(file_ctx.facet_constraints.items())[0][1])
 
     freq = fname.split(".")[4]
     freq_list = [
@@ -53,23 +73,6 @@ def download_wget(file_ctx, facets, dir, override=False, verbose=False):
             print(f"{fname} has incorrect frequency")
         return True
 
-    # check if wget script for this exact simulation already exists for another grid
-    # grid_label = list(file_ctx._SearchContext__facet_counts["grid_label"].keys())[0]
-    for file in os.listdir(os.fsencode(dir)):
-        fname_in_dir = os.fsdecode(file)
-        # remove .sh extension and compare grid_label
-        if ".".join(fname_in_dir.split(".")[:-2]) == ".".join(fname.split(".")[:-1]):
-            # check which one has better grid
-            if fname_in_dir.split(".")[-2] == "gr":
-                return True
-            elif fname.split(".")[-1] == "gr":
-                break
-            else:
-                if fname_in_dir.split(".")[-2] == "gn":
-                    return True
-                else:
-                    break
-
     # add .sh extension to file name
     if not fname.endswith(".sh"):
         fname = fname + ".sh"
@@ -83,11 +86,25 @@ def download_wget(file_ctx, facets, dir, override=False, verbose=False):
             print(f"{fname} already downloaded, skipping...")
         return True
 
-    wget_script_content = file_ctx.get_download_script(facets=facets)
+    # check if wget script for this exact simulation already exists for a better grid
+    # (gr, then gn), the index of the directory is shared by the download threads
+    index = drs_index(dir, extension="sh")
+    if not index.claim(fname):
+        return True
+
+    try:
+        wget_script_content = file_ctx.get_download_script(facets=facets)
 
-    # create file to save the wget script as .sh executable
-    with open(script_path, "w") as writer:
-        writer.write(wget_script_content)
+        # create file to save the wget script as .sh executable, under a temporary
+        # name first such that an interrupted download is not mistaken for a complete
+        # script
+        tmp_path = f"{script_path}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w") as writer:
+            writer.write(wget_script_content)
+        os.replace(tmp_path, script_path)
+    except BaseException:
+        index.discard(fname)
+        raise
 
     # make wget script executable
     os.chmod(script_path, 0o750)
@@ -152,29 +169,199 @@ def print_downloaded_wget(dir, path=False):
     return files
 
 
-def search_and_download_wget(ctx, facets, dir, override=False, verbose=False):
-    """Perform search of selected DatasetSearchContext ctx and download
-    wget scripts for all search results
+def file_context(result, url_node=None):
+    """File context of a search result
 
     Args:
-        DatasetSearchContext object from pyesgf
+        result [DatasetResult]: search result
+    Optional:
+        url_node [str]: index node to use instead of the node of the search, e.g. one
+            of URL_NODES
+
+    Returns:
+        file_ctx [FileSearchContext]: file context of the result
+    """
+    if url_node is None:
+        return result.file_context()
+    return FileSearchContext(
+        connection=SearchConnection(url_node, distrib=True),
+        constraints={"dataset_id": result.dataset_id}
+    )
+
+
+def search_node(result):
+    """Index node of the search that found a result, None if unknown"""
+    context = getattr(result, "context", None)
+    connection = getattr(context, "connection", None) or getattr(result, "connection", None)
+    url = getattr(connection, "url", None)
+    return None if url is None else url.rstrip("/")
+
+
+class CatalogResult:
+    """Search result from the catalog, which only knows its dataset_id
+
+    Args:
+        dataset_id [string]: dataset_id of the result
+        connection [SearchConnection]: connection used to request its files
+    """
+
+    def __init__(self, dataset_id, connection):
+        self.dataset_id = dataset_id
+        self.connection = connection
+
+    def file_context(self):
+        return FileSearchContext(
+            connection=self.connection, constraints={"dataset_id": self.dataset_id}
+        )
+
+
+def catalog_search(conn, search, catalog):
+    """Results of a search, from the catalog if they are younger than its ttl.
+    Otherwise only the data sets that changed since the previous search are requested
+    from the index node, or all of them if the search was never done or its last
+    full search is too old (see SearchCatalog.needs_full_refresh). The results of the
+    index node are yielded while its pages are fetched, followed by the other results
+    in the catalog.
+
+    Args:
+        conn [SearchConnection]: connection to the index node
+        search [dict]: constraints of the search, including "facets"
+        catalog [SearchCatalog]: catalog of previous searches
+    Yields:
+        result [CatalogResult]: result of every data set
+    """
+    yielded = set()
+    if not catalog.is_fresh(search):
+        if catalog.needs_full_refresh(search):
+            # an incremental search does not show retracted data sets
+            catalog.invalidate(search)
+        start = time.time()
+        since = catalog.fetched(search)
+        constraints = dict(search)
+        if since is not None:
+            constraints["from_timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(since))
+        ctx = conn.new_context(**constraints)
+        dataset_ids = []
+        for result in ctx.search(facets=search["facets"]):
+            dataset_ids.append(result.dataset_id)
+            yielded.add(result.dataset_id)
+            yield CatalogResult(result.dataset_id, conn)
+        catalog.update(search, dataset_ids, incremental=since is not None, fetched=start)
+    for dataset_id in catalog.dataset_ids(search):
+        if dataset_id not in yielded:
+            yield CatalogResult(dataset_id, conn)
+
+
+def fetch_wget(
+        result, facets, dir, override=False, verbose=False, retries=3, backoff=5,
+        url_nodes=URL_NODES):
+    """Download the wget script of a single search result. Failed requests are
+    retried with an increasing delay, on the next node of url_nodes.
+
+    Args:
+        result [DatasetResult]: search result
     Optional:
         override [boolean]: whether already downloaded files will be dowloaded again
+        retries [int]: number of attempts
+        backoff [float]: seconds to wait before the first retry, doubled for every
+            next retry
+        url_nodes [list]: index nodes to fail over to, the node of the search itself
+            is skipped
+
+    Returns:
+        success, attempts, error [tuple]: whether the download was successful, the
+            number of attempts and the last error
     """
-    # perform search based on criteria
-    results = ctx.search(facets=facets)
+    # the first attempt uses the node of the search itself, the retries fail over to
+    # the other nodes
+    node = search_node(result)
+    nodes = [None] + [url_node for url_node in url_nodes if url_node.rstrip("/") != node]
+    error = None
+    for attempt in range(retries):
+        try:
+            file_ctx = file_context(result, nodes[attempt % len(nodes)])
+            success = download_wget(file_ctx, facets, dir, override=override, verbose=verbose)
+            return success, attempt + 1, None
+        # pyesgf raises errors of requests, of its own and of the xml parsing
+        except Exception as exception:
+            error = exception
+            if attempt < retries - 1:
+                time.sleep(backoff * 2**attempt)
+    return False, retries, error
+
+
+def download_wgets(
+        results, facets, dir, override=False, verbose=False, workers=1, retries=3,
+        backoff=5, url_nodes=URL_NODES, catalog=None):
+    """Download the wget scripts of search results. The wget scripts are requested by
+    a pool of workers while the next results are fetched, e.g. the next pages of a
+    search.
 
-    # get wget script for all results
-    number_downloads_failed = 0
+    Args:
+        results [iterable]: search results, e.g. ctx.search() or catalog_search()
+    Optional:
+        override [boolean]: whether already downloaded files will be dowloaded again
+        workers [int]: number of wget scripts requested at the same time
+        retries [int]: number of attempts per search result
+        backoff [float]: seconds to wait before the first retry
+        url_nodes [list]: index nodes to fail over to
+        catalog [SearchCatalog]: catalog in which the locations of the wget scripts
+            are stored
+    Returns:
+        report [dict]: "results" (number of search results), "failed" (list of
+            (dataset_id, error)) and "seconds"
+    """
+    start = time.monotonic()
     n_results = 0
-    for i, result in enumerate(results):
-        file_ctx = result.file_context()
-        success = download_wget(file_ctx, facets, dir, override=override, verbose=verbose)
-        if not success:
-            number_downloads_failed += 1
-        n_results += 1
+    failed = []
+
+    def collect(futures):
+        for future in futures:
+            success, attempts, error = future.result()
+            script_path = os.path.join(dir, wget_fname(pending[future]) + ".sh")
+            if success and catalog is not None and os.path.isfile(script_path):
+                catalog.set_script(pending[future], script_path)
+            if not success:
+                failed.append((pending[future], error))
+                if verbose:
+                    print(f"Failed after {attempts} attempts: {pending[future]} ({error})")
+            del pending[future]
+
+    # get wget script for all results, with at most 2 * workers results in flight
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in results:
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(
+                fetch_wget, result, facets, dir, override=override, verbose=verbose,
+                retries=retries, backoff=backoff, url_nodes=url_nodes
+            )
+            pending[future] = result.dataset_id
+            n_results += 1
+        collect(list(pending))
+
+    seconds = time.monotonic() - start
+    print(f"{len(failed)} out of {n_results} failed.")
+    if seconds > 0:
+        print(f"{n_results} results in {seconds:.1f} s ({n_results / seconds:.2f} per second)\n")
+    return {"results": n_results, "failed": failed, "seconds": seconds}
+
+
+def search_and_download_wget(ctx, facets, dir, **kwargs):
+    """Perform search of selected DatasetSearchContext ctx and download
+    wget scripts for all search results (see download_wgets)
 
-    print(f"{number_downloads_failed} out of {n_results} failed.\n")
+    Args:
+        DatasetSearchContext object from pyesgf
+    Optional:
+        **kwargs: options of download_wgets
+    Returns:
+        report [dict]: see download_wgets
+    """
+    # perform search based on criteria
+    return download_wgets(ctx.search(facets=facets), facets, dir, **kwargs)
 
 
 if __name__ == '__main__':
@@ -190,16 +377,15 @@ if __name__ == '__main__':
     variable = "tas"
     verbose = True
 
-    DIR_WGET_SCEN = os.path.join(
-        "/nethome", "terps020", "cmip6", "wget", variable, experiment_id
-    )
-    DIR_WGET_PICONTROL = os.path.join(
-        "/nethome", "terps020", "cmip6", "wget", variable, "piControl"
-    )
+    DIR_WGET = os.path.join("/nethome", "terps020", "cmip6", "wget")
+    DIR_WGET_SCEN = os.path.join(DIR_WGET, variable, experiment_id)
+    DIR_WGET_PICONTROL = os.path.join(DIR_WGET, variable, "piControl")
     if not os.path.isdir(DIR_WGET_SCEN):
         os.makedirs(DIR_WGET_SCEN)
     if not os.path.isdir(DIR_WGET_PICONTROL):
         os.makedirs(DIR_WGET_PICONTROL)
+    # results of previous searches
+    catalog = SearchCatalog(os.path.join(DIR_WGET, CATALOG_NAME), ttl=CATALOG_TTL)
 
     # for security reasons, give openid and password when running this script.
     # do not store them here, because the github repository is public!
@@ -228,17 +414,18 @@ if __name__ == '__main__':
         "replica": True,
         "latest": True
     })
-    ctx = conn.new_context(
-        **search
+    download_wgets(
+        catalog_search(conn, search, catalog), facets, DIR_WGET_SCEN, verbose=verbose,
+        workers=SEARCH_WORKERS, catalog=catalog
     )
-    search_and_download_wget(ctx, facets, DIR_WGET_SCEN, verbose=verbose)
 
     search_piControl = search.copy()
     search_piControl["experiment_id"] = "piControl"
-    ctx_piControl = conn.new_context(
-        **search_piControl
+    download_wgets(
+        catalog_search(conn, search_piControl, catalog), facets, DIR_WGET_PICONTROL,
+        verbose=verbose, workers=SEARCH_WORKERS, catalog=catalog
     )
-    search_and_download_wget(ctx_piControl, facets, DIR_WGET_PICONTROL, verbose=verbose)
+    catalog.close()
 
     print_downloaded_wget(DIR_WGET_SCEN)
     print_downloaded_wget(DIR_WGET_PICONTROL)
@@ -9,8 +9,8 @@ Download climate data from wget scripts and preprocess using xmip
 """
 # ---------------------------------------------------------------------------
 import os
-import subprocess
 import sys
+import time
 
 import xarray as xr
 
@@ -19,6 +19,16 @@ from pyesgf.logon import LogonManager
 import xmip.preprocessing as xmip_pre
 from xmip.postprocessing import match_metrics
 
+from drs_index import drs_index, find_file, parse_drs, piControl_drs
+from store import write_dataset
+from wget_engine import download_wget_scripts, print_report
+
+# number of files downloaded at the same time, and at most per data node
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_PER_HOST = 4
+# maximum total bandwidth in bytes per second, None for no limit
+DOWNLOAD_BYTES_PER_SECOND = None
+
 # import shapely
 # import warnings
 # from shapely.errors import ShapelyDeprecationWarning
@@ -85,15 +95,7 @@ def find_filename(dir, experiment_id):
     """Find file name for given experiment_id in dir (assumes only one file for each
     scenario/experiment_id) --> works only in connection with edge_cmip6.sh workflow.
     """
-    for file in os.listdir(os.fsencode(dir)):
-        fname_in_dir = os.fsdecode(file)
-        if experiment_id in fname_in_dir:
-            if fname_in_dir.endswith(".sh"):
-                return fname_in_dir
-    else:
-        raise FileNotFoundError(
-            f"Could not found file for experiment_id: {experiment_id}..."
-        )
+    return find_file(dir, extension="sh", experiment_id=experiment_id)
 
 
 if __name__ == '__main__':
@@ -121,12 +123,15 @@ if __name__ == '__main__':
         "/nethome", "terps020", "cmip6", "wget", variable, "piControl"
     )
 
-    # check if piControl file exists
-    wget_piControl = wget_var.split(".").copy()
-    wget_piControl[2] = "piControl"
-    wget_piControl = ".".join(wget_piControl)
+    # check if piControl file (same model, member, table, variable and grid) exists
+    drs_var = parse_drs(wget_var)
+    if drs_var is None:
+        raise RuntimeError("{} is not a CMIP6 DRS file name".format(wget_var))
+    wget_piControl = drs_index(DIR_WGET_PICONTROL, extension="sh").get(
+        piControl_drs(drs_var)
+    )
     print(wget_var, wget_piControl)
-    if not os.path.isfile(os.path.join(DIR_WGET_PICONTROL, wget_piControl)):
+    if wget_piControl is None:
         raise RuntimeError("No associated piControl wget script to {}".format(wget_var))
 
     ## WARNING: temporary only use files that are already in gr format
@@ -137,18 +142,18 @@ if __name__ == '__main__':
             "# WARNING: temporary only using files that are already in gr format"
         )
 
-    # make sure files are executable
+    # download the files of the scenario and piControl wget scripts at the same time,
+    # resuming partial downloads and verifying the checksums
     wget_var_path = os.path.join(DIR_WGET_SCEN, wget_var)
     wget_piControl_path = os.path.join(DIR_WGET_PICONTROL, wget_piControl)
-    os.chmod(wget_var_path, 0o750)
-    os.chmod(wget_piControl_path, 0o750)
-    # subprocess.check_output("bash {} -s".format(wget_var_path), cwd=DIR_DATATEMP)
-    # subprocess.check_output("bash {} -s".format(wget_piControl_path), cwd=DIR_DATATEMP)
-    process = subprocess.call(["bash", wget_var_path, "-s", "-d"], cwd=DIR_DATATEMP)
-    # process.wait()
-    process = subprocess.call(["bash", wget_piControl_path, "-s", "-d"], cwd=DIR_DATATEMP)
-    # process.wait()
-    # can speed up above by waiting only once instead of twice
+    start = time.monotonic()
+    results = download_wget_scripts(
+        [wget_var_path, wget_piControl_path], DIR_DATATEMP, workers=DOWNLOAD_WORKERS,
+        per_host=DOWNLOAD_PER_HOST, bytes_per_second=DOWNLOAD_BYTES_PER_SECOND
+    )
+    print_report(results, time.monotonic() - start)
+    if any(result.status == "failed" for result in results):
+        raise RuntimeError("Could not download all files of {}".format(wget_var))
 
     # open files and preprocess them
     #TODO: ds_var_fname --> how to obtain this?
@@ -159,10 +164,10 @@ if __name__ == '__main__':
 
     ## TODO: Concatenate files if necessary
 
-    # save and remove from memory to speed-up and save space
+    # save to the store (chunked per time step and compressed) and remove from memory
     ## TODO: make sure to save to correct file name (should be correct now)
     ds_var_fname_save = ".".join(wget_var.split(".")[:-1]) + ".nc"
-    ds_var.to_netcdf(os.path.join(DIR_DATATEMP, ds_var_fname_save))
+    write_dataset(ds_var, DIR_DATATEMP, ds_var_fname_save, variable)
     del ds_var
 
     ds_piControl_fname = find_filename(DIR_DATATEMP, "piControl")
@@ -172,9 +177,9 @@ if __name__ == '__main__':
 
     ## TODO: Concatenate files if necessary
 
-    # save and remove from memory to speed-up and save space
+    # save to the store (chunked per time step and compressed) and remove from memory
     ## TODO: make sure to save to correct file name (should be correct now)
     # ds_piControl_fname = "CMIP.source_id.experiment_id.member_id.table_id.variable_id.gr.nc"
     ds_piControl_fname_save = ".".join(wget_piControl.split(".")[:-1]) + ".nc"
-    ds_piControl.to_netcdf(os.path.join(DIR_DATATEMP, ds_piControl_fname_save))
+    write_dataset(ds_piControl, DIR_DATATEMP, ds_piControl_fname_save, variable)
     del ds_piControl
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" drs_index.py
+
+Index of the wget scripts and data files in a directory by their CMIP6 DRS facets
+(activity, source, experiment, member, table, variable and grid). The file names are parsed
+once, after which the best grid of a simulation, the piControl of a scenario and
+files with given facets are looked up in the index instead of by scanning the
+directory. The directory is scanned again when its modification time changes, and
+once more before a lookup reports that a file is not there: on NFS or filesystems
+with coarse timestamps a file can be added without a visible change of the
+modification time. So the index stays correct when files are added by other
+processes.
+
+Supported file names:
+    CMIP.GFDL-ESM4.1pctCO2.r1i1p1f1.Amon.tas.gr.sh (wget scripts)
+    ScenarioMIP.GFDL-ESM4.ssp585.r1i1p1f1.Amon.tas.gr.sh (wget scripts)
+    CMIP.NOAA-GFDL.GFDL-ESM4.1pctCO2.r1i1p1f1.Amon.tas.gr.nc (preprocessed data)
+    tas_Amon_GFDL-ESM4_1pctCO2_r1i1p1f1_gr_000101-010012.nc (CMOR output, the
+        activity is not part of the name and is None)
+
+Example:
+    index = drs_index(DIR_WGET_PICONTROL)
+    wget_piControl = index.get(piControl_drs(parse_drs(wget_var)))
+"""
+# ---------------------------------------------------------------------------
+from collections import namedtuple
+import os
+import threading
+
+Drs = namedtuple(
+    "Drs",
+    [
+        "activity_id", "source_id", "experiment_id", "member_id", "table_id",
+        "variable_id", "grid_label"
+    ]
+)
+
+# grids in order of preference, grids that are not listed come last
+GRID_PREFERENCE = ["gr", "gn"]
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def parse_drs(fname):
+    """Facets of a file name
+
+    Args:
+        fname (str): file name (or path), see the module docstring
+
+    Returns:
+        drs (Drs): facets, None if fname is not a DRS name
+    """
+    fname = os.path.basename(fname)
+    fields = fname.split(".")
+    if len(fields) in (8, 9):
+        # activity.[institution.]source.experiment.member.table.variable.grid.extension
+        source, experiment, member, table, variable, grid = fields[-7:-1]
+        return Drs(fields[0], source, experiment, member, table, variable, grid)
+    fields = fields[0].split("_")
+    if len(fields) in (6, 7):
+        # variable_table_source_experiment_member_grid[_time].nc
+        variable, table, source, experiment, member, grid = fields[:6]
+        return Drs(None, source, experiment, member, table, variable, grid)
+    return None
+
+
+def piControl_drs(drs):
+    """Facets of the piControl run of a simulation: the same model, member, table,
+    variable and grid, in the CMIP activity (also for e.g. ScenarioMIP simulations)
+    """
+    return drs._replace(activity_id="CMIP", experiment_id="piControl")
+
+
+def grid_rank(grid_label):
+    """Rank of a grid in GRID_PREFERENCE, lower is better"""
+    if grid_label in GRID_PREFERENCE:
+        return GRID_PREFERENCE.index(grid_label)
+    return len(GRID_PREFERENCE)
+
+
+class DrsIndex:
+    """Index of the files in a directory by their DRS facets
+
+    Args:
+        dir (str): directory
+    Optional:
+        extension (str): only index files with this extension, e.g. "sh"
+    """
+
+    def __init__(self, dir, extension=None):
+        self.dir = dir
+        self.extension = extension
+        # simulation (Drs without grid) -> {grid_label: file name}
+        self._files = {}
+        # files claimed by this process, which may not be written yet
+        self._claimed = set()
+        self._mtime = None
+        self._lock = threading.RLock()
+
+    def _indexed(self, fname):
+        if self.extension is not None and not fname.endswith("." + self.extension):
+            return None
+        return parse_drs(fname)
+
+    def refresh(self, force=False):
+        """Scan the directory again if it changed since the last scan
+
+        Optional:
+            force (boolean): scan even if the modification time did not change
+        """
+        with self._lock:
+            mtime = os.stat(self.dir).st_mtime_ns if os.path.isdir(self.dir) else None
+            if mtime == self._mtime and not force:
+                return
+            self._files = {}
+            if mtime is not None:
+                with os.scandir(self.dir) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            self._add(entry.name)
+            for fname in self._claimed:
+                self._add(fname)
+            self._mtime = mtime
+
+    def _add(self, fname):
+        drs = self._indexed(fname)
+        if drs is not None:
+            self._files.setdefault(drs[:-1], {})[drs.grid_label] = fname
+
+    def add(self, fname):
+        """Add a file that was written to the directory"""
+        with self._lock:
+            self.refresh()
+            self._add(fname)
+
+    def discard(self, fname):
+        """Remove a file from the index, e.g. when writing it failed"""
+        with self._lock:
+            self._claimed.discard(fname)
+            drs = self._indexed(fname)
+            if drs is not None:
+                grids = self._files.get(drs[:-1], {})
+                if grids.get(drs.grid_label) == fname:
+                    del grids[drs.grid_label]
+
+    def grids(self, drs):
+        """Files of a simulation per grid
+
+        Args:
+            drs (Drs): facets of the simulation, the grid_label is ignored
+
+        Returns:
+            grids (dict): grid_label -> file name
+        """
+        simulation = tuple(drs[:-1])
+        with self._lock:
+            self.refresh()
+            if simulation not in self._files:
+                self.refresh(force=True)
+            return dict(self._files.get(simulation, {}))
+
+    def get(self, drs):
+        """File with the given facets, or of the best grid if drs.grid_label is None
+
+        Returns:
+            fname (str): file name, None if there is no such file
+        """
+        grids = self.grids(drs)
+        if drs.grid_label is not None:
+            if grids and drs.grid_label not in grids:
+                # grids already scanned the directory again if grids is empty
+                self.refresh(force=True)
+                grids = self.grids(drs)
+            return grids.get(drs.grid_label)
+        if not grids:
+            return None
+        return grids[min(grids, key=lambda grid: (grid_rank(grid), grid))]
+
+    def find(self, **facets):
+        """File names of which the facets match, e.g. find(experiment_id="piControl")"""
+        with self._lock:
+            self.refresh()
+            fnames = self._find(facets)
+            if not fnames:
+                self.refresh(force=True)
+                fnames = self._find(facets)
+            return fnames
+
+    def _find(self, facets):
+        return sorted(
+            fname for simulation, grids in self._files.items()
+            for grid, fname in grids.items()
+            if all(
+                getattr(Drs(*simulation, grid), facet) == value
+                for facet, value in facets.items()
+            )
+        )
+
+    def claim(self, fname):
+        """Add fname to the index, unless the directory already has the same simulation
+        on a preferred grid. Used before writing fname, such that threads writing
+        another grid of the same simulation at the same time see it.
+
+        Returns:
+            claimed (boolean): whether fname should be written, always True if fname
+                is not a DRS name (there is no grid to compare)
+        """
+        drs = self._indexed(fname)
+        if drs is None:
+            return True
+        with self._lock:
+            rank = grid_rank(drs.grid_label)
+            for grid, existing in self.grids(drs).items():
+                if existing != fname and grid in GRID_PREFERENCE and grid_rank(grid) <= rank:
+                    return False
+            self._claimed.add(fname)
+            self._add(fname)
+            return True
+
+
+def drs_index(dir, extension=None):
+    """Shared DrsIndex of a directory, created on first use"""
+    key = (os.path.abspath(dir), extension)
+    with _indices_lock:
+        if key not in _indices:
+            _indices[key] = DrsIndex(dir, extension=extension)
+        return _indices[key]
+
+
+def find_file(dir, extension=None, **facets):
+    """First file (sorted by name) in dir with the given facets
+
+    Args:
+        dir (str): directory
+    Optional:
+        extension (str): extension of the file, e.g. "sh"
+        **facets: e.g. experiment_id="piControl"
+
+    Returns:
+        fname (str): file name
+    """
+    fnames = drs_index(dir, extension=extension).find(**facets)
+    if not fnames:
+        raise FileNotFoundError(f"Could not find a file in {dir} with {facets}")
+    return fnames[0]
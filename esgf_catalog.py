@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" esgf_catalog.py
+
+Local SQLite catalog of ESGF search results. The data sets found by a search are
+stored with their facets, together with the time of the search, such that the same
+search is only sent to the index node again when its results are older than the
+time to live (ttl). Stale searches are refreshed incrementally: only the data sets
+that changed since the previous search are requested. An incremental search does
+not show data sets that were retracted, so every full_refresh_ttls times the ttl the
+whole search is done again, which removes them from the catalog. Lookups such as
+"is there a piControl for this member?" are answered from the catalog.
+
+Example:
+    catalog = SearchCatalog(os.path.join(DIR_WGET, CATALOG_NAME))
+    if not catalog.is_fresh(search):
+        catalog.update(search, [result.dataset_id for result in ctx.search()])
+    catalog.has_piControl("GFDL-ESM4", "r1i1p1f1", "tas")
+"""
+# ---------------------------------------------------------------------------
+import hashlib
+import json
+import sqlite3
+import time
+
+# file name of the catalog in the directory of the wget scripts
+CATALOG_NAME = "catalog.sqlite"
+
+# one week
+DEFAULT_TTL = 7 * 24 * 3600
+
+# a search is done in full (instead of incrementally) when its last full search is
+# older than this many times the ttl
+FULL_REFRESH_TTLS = 4
+
+# facets in the instance id of a data set, e.g.
+# CMIP6.CMIP.NOAA-GFDL.GFDL-ESM4.piControl.r1i1p1f1.Amon.tas.gr.v20180701
+FACETS = [
+    "mip_era", "activity_id", "institution_id", "source_id", "experiment_id",
+    "member_id", "table_id", "variable_id", "grid_label"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    key TEXT PRIMARY KEY,
+    search TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    full_fetched REAL
+);
+CREATE TABLE IF NOT EXISTS datasets (
+    master_id TEXT PRIMARY KEY,
+    dataset_id TEXT NOT NULL,
+    version TEXT,
+    data_node TEXT,
+    mip_era TEXT,
+    activity_id TEXT,
+    institution_id TEXT,
+    source_id TEXT,
+    experiment_id TEXT,
+    member_id TEXT,
+    table_id TEXT,
+    variable_id TEXT,
+    grid_label TEXT,
+    script_path TEXT,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS query_datasets (
+    key TEXT NOT NULL,
+    master_id TEXT NOT NULL,
+    PRIMARY KEY (key, master_id)
+);
+CREATE INDEX IF NOT EXISTS datasets_member ON datasets (
+    source_id, experiment_id, member_id, variable_id
+);
+"""
+
+
+def parse_dataset_id(dataset_id):
+    """Facets of an ESGF dataset_id
+
+    Args:
+        dataset_id (str): e.g.
+            "CMIP6.CMIP.NOAA-GFDL.GFDL-ESM4.piControl.r1i1p1f1.Amon.tas.gr.v20180701|esgf-data1.llnl.gov"
+
+    Returns:
+        row (dict): master_id (the id without version and data node), dataset_id,
+            version, data_node and the facets
+    """
+    instance_id, _, data_node = dataset_id.partition("|")
+    fields = instance_id.split(".")
+    version = None
+    if len(fields) > len(FACETS) and fields[-1].startswith("v"):
+        version = fields.pop()
+    row = {
+        "master_id": ".".join(fields),
+        "dataset_id": dataset_id,
+        "version": version,
+        "data_node": data_node or None
+    }
+    row.update(zip(FACETS, fields))
+    return row
+
+
+class SearchCatalog:
+    """Catalog of the results of ESGF searches
+
+    Args:
+        path (str): path to the SQLite database, ":memory:" for a temporary catalog
+    Optional:
+        ttl (float): time to live of the results of a search in seconds
+        full_refresh_ttls (float): a search is done in full again when its last full
+            search is older than full_refresh_ttls * ttl
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, full_refresh_ttls=FULL_REFRESH_TTLS):
+        self.path = path
+        self.ttl = ttl
+        self.full_refresh_ttls = full_refresh_ttls
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        columns = [row["name"] for row in self.connection.execute("PRAGMA table_info(queries)")]
+        if "full_fetched" not in columns:
+            # catalogs of before the periodic full refresh, their next search is full
+            with self.connection:
+                self.connection.execute("ALTER TABLE queries ADD COLUMN full_fetched REAL")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def query_key(search):
+        """Key of a search (dict of constraints), independent of the order"""
+        return hashlib.sha1(json.dumps(search, sort_keys=True).encode()).hexdigest()
+
+    def fetched(self, search):
+        """Time (seconds since the epoch) of the last search, None if never searched"""
+        row = self.connection.execute(
+            "SELECT fetched FROM queries WHERE key = ?", (self.query_key(search),)
+        ).fetchone()
+        return None if row is None else row["fetched"]
+
+    def is_fresh(self, search, now=None):
+        """Whether the results of search are younger than the ttl"""
+        fetched = self.fetched(search)
+        now = time.time() if now is None else now
+        return fetched is not None and now - fetched < self.ttl
+
+    def needs_full_refresh(self, search, now=None):
+        """Whether the next refresh of search should be a full search, because it was
+        never done in full or longer than full_refresh_ttls * ttl ago
+        """
+        row = self.connection.execute(
+            "SELECT full_fetched FROM queries WHERE key = ?", (self.query_key(search),)
+        ).fetchone()
+        now = time.time() if now is None else now
+        return row is None or row["full_fetched"] is None or \
+            now - row["full_fetched"] >= self.full_refresh_ttls * self.ttl
+
+    def update(self, search, dataset_ids, incremental=False, fetched=None):
+        """Store the results of a search. A newer version of a data set replaces the
+        older one. After a full search, data sets that are no longer the result of any
+        search (e.g. retracted) are removed.
+
+        Args:
+            search (dict): constraints of the search
+            dataset_ids (iterable): dataset_id of every result
+        Optional:
+            incremental (boolean): if True, dataset_ids are only the data sets that
+                changed since the previous search and are added to its results,
+                otherwise they replace the results
+            fetched (float): time of the search, by default now. Take the time at which
+                the search was started, such that an incremental refresh does not miss
+                data sets published during the search.
+        """
+        key = self.query_key(search)
+        fetched = time.time() if fetched is None else fetched
+        with self.connection:
+            if not incremental:
+                self.connection.execute("DELETE FROM query_datasets WHERE key = ?", (key,))
+            for dataset_id in dataset_ids:
+                row = parse_dataset_id(dataset_id)
+                row["updated"] = fetched
+                existing = self.connection.execute(
+                    "SELECT version FROM datasets WHERE master_id = ?", (row["master_id"],)
+                ).fetchone()
+                if existing is None or (existing["version"] or "") <= (row["version"] or ""):
+                    columns = ", ".join(row)
+                    # keep the location of the wget script when the data set is updated
+                    updates = ", ".join(f"{column} = excluded.{column}" for column in row)
+                    self.connection.execute(
+                        f"INSERT INTO datasets ({columns}) VALUES ({', '.join('?' * len(row))}) "
+                        f"ON CONFLICT (master_id) DO UPDATE SET {updates}",
+                        list(row.values())
+                    )
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO query_datasets (key, master_id) VALUES (?, ?)",
+                    (key, row["master_id"])
+                )
+            if incremental:
+                full_fetched = self.connection.execute(
+                    "SELECT full_fetched FROM queries WHERE key = ?", (key,)
+                ).fetchone()
+                full_fetched = None if full_fetched is None else full_fetched["full_fetched"]
+            else:
+                full_fetched = fetched
+                self.connection.execute(
+                    "DELETE FROM datasets WHERE master_id NOT IN "
+                    "(SELECT master_id FROM query_datasets)"
+                )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO queries (key, search, fetched, full_fetched) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(search, sort_keys=True), fetched, full_fetched)
+            )
+
+    def invalidate(self, search):
+        """Forget when search was done, such that the next refresh is a full search"""
+        with self.connection:
+            self.connection.execute("DELETE FROM queries WHERE key = ?", (self.query_key(search),))
+
+    def dataset_ids(self, search):
+        """dataset_id of the (latest versions of the) results of a search"""
+        rows = self.connection.execute(
+            "SELECT datasets.dataset_id FROM query_datasets JOIN datasets "
+            "USING (master_id) WHERE query_datasets.key = ? ORDER BY datasets.master_id",
+            (self.query_key(search),)
+        )
+        return [row["dataset_id"] for row in rows]
+
+    def find(self, **facets):
+        """Data sets in the catalog with the given facets
+
+        Args:
+            **facets: e.g. source_id="GFDL-ESM4", experiment_id="piControl"
+
+        Returns:
+            rows (list): dict of every data set
+        """
+        unknown = set(facets) - set(FACETS) - {"master_id", "dataset_id", "version", "data_node"}
+        if unknown:
+            raise ValueError(f"Unknown facets: {sorted(unknown)}")
+        where = " AND ".join(f"{facet} = ?" for facet in facets) or "1"
+        rows = self.connection.execute(
+            f"SELECT * FROM datasets WHERE {where} ORDER BY master_id", list(facets.values())
+        )
+        return [dict(row) for row in rows]
+
+    def has_piControl(self, source_id, member_id, variable_id, table_id=None):
+        """Whether the catalog has a piControl run for a member of a model"""
+        facets = {
+            "source_id": source_id, "experiment_id": "piControl", "member_id": member_id,
+            "variable_id": variable_id
+        }
+        if table_id is not None:
+            facets["table_id"] = table_id
+        return bool(self.find(**facets))
+
+    def set_script(self, dataset_id, script_path):
+        """Store the location of the wget script of a data set"""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE datasets SET script_path = ? WHERE master_id = ?",
+                (script_path, parse_dataset_id(dataset_id)["master_id"])
+            )
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" figures.py
+
+Batched rendering of maps of the analysis outputs. All maps of a data set share the
+same grid, so the grid coordinates are transformed to every map projection only
+once (instead of by cartopy for every pcolormesh call). The queued figures are then
+rendered in worker processes, either as vector pdf (with the map itself rasterized)
+or as png for a cheaper raster output.
+
+Example:
+    renderer = FigureRenderer(box, fmt="png", workers=4)
+    renderer.add(os.path.join(dir_fig, "event_count"), np.sum(m, axis=0), vmin=0.1)
+    renderer.add(os.path.join(dir_fig, "data_time0"), data[0], projection="mollweide")
+    paths = renderer.render()
+"""
+# ---------------------------------------------------------------------------
+from concurrent.futures import ProcessPoolExecutor
+
+import cartopy.crs as ccrs
+import matplotlib.pyplot as plt
+import numpy as np
+
+# supported projections, created by name such that the worker processes do not need
+# to receive projection objects
+PROJECTIONS = {
+    "mollweide": lambda: ccrs.Mollweide(),
+    "orthographic_np": lambda: ccrs.Orthographic(central_longitude=0, central_latitude=90),
+    "plate_carree": lambda: ccrs.PlateCarree()
+}
+
+
+def grid_edges(centres, periodic=False):
+    """Edges of the grid cells from the coordinates of their centres
+
+    Args:
+        centres (np.ndarray): coordinates of the centres (lat or lon) in degrees
+    Optional:
+        periodic (boolean): whether the coordinate wraps around (lon)
+
+    Returns:
+        edges (np.ndarray): coordinates of the n+1 edges
+    """
+    centres = np.asarray(centres, dtype=np.float64)
+    middle = (centres[1:] + centres[:-1]) / 2
+    first = centres[0] - (middle[0] - centres[0])
+    last = centres[-1] + (centres[-1] - middle[-1])
+    edges = np.concatenate([[first], middle, [last]])
+    if not periodic:
+        # latitudes do not go beyond the poles
+        edges = np.clip(edges, -90, 90)
+    return edges
+
+
+def projected_grid(box, projection):
+    """Transform the cell edges of the grid of box to a map projection
+
+    Args:
+        box (Box): box of the data
+        projection (str): key of PROJECTIONS
+
+    Returns:
+        x, y, rows, order (tuple): projected coordinates of the cell edges with shape
+            (lat + 1, lon + 1), the slice of latitudes that is visible in the
+            projection (e.g. only the northern hemisphere for orthographic_np) and the
+            order of the longitudes, which are sorted in [-180, 180) such that no
+            cell crosses the edge of the map
+    """
+    lon_centres = (np.asarray(box.lon, dtype=np.float64) + 180) % 360 - 180
+    order = np.argsort(lon_centres, kind="stable")
+    lon_edges = np.clip(grid_edges(lon_centres[order], periodic=True), -180, 180)
+    lat_edges = grid_edges(box.lat)
+    lon, lat = np.meshgrid(lon_edges, lat_edges)
+    points = PROJECTIONS[projection]().transform_points(ccrs.PlateCarree(), lon, lat)
+
+    # keep the latitude rows of which all edges are visible
+    visible = np.all(np.isfinite(points[..., :2]), axis=(1, 2))
+    cells = np.flatnonzero(visible[1:] & visible[:-1])
+    if cells.size == 0:
+        raise ValueError(f"Grid is not visible in projection {projection}")
+    rows = slice(cells[0], cells[-1] + 1)
+    x = points[rows.start:rows.stop + 1, :, 0]
+    y = points[rows.start:rows.stop + 1, :, 1]
+    return x, y, rows, order
+
+
+def render_figure(path, x, y, data, projection, fmt="pdf", dpi=300, coastlines=True, **kwargs):
+    """Render a single map to path.fmt from a projected grid
+
+    Args:
+        path (str): path of the figure without extension
+        x, y (np.ndarray): projected cell edges, see projected_grid
+        data (np.ndarray): data of the visible cells, shape (x.shape[0] - 1,
+            x.shape[1] - 1)
+        projection (str): key of PROJECTIONS
+    Optional:
+        fmt (str): "pdf" or "png"
+        dpi (int): resolution of the (rasterized part of the) figure
+        coastlines (boolean): whether to draw coastlines
+        **kwargs: passed to pcolormesh, e.g. cmap, vmin and vmax
+
+    Returns:
+        path (str): path of the figure with extension
+    """
+    fig = plt.figure()
+    ax = fig.add_subplot(1, 1, 1, projection=PROJECTIONS[projection]())
+    ax.set_global()
+    # the coordinates are already projected, so cartopy does not transform the mesh
+    mesh = ax.pcolormesh(x, y, data, rasterized=True, **kwargs)
+    if coastlines:
+        ax.coastlines()
+    fig.colorbar(mesh, ax=ax, shrink=0.8)
+
+    path = ".".join([path, fmt])
+    fig.savefig(path, dpi=dpi, format=fmt)
+    plt.close(fig)
+    return path
+
+
+class FigureRenderer:
+    """Queue maps of data on the grid of box and render them in one batch
+
+    Args:
+        box (Box): box of the data, all maps must be on the same grid (lat, lon)
+    Optional:
+        fmt (str): "pdf" or "png" (cheaper raster output)
+        dpi (int): resolution of the figures
+        workers (int): number of worker processes, 1 renders in this process
+        coastlines (boolean): whether to draw coastlines
+    """
+
+    def __init__(self, box, fmt="pdf", dpi=300, workers=1, coastlines=True):
+        self.box = box
+        self.fmt = fmt
+        self.dpi = dpi
+        self.workers = workers
+        self.coastlines = coastlines
+        self.grids = {}
+        self.queue = []
+
+    def grid(self, projection):
+        """Projected grid of box, computed once per projection"""
+        if projection not in self.grids:
+            self.grids[projection] = projected_grid(self.box, projection)
+        return self.grids[projection]
+
+    def add(self, path, data, projection="orthographic_np", **kwargs):
+        """Queue a map of data (lat, lon)
+
+        Args:
+            path (str): path of the figure without extension
+            data (np.ndarray): data (lat, lon)
+        Optional:
+            projection (str): key of PROJECTIONS
+            **kwargs: passed to pcolormesh, e.g. cmap, vmin and vmax
+        """
+        x, y, rows, order = self.grid(projection)
+        self.queue.append((path, x, y, np.ma.asarray(data)[rows][:, order], projection, kwargs))
+
+    def render(self):
+        """Render all queued maps and empty the queue
+
+        Returns:
+            paths (list): paths of the figures
+        """
+        queue, self.queue = self.queue, []
+        options = {"fmt": self.fmt, "dpi": self.dpi, "coastlines": self.coastlines}
+        if self.workers == 1:
+            return [
+                render_figure(path, x, y, data, projection, **options, **kwargs)
+                for path, x, y, data, projection, kwargs in queue
+            ]
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(queue) or 1)) as executor:
+            futures = [
+                executor.submit(render_figure, path, x, y, data, projection, **options, **kwargs)
+                for path, x, y, data, projection, kwargs in queue
+            ]
+            return [future.result() for future in futures]
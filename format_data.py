@@ -1,22 +1,14 @@
 import os
-import xarray as xr
 
+from coordinates import alias_coordinates
 
-DIR_DATA = os.path.join("/nethome", "terps020", "cmip6", "data")
-
-fname = os.path.join(DIR_DATA, "pre_CMIP.GFDL-ESM4.1pctCO2.r1i1p1f1.SImon.siconc.gr.nc")
-ds_disk = xr.open_dataset(fname)
-ds_disk["lat"] = ds_disk.y
-ds_disk["lon"] = ds_disk.x
-fname = os.path.join(DIR_DATA, "CMIP.GFDL-ESM4.1pctCO2.r1i1p1f1.SImon.siconc.gr.nc")
-ds_disk.to_netcdf(os.path.join(DIR_DATA, fname))
-del ds_disk
 
+DIR_DATA = os.path.join("/nethome", "terps020", "cmip6", "data")
 
-fname = os.path.join(DIR_DATA, "pre_CMIP.GFDL-ESM4.piControl.r1i1p1f1.SImon.siconc.gr.nc")
-ds_disk = xr.open_dataset(fname)
-ds_disk["lat"] = ds_disk.y
-ds_disk["lon"] = ds_disk.x
-fname = os.path.join(DIR_DATA, "CMIP.GFDL-ESM4.piControl.r1i1p1f1.SImon.siconc.gr.nc")
-ds_disk.to_netcdf(os.path.join(DIR_DATA, fname))
-del ds_disk
+# add lon and lat coordinates to the preprocessed files themselves, next to x and y
+# (only the coordinates are written, x, y and the data are kept), and move them to
+# their final name instead of writing a copy of the data
+for scenario in ["1pctCO2", "piControl"]:
+    fname = os.path.join(DIR_DATA, f"pre_CMIP.GFDL-ESM4.{scenario}.r1i1p1f1.SImon.siconc.gr.nc")
+    alias_coordinates(fname)
+    os.replace(fname, os.path.join(DIR_DATA, f"CMIP.GFDL-ESM4.{scenario}.r1i1p1f1.SImon.siconc.gr.nc"))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" gradient_plots.py
+
+Density plots of the space and time gradients of the piControl run. Instead of
+drawing every (space gradient, time gradient) pair with plt.scatter, the pairs are
+binned into a 2d histogram, which is accumulated in blocks and shown as a single
+image. The cost of rendering (and the size of the figure) then no longer depends on
+the size of the grid.
+
+Example:
+    fig, ax = plot_gradient_density(sgrad_phys, tgrad, (Smin, Smax), (Tmin, Tmax))
+    ax.axvline(x=calibration['distance'][3], color='g', linestyle="--")
+    fig.savefig("gradients_piControl.pdf")
+"""
+# ---------------------------------------------------------------------------
+import matplotlib.colors as colors
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+class GradientHistogram:
+    """2d histogram of gradient pairs that can be accumulated block by block
+
+    Args:
+        x_range (tuple): (min, max) of the x axis (space gradient)
+        y_range (tuple): (min, max) of the y axis (time gradient)
+    Optional:
+        bins (tuple): number of bins along x and y
+    """
+
+    def __init__(self, x_range, y_range, bins=(400, 400)):
+        self.x_range = tuple(float(x) for x in x_range)
+        self.y_range = tuple(float(y) for y in y_range)
+        self.bins = tuple(bins)
+        self.counts = np.zeros(self.bins[::-1], dtype=np.int64)
+        # number of pairs outside of the ranges
+        self.outside = 0
+
+    def add(self, x, y, block_size=2**22):
+        """Add gradient pairs to the histogram
+
+        Args:
+            x, y (np.ndarray): gradients of the same shape, masked or nan values are
+                ignored
+        Optional:
+            block_size (int): number of pairs binned at once, bounds the temporary
+                memory
+        """
+        x = np.ma.filled(np.ma.masked_invalid(x), np.nan).ravel()
+        y = np.ma.filled(np.ma.masked_invalid(y), np.nan).ravel()
+        n_x, n_y = self.bins
+        scale_x = n_x / (self.x_range[1] - self.x_range[0])
+        scale_y = n_y / (self.y_range[1] - self.y_range[0])
+
+        for start in range(0, x.size, block_size):
+            i = np.floor((x[start:start + block_size] - self.x_range[0]) * scale_x)
+            j = np.floor((y[start:start + block_size] - self.y_range[0]) * scale_y)
+            with np.errstate(invalid="ignore"):
+                inside = (i >= 0) & (i < n_x) & (j >= 0) & (j < n_y)
+            valid = np.isfinite(i) & np.isfinite(j)
+            self.outside += int(np.count_nonzero(valid & ~inside))
+            index = j[inside].astype(np.int64) * n_x + i[inside].astype(np.int64)
+            self.counts += np.bincount(index, minlength=n_x * n_y).reshape(self.counts.shape)
+
+    @property
+    def extent(self):
+        """Extent (left, right, bottom, top) of the histogram for imshow"""
+        return self.x_range + self.y_range
+
+    def plot(self, ax=None, cmap="viridis", log=True):
+        """Show the histogram as an image, empty bins are transparent
+
+        Optional:
+            ax (matplotlib.axes.Axes): axes to plot in, default the current axes
+            cmap (str): colour map
+            log (boolean): whether to use a logarithmic colour scale
+
+        Returns:
+            image (matplotlib.image.AxesImage): image, e.g. for a colour bar
+        """
+        if ax is None:
+            ax = plt.gca()
+        counts = np.ma.masked_equal(self.counts, 0)
+        norm = None
+        if log and counts.count() > 0:
+            norm = colors.LogNorm(vmin=1, vmax=max(counts.max(), 2))
+        return ax.imshow(
+            counts, origin="lower", extent=self.extent, aspect="auto",
+            interpolation="nearest", cmap=cmap, norm=norm
+        )
+
+
+def plot_gradient_density(x, y, x_range, y_range, bins=(400, 400), colorbar=True):
+    """Density plot of gradient pairs, replacing plt.scatter(x, y)
+
+    Args:
+        x, y (np.ndarray): space and time gradients of the same shape
+        x_range, y_range (tuple): (min, max) of the axes
+    Optional:
+        bins (tuple): number of bins along x and y
+        colorbar (boolean): whether to add a colour bar with the number of grid
+            points per bin
+
+    Returns:
+        fig, ax (tuple): figure and axes, with the axis limits set to the ranges,
+            such that lines (quartiles, thresholds) can be added
+    """
+    histogram = GradientHistogram(x_range, y_range, bins=bins)
+    histogram.add(x, y)
+
+    fig, ax = plt.subplots()
+    image = histogram.plot(ax=ax)
+    if colorbar:
+        fig.colorbar(image, ax=ax, label="grid points")
+    ax.set_xlim(*x_range)
+    ax.set_ylim(*y_range)
+    return fig, ax
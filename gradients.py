@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" gradients.py
+
+Fused Sobel filter for the edge detection. The edge thinning uses the directions of
+the pixel based Sobel transform together with the magnitude of the calibrated
+physical Sobel transform. Both only differ by a scale factor per dimension, so the
+pixel based directions are derived from the output of a single (physical) run of
+hypercc's sobel_filter, instead of running sobel_filter(physical=True) and
+sobel_filter(physical=False) separately. The magnitudes are those of sobel_filter
+itself, the same as used by calibrate_sobel, and the result is written directly in
+the memory layout of hyper_canny.
+"""
+# ---------------------------------------------------------------------------
+import numpy as np
+
+from hypercc.filters import sobel_filter
+
+
+def physical_scale(box, weight, dtype=np.float64):
+    """Scale factors that convert a derivative per pixel to a derivative per unit of
+    weight, for each of the dimensions (time, lat, lon), from the grid spacing of the
+    box (box.resolution). In longitude the grid spacing decreases with the cosine of
+    the latitude.
+
+    Args:
+        box (Box): box of the data
+        weight (list): weights of the dimensions (pint quantities), e.g.
+            [sobel_delta_t, sobel_delta_d, sobel_delta_d]
+    Optional:
+        dtype (np.dtype): data type of the scale factors
+
+    Returns:
+        scale (list): scale factors, broadcastable to (time, lat, lon)
+    """
+    # grid boxes become narrower towards the poles, prevent division by zero
+    cos_lat = np.maximum(np.cos(np.radians(box.lat)), 1e-6)
+
+    return [
+        np.asarray(scale, dtype=dtype) for scale in (
+            (weight[0] / box.resolution[0]).to('dimensionless').magnitude,
+            (weight[1] / box.resolution[1]).to('dimensionless').magnitude,
+            (weight[2] / box.resolution[2]).to('dimensionless').magnitude / cos_lat[:, None]
+        )
+    ]
+
+
+def empty_gradient(shape, dtype=np.float64, layout="canny"):
+    """Allocate an output buffer for sobel_gradients
+
+    Args:
+        shape (tuple): shape (time, lat, lon) of the data
+    Optional:
+        dtype (np.dtype): data type
+        layout (str): "canny" stores the buffer as a C-contiguous (lon, lat, time, 4)
+            array, the layout expected by cp_edge_thinning and cp_double_threshold,
+            "time" as a C-contiguous (4, time, lat, lon) array
+
+    Returns:
+        out (np.ndarray): buffer of shape (4, time, lat, lon), for layout "canny" a
+            transposed view, such that out.transpose([3, 2, 1, 0]) needs no copy
+    """
+    if layout == "canny":
+        return np.empty(tuple(shape[::-1]) + (len(shape) + 1,), dtype=dtype).transpose(
+            [3, 2, 1, 0]
+        )
+    if layout == "time":
+        return np.empty((len(shape) + 1,) + tuple(shape), dtype=dtype)
+    raise ValueError(f"Unknown layout: {layout}")
+
+
+def canny_view(gradient):
+    """Return the (lon, lat, time, 4) view of a gradient for hyper_canny, which is
+    only a copy if gradient was not allocated in the canny layout
+
+    Args:
+        gradient (np.ndarray): output of sobel_gradients
+
+    Returns:
+        dat (np.ndarray): C-contiguous array of shape (lon, lat, time, 4)
+    """
+    return np.ascontiguousarray(gradient.transpose([3, 2, 1, 0]))
+
+
+def sobel_gradients(box, data, weight, out=None, layout="time"):
+    """Fused Sobel filter. Runs hypercc's sobel_filter once and returns in a single
+    buffer the directions of the pixel based Sobel transform and the inverse
+    magnitude of the physical Sobel transform, i.e. the same as
+
+        sb = sobel_filter(box, data, weight=weight)
+        pixel_sb = sobel_filter(box, data, physical=False)
+        pixel_sb[3] = sb[3]
+
+    The pixel based directions are the physical directions divided by the scale
+    factors of physical_scale (only their ratios matter), the magnitudes are copied
+    from sobel_filter.
+
+    Args:
+        box (Box): box of the data
+        data (np.ndarray): (smoothed) data with dimensions (time, lat, lon)
+        weight (list): weights of the dimensions (pint quantities)
+    Optional:
+        out (np.ndarray): output buffer of shape (4, time, lat, lon), by default of
+            the data type of data (e.g. float32)
+        layout (str): memory layout of the output if out is not given, see
+            empty_gradient. Use "canny" to pass the result to hyper_canny without
+            transposed copies (via canny_view)
+
+    Returns:
+        out (np.ndarray): array of shape (4, time, lat, lon). out[:3] contains the
+            unit vector of the pixel based gradient, out[3] one over the magnitude of
+            the physical gradient. Where the gradient is zero, out[:3] is zero and
+            out[3] is inf (as in sobel_filter), such that 1 / out[3] is zero
+    """
+    if out is None:
+        out = empty_gradient(
+            np.shape(data), dtype=np.ma.getdata(data).dtype, layout=layout
+        )
+
+    sb = np.ma.getdata(sobel_filter(box, data, weight=weight))
+    out[-1] = sb[-1]
+
+    # the physical directions are undefined (nan) where the gradient is zero
+    zero = ~np.isfinite(sb[-1])
+    pixel_norm = np.zeros(out.shape[1:], dtype=out.dtype)
+    for axis, scale in enumerate(physical_scale(box, weight, dtype=out.dtype)):
+        np.divide(sb[axis], scale, out=out[axis])
+        out[axis][zero] = 0
+        pixel_norm += out[axis]**2
+    del sb
+
+    # normalise the pixel based gradient to unit length
+    np.sqrt(pixel_norm, out=pixel_norm)
+    np.divide(out[:-1], pixel_norm, out=out[:-1], where=pixel_norm > 0)
+    return out
+
+
+def physical_gradient(box, gradient, weight, axis=None):
+    """Recover the gradient in physical units from the output of sobel_gradients
+
+    The physical gradient points in the direction of the pixel based gradient scaled
+    by the physical scale factors, with length 1 / gradient[3].
+
+    Args:
+        box (Box): box of the data
+        gradient (np.ndarray): output of sobel_gradients
+        weight (list): weights of the dimensions, the same as used for gradient
+    Optional:
+        axis (int or tuple): dimension(s) of the gradient to return, default all
+
+    Returns:
+        physical (np.ndarray): gradient component(s) in units of data per weight, e.g.
+            K / year in time and K / km in space
+    """
+    scale = physical_scale(box, weight, dtype=gradient.dtype)
+    scaled_norm = np.sqrt(sum(
+        (gradient[i] * scale[i])**2 for i in range(gradient.shape[0] - 1)
+    ))
+    axes = range(gradient.shape[0] - 1) if axis is None else np.atleast_1d(axis)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # nan where the gradient is zero (gradient[-1] is inf), which gives zero below
+        scaled_norm *= gradient[-1]
+        physical = np.stack([
+            np.where(
+                scaled_norm > 0, gradient[i] * scale[i] / scaled_norm,
+                gradient.dtype.type(0)
+            )
+            for i in axes
+        ])
+    if np.isscalar(axis):
+        return physical[0]
+    return physical
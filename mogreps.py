@@ -2,7 +2,14 @@
 Utility functions to retrieve data from the MOGREPS repository.
 """
 
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+from datetime import timedelta
+import itertools
+import os
 from pathlib import Path
+import threading
 
 import boto3
 import botocore
@@ -44,4 +51,160 @@ def download_data(bucket, name, data_folder=Path("data")):
     else:
         print("File {} already exists.".format(target))
         
-    return target
\ No newline at end of file
+    return target
+
+
+def make_data_object_names(
+        dataset_name,
+        start_date, end_date, hours,
+        realizations, forecast_periods):
+    """Create the filenames of all combinations of the dates from `start_date` to
+    `end_date` (inclusive, `datetime.date`), run hours, realizations and forecast
+    periods."""
+    n_days = (end_date - start_date).days + 1
+    dates = [start_date + timedelta(days=i) for i in range(n_days)]
+    return [
+        make_data_object_name(
+            dataset_name, date.year, date.month, date.day, hour,
+            realization, forecast_period)
+        for date, hour, realization, forecast_period in itertools.product(
+            dates, hours, realizations, forecast_periods)
+    ]
+
+
+def make_client(max_pool_connections=16, endpoint_url=None):
+    """Create an anonymous S3 client. Unlike the `s3` resource, a client can be
+    shared by threads, which then share its pool of connections.
+
+    `endpoint_url` can point to another S3-compatible service, e.g. a local
+    stand-in for testing."""
+    return boto3.client(
+        's3', endpoint_url=endpoint_url,
+        config=botocore.client.Config(
+            signature_version=botocore.UNSIGNED,
+            max_pool_connections=max_pool_connections))
+
+
+class DiskCache:
+    """Folder of downloaded files with a maximum total size. When the size is
+    exceeded, the least recently used files are removed. Use is recorded in the
+    modification time of the files, so it is kept between sessions.
+
+    Files can be pinned, e.g. the files of a request that is still running, such
+    that they are not evicted. While more is pinned than fits, the cache exceeds
+    `max_bytes` until the next file is stored after unpinning.
+
+    Counts hits, misses and evicted files in `stats`."""
+
+    def __init__(self, folder=Path("data"), max_bytes=10 * 1024**3):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._pins = collections.Counter()
+        self._sizes = {
+            path.name: path.stat().st_size
+            for path in self.folder.iterdir()
+            if path.is_file() and not path.name.endswith(".part")}
+
+    @property
+    def size(self):
+        """Total size of the cached files in bytes."""
+        return sum(self._sizes.values())
+
+    @contextlib.contextmanager
+    def pinned(self, names):
+        """Keep the files `names` in the cache within the `with` block."""
+        names = list(names)
+        with self._lock:
+            self._pins.update(names)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins.subtract(names)
+                self._pins += collections.Counter()
+
+    def get(self, name):
+        """Path of a cached file (marked as used), or None on a miss."""
+        target = self.folder / name
+        with self._lock:
+            if name in self._sizes and target.exists():
+                os.utime(target)
+                self.stats["hits"] += 1
+                return target
+            self._sizes.pop(name, None)
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, name, download):
+        """Store a file that is written by `download(path)` and return its path.
+        Files are written under a temporary name first, such that an interrupted
+        download is never mistaken for a cached file."""
+        target = self.folder / name
+        part = self.folder / "{}.{}.part".format(name, threading.get_ident())
+        try:
+            download(part)
+            os.replace(part, target)
+        finally:
+            if part.exists():
+                part.unlink()
+        with self._lock:
+            self._sizes[name] = target.stat().st_size
+            self._evict(keep=name)
+        return target
+
+    def _evict(self, keep):
+        """Remove the least recently used files until the cache fits."""
+        size = self.size
+        if size <= self.max_bytes:
+            return
+        used = sorted(
+            (self._mtime(name), name) for name in self._sizes
+            if name != keep and name not in self._pins)
+        for _, name in used:
+            if size <= self.max_bytes:
+                break
+            (self.folder / name).unlink(missing_ok=True)
+            size -= self._sizes.pop(name)
+            self.stats["evictions"] += 1
+
+    def _mtime(self, name):
+        try:
+            return (self.folder / name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+
+def fetch_data(bucket, names, cache=None, workers=16, client=None):
+    """Download many files from the Amazon AWS at the same time, through a cache.
+    The threads share a single client and its pool of connections.
+
+    Returns a dict with the `pathlib.Path` of every name, or None if the object
+    does not exist. The files of the request are pinned in the cache until all of
+    them are downloaded, so none of the returned paths has been evicted."""
+    cache = DiskCache() if cache is None else cache
+    client = make_client(max_pool_connections=workers) if client is None else client
+
+    def fetch(name):
+        target = cache.get(name)
+        if target is not None:
+            return target
+        try:
+            return cache.put(
+                name,
+                lambda path: client.download_file(bucket, name, str(path)))
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ("404", "NoSuchKey"):
+                print("The object {} does not exist.".format(name))
+                return None
+            raise
+
+    with cache.pinned(names), ThreadPoolExecutor(max_workers=workers) as executor:
+        paths = dict(zip(names, executor.map(fetch, names)))
+
+    print("{hits} hits, {misses} misses, {evictions} evictions".format(
+        **cache.stats), end=", ")
+    print("cache size {:.1f} MiB".format(cache.size / 1024**2))
+    return paths
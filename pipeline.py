@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" pipeline.py
+
+The edge detection workflow (taper -> gaussian -> sobel -> thinning -> double
+threshold -> labelling -> abruptness) expressed as a graph of stages. The output of
+every stage is memoized by a fingerprint of its inputs and parameters, so that
+consumers of the same stage and re-runs (e.g. re-executing a notebook cell) reuse
+the earlier result instead of recomputing it. The fingerprint includes the code of
+the stages, so outputs stored on disk are recomputed after the code changes, and
+the stored outputs are bounded in total size, the least recently used are removed
+first.
+"""
+# ---------------------------------------------------------------------------
+import functools
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+
+import numpy as np
+from scipy import ndimage
+
+from hyper_canny import cp_edge_thinning, cp_double_threshold
+
+from hypercc.filters import taper_masked_area
+
+from abruptness import compute_abruptness
+from gradients import sobel_gradients, canny_view
+from smoothing import gaussian_smooth
+from tapering import taper_nearest
+from transforms import TRANSFORMS
+
+# maximum total size in bytes of the persistent stage outputs in a cache directory
+CACHE_SIZE = 20 * 1024**3
+
+# modules and packages of which the code determines the stage outputs
+CODE_MODULES = ["pipeline", "abruptness", "gradients", "smoothing", "tapering", "transforms"]
+CODE_PACKAGES = ["hypercc", "hyper_canny", "numpy", "scipy"]
+
+
+def fingerprint_value(value):
+    """Return a fingerprint (hex digest) of a parameter or input value. Arrays are
+    fingerprinted by their content, other values by their representation.
+    """
+    sha1 = hashlib.sha1()
+    if isinstance(value, np.ndarray):
+        sha1.update(str((value.shape, value.dtype)).encode())
+        sha1.update(np.ascontiguousarray(np.ma.getdata(value)).data)
+        if np.ma.is_masked(value):
+            sha1.update(np.ascontiguousarray(np.ma.getmaskarray(value)).data)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            sha1.update(fingerprint_value(item).encode())
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            sha1.update(str(key).encode())
+            sha1.update(fingerprint_value(value[key]).encode())
+    else:
+        sha1.update(repr(value).encode())
+    return sha1.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Return a fingerprint of the code behind the stages: the source files of
+    CODE_MODULES and the versions of CODE_PACKAGES
+    """
+    sha1 = hashlib.sha1()
+    for name in CODE_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as reader:
+            sha1.update(reader.read())
+    for name in CODE_PACKAGES:
+        version = getattr(importlib.import_module(name), "__version__", None)
+        sha1.update(f"{name}={version}".encode())
+    return sha1.hexdigest()
+
+
+def function_source(func):
+    """Return the source code of func (its bytecode if the source is not available,
+    e.g. for functions defined in an interactive session)
+    """
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return getattr(getattr(func, "__code__", None), "co_code", None)
+
+
+def evict_outputs(cache_dir, max_size=CACHE_SIZE, keep=None):
+    """Remove the least recently used stage outputs from cache_dir until their total
+    size is at most max_size
+
+    Args:
+        cache_dir (str): cache directory
+    Optional:
+        max_size (int): maximum total size in bytes
+        keep (str): path of an output that is not removed (the one just written)
+    """
+    outputs = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".pkl") and entry.is_file():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                outputs.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    size = sum(output_size for _, output_size, _ in outputs)
+    for _, output_size, path in sorted(outputs):
+        if size <= max_size:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        size -= output_size
+
+
+class StageGraph:
+    """Graph of memoized pipeline stages
+
+    Every stage remembers its last result together with the fingerprint of its
+    inputs, its parameters and its code (see code_version). A stage is only
+    recomputed when this fingerprint changes. Stages added with persist=True are
+    also written to (and read from) cache_dir, such that they survive the python
+    session. The least recently used outputs in cache_dir are removed when their
+    total size exceeds max_size.
+
+    Optional:
+        cache_dir (str): directory for persistent stage outputs
+        max_size (int): maximum total size of the outputs in cache_dir in bytes
+    """
+
+    def __init__(self, cache_dir=None, max_size=CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.stages = {}
+        self.memory = {}
+        # number of times each stage was computed or served from memory or cache
+        self.status = {}
+
+    def add_input(self, name, value, fingerprint=None):
+        """Add a value to the graph, e.g. the loaded data set
+
+        Args:
+            name (str): name of the stage
+            value: the value
+        Optional:
+            fingerprint (str): fingerprint of the value, computed from its content if
+                not given
+        """
+        if fingerprint is None:
+            fingerprint = fingerprint_value(value)
+        self.stages[name] = {"value": value, "fingerprint": fingerprint}
+
+    def add_stage(self, name, func, inputs=(), params=None, persist=False, options=None):
+        """Add a stage computing func(*inputs, **params, **options)
+
+        Args:
+            name (str): name of the stage
+            func (callable): function computing the stage output
+        Optional:
+            inputs (tuple): names of the stages whose outputs are passed to func
+            params (dict): keyword arguments passed to func
+            persist (boolean): whether to store the output in cache_dir as well
+            options (dict): keyword arguments passed to func that do not change its
+                output (e.g. the number of workers), these are not fingerprinted
+        """
+        self.stages[name] = {
+            "func": func,
+            "inputs": tuple(inputs),
+            "params": params or {},
+            "options": options or {},
+            "persist": persist and self.cache_dir is not None
+        }
+
+    def fingerprint(self, name):
+        """Return the fingerprint of a stage, which depends on the fingerprints of
+        all upstream stages and on the code
+        """
+        stage = self.stages[name]
+        if "value" in stage:
+            return stage["fingerprint"]
+        return fingerprint_value([
+            stage["func"].__module__, stage["func"].__qualname__,
+            function_source(stage["func"]), code_version(),
+            [self.fingerprint(upstream) for upstream in stage["inputs"]],
+            stage["params"]
+        ])
+
+    def get(self, name):
+        """Return the output of a stage, computing it (and its upstream stages) only
+        if it is not available in memory or in the cache directory
+        """
+        stage = self.stages[name]
+        if "value" in stage:
+            return stage["value"]
+
+        fingerprint = self.fingerprint(name)
+        if name in self.memory and self.memory[name][0] == fingerprint:
+            self._log(name, "memory")
+            return self.memory[name][1]
+
+        cache_path = None
+        if stage["persist"]:
+            cache_path = os.path.join(self.cache_dir, f"{name}.{fingerprint}.pkl")
+            try:
+                with open(cache_path, "rb") as reader:
+                    value = pickle.load(reader)
+                # mark as recently used
+                os.utime(cache_path)
+            except FileNotFoundError:
+                # not stored yet, or evicted by another process
+                pass
+            else:
+                self.memory[name] = (fingerprint, value)
+                self._log(name, "cache")
+                return value
+
+        value = stage["func"](
+            *[self.get(upstream) for upstream in stage["inputs"]], **stage["params"],
+            **stage["options"]
+        )
+        self.memory[name] = (fingerprint, value)
+        self._log(name, "computed")
+
+        if cache_path is not None:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            # other processes may read the same output, write it atomically
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as writer:
+                pickle.dump(value, writer)
+            os.replace(tmp_path, cache_path)
+            evict_outputs(self.cache_dir, self.max_size, keep=cache_path)
+        return value
+
+    def _log(self, name, source):
+        counts = self.status.setdefault(name, {})
+        counts[source] = counts.get(source, 0) + 1
+
+    def drop(self, name):
+        """Release the memoized output of a stage to free memory"""
+        self.memory.pop(name, None)
+
+    def report(self):
+        """Print for every stage whether it was computed or served from memory or
+        cache
+        """
+        for name, stage in self.stages.items():
+            if "value" in stage:
+                continue
+            counts = self.status.get(name, {})
+            sources = ", ".join(
+                f"{source} ({count}x)" for source, count in counts.items()
+            )
+            print("{:12}: {}".format(name, sources or "not used"))
+
+
+def taper(data, sigma=(0, 5, 5), iterations=50, method="iterative", cache_dir=None):
+    """Smooth over continental boundaries (on a copy, data is not modified), with
+    hypercc's taper_masked_area (method "iterative") or in a single pass from the
+    nearest valid grid cells (method "nearest", see tapering.taper_nearest, which
+    stores its tables in cache_dir)
+    """
+    data = data.copy()
+    if method == "nearest":
+        return taper_nearest(data, sigma, cache_dir=cache_dir)
+    if method != "iterative":
+        raise ValueError(f"Unknown taper method: {method}")
+    taper_masked_area(data, list(sigma), iterations)
+    return data
+
+
+def smooth(box, data, sigma, workers=1):
+    """Gaussian smoothing with hypercc's gaussian_filter with sigma = [sigma_t,
+    sigma_d, sigma_d], keeping the data type of data (e.g. float32), on a pool of
+    threads if workers > 1 (see smoothing.gaussian_smooth, the result is the same)
+    """
+    return gaussian_smooth(box, data, list(sigma), workers=workers).astype(
+        data.dtype, copy=False
+    )
+
+
+def canny_input(gradient):
+    """Put the gradient in the (lon, lat, time, 4) layout expected by hyper_canny, a
+    view (no copy) if the gradient was computed in the canny layout
+    """
+    return canny_view(gradient)
+
+
+def thinning(dat, data, n_boundary=10):
+    """Edge thinning, masking the land/sea mask and the first and last time steps.
+    The result is a (time, lat, lon) view of the hyper_canny output
+    """
+    thinned = cp_edge_thinning(dat).transpose([2, 1, 0])
+    thinned *= ~np.ma.getmaskarray(data)
+    thinned[:n_boundary] = 0
+    thinned[-n_boundary:] = 0
+    return thinned
+
+
+def double_threshold(dat, thinned, upper_threshold, lower_threshold):
+    """Hysteresis thresholding of the thinned edges"""
+    edges = cp_double_threshold(
+        data=dat, mask=thinned.transpose([2, 1, 0]), a=1/upper_threshold,
+        b=1/lower_threshold
+    )
+    return edges.transpose([2, 1, 0])
+
+
+def label(edges):
+    """Label the connected edges (events)"""
+    return ndimage.label(edges, ndimage.generate_binary_structure(3, 3))
+
+
+def edge_detection_graph(
+        box, data, years, sigma_t, sigma_d, sobel_weights, upper_threshold,
+        lower_threshold, cutoff_length=2, chunk_max_length=30, chunk_min_length=15,
+        cache_dir=None, dtype=None, smooth_workers=1, taper_method="iterative",
+        transform=None, transform_params=None):
+    """Build the stage graph of the edge detection of a single data set
+
+    Args:
+        box (Box): box of the data
+        data (np.ndarray): (masked) data
+        years (np.ndarray): year of every time step
+        sigma_t, sigma_d (pint.Quantity): smoothing scales in time and space
+        sobel_weights (list): weights of the Sobel operator
+        upper_threshold, lower_threshold (float): hysteresis thresholds
+    Optional:
+        cutoff_length, chunk_max_length, chunk_min_length (int): settings of the
+            abruptness (see compute_abruptness)
+        cache_dir (str): directory for persistent stage outputs
+        dtype (np.dtype): data type of the whole pipeline, e.g. np.float32 to halve
+            the memory. By default the data type of data
+        smooth_workers (int): number of threads of the Gaussian smoothing (see
+            smoothing.gaussian_smooth), the result does not depend on it
+        taper_method (str): "iterative" (hypercc's taper_masked_area) or "nearest"
+            (tapering.taper_nearest)
+        transform (str): name of a transform along time that is applied to data
+            before tapering and smoothing, see transforms.TRANSFORMS (e.g.
+            "cumulative_sum" for accumulated fields)
+        transform_params (dict): keyword arguments of the transform, e.g.
+            {"exclusive": True} or {"window": 5}
+
+    Returns:
+        graph (StageGraph): with the stages ("transformed"), "tapered", "smooth",
+            "sobel", "dat", "thinned", "edges", "labels" and "abruptness"
+    """
+    if dtype is not None:
+        data = data.astype(dtype, copy=False)
+
+    graph = StageGraph(cache_dir=cache_dir)
+    graph.add_input("box", box, fingerprint=fingerprint_value([box.time, box.lat, box.lon]))
+    graph.add_input("data", data)
+    graph.add_input("years", years)
+
+    source = "data"
+    if transform is not None:
+        graph.add_stage(
+            "transformed", TRANSFORMS[transform], ("data",), transform_params or {}
+        )
+        source = "transformed"
+
+    graph.add_stage(
+        "tapered", taper, (source,), {"method": taper_method}, persist=True,
+        options={"cache_dir": cache_dir}
+    )
+    graph.add_stage(
+        "smooth", smooth, ("box", "tapered"),
+        {"sigma": [sigma_t, sigma_d, sigma_d]}, persist=True,
+        options={"workers": smooth_workers}
+    )
+    graph.add_stage(
+        "sobel", sobel_gradients, ("box", "smooth"),
+        {"weight": sobel_weights, "layout": "canny"}
+    )
+    graph.add_stage("dat", canny_input, ("sobel",))
+    graph.add_stage("thinned", thinning, ("dat", "data"))
+    graph.add_stage(
+        "edges", double_threshold, ("dat", "thinned"),
+        {"upper_threshold": upper_threshold, "lower_threshold": lower_threshold}
+    )
+    graph.add_stage("labels", label, ("edges",))
+    graph.add_stage(
+        "abruptness", compute_abruptness, ("edges", "tapered", "years"),
+        {
+            "cutoff_length": cutoff_length, "chunk_max_length": chunk_max_length,
+            "chunk_min_length": chunk_min_length
+        }
+    )
+    return graph
+
+
+def precision_check(box, data, sigma_t, sigma_d, sobel_weights, dtype=np.float32, rtol=1e-3):
+    """Check that running the pipeline (taper, smoothing, sobel) in a lower precision
+    gives the same gradients as in float64, within a tolerance
+
+    Args:
+        box (Box): box of the data
+        data (np.ndarray): (masked) data
+        sigma_t, sigma_d (pint.Quantity): smoothing scales in time and space
+        sobel_weights (list): weights of the Sobel operator
+    Optional:
+        dtype (np.dtype): data type to check
+        rtol (float): tolerance, relative to the maximum gradient magnitude
+
+    Returns:
+        passed, errors (tuple): whether both errors are below rtol and a dict with the
+            maximum error of the gradient magnitude (relative to its maximum) and of the
+            gradient direction (unit vector) where the magnitude is significant
+    """
+    gradients = []
+    for check_dtype in (np.float64, dtype):
+        smooth_data = smooth(
+            box, taper(data.astype(check_dtype)), [sigma_t, sigma_d, sigma_d]
+        )
+        gradients.append(sobel_gradients(box, smooth_data, sobel_weights))
+    reference, gradient = gradients
+
+    with np.errstate(divide="ignore"):
+        signal_reference = 1 / reference[3]
+        signal = 1 / gradient[3].astype(np.float64)
+    scale = signal_reference.max()
+    significant = signal_reference > rtol * scale
+
+    errors = {
+        "magnitude": float(np.abs(signal - signal_reference).max() / scale),
+        "direction": float(np.abs(
+            gradient[:3, significant] - reference[:3, significant]
+        ).max(initial=0))
+    }
+    print("maximum error of {} w.r.t. float64: {}".format(np.dtype(dtype).name, errors))
+    return all(error <= rtol for error in errors.values()), errors
@@ -13,6 +13,8 @@ import os
 import shutil
 import sys
 
+from drs_index import drs_index, find_file, parse_drs, piControl_drs
+
 
 def preprocessing_wrapper(ds):
 
@@ -61,15 +63,7 @@ def find_filename(dir, experiment_id):
     """Find file name for given experiment_id in dir (assumes only one file for each
     scenario/experiment_id) --> works only in connection with edge_cmip6.sh workflow.
     """
-    for file in os.listdir(os.fsencode(dir)):
-        fname_in_dir = os.fsdecode(file)
-        if experiment_id in fname_in_dir:
-            if fname_in_dir.endswith(".sh"):
-                return fname_in_dir
-    else:
-        raise FileNotFoundError(
-            f"Could not found file for experiment_id: {experiment_id}..."
-        )
+    return find_file(dir, extension="sh", experiment_id=experiment_id)
 
 
 if __name__ == '__main__':
@@ -90,12 +84,15 @@ if __name__ == '__main__':
         "/nethome", "terps020", "cmip6", "wget", variable, "piControl"
     )
 
-    # check if piControl file exists
-    wget_piControl = wget_var.split(".").copy()
-    wget_piControl[2] = "piControl"
-    wget_piControl = ".".join(wget_piControl)
+    # check if piControl file (same model, member, table, variable and grid) exists
+    drs_var = parse_drs(wget_var)
+    if drs_var is None:
+        raise RuntimeError("{} is not a CMIP6 DRS file name".format(wget_var))
+    wget_piControl = drs_index(DIR_WGET_PICONTROL, extension="sh").get(
+        piControl_drs(drs_var)
+    )
     print(wget_var, wget_piControl)
-    if not os.path.isfile(os.path.join(DIR_WGET_PICONTROL, wget_piControl)):
+    if wget_piControl is None:
         raise RuntimeError("No associated piControl wget script to {}".format(wget_var))
 
     ## WARNING: temporary only use files that are already in gr format
@@ -17,6 +17,9 @@ import xarray as xr
 import xmip.preprocessing as xmip_pre
 from xmip.postprocessing import match_metrics
 
+from drs_index import find_file
+from store import write_dataset
+
 # import shapely
 # import warnings
 # from shapely.errors import ShapelyDeprecationWarning
@@ -70,15 +73,7 @@ def find_filename(dir, experiment_id):
     """Find file name for given experiment_id in dir (assumes only one file for each
     scenario/experiment_id) --> works only in connection with edge_cmip6.sh workflow.
     """
-    for file in os.listdir(os.fsencode(dir)):
-        fname_in_dir = os.fsdecode(file)
-        if experiment_id in fname_in_dir:
-            if fname_in_dir.endswith(".sh"):
-                return fname_in_dir
-    else:
-        raise FileNotFoundError(
-            f"Could not found file for experiment_id: {experiment_id}..."
-        )
+    return find_file(dir, extension="sh", experiment_id=experiment_id)
 
 
 if __name__ == '__main__':
@@ -100,10 +95,10 @@ if __name__ == '__main__':
 
     ## TODO: Concatenate files if necessary
 
-    # save and remove from memory to speed-up and save space
+    # save to the store (chunked per time step and compressed) and remove from memory
     ## TODO: make sure to save to correct file name (should be correct now)
     ds_var_fname_save = ".".join(wget_var.split(".")[:-1]) + ".nc"
-    ds_var.to_netcdf(os.path.join(DIR_DATATEMP, ds_var_fname_save))
+    write_dataset(ds_var, DIR_DATATEMP, ds_var_fname_save, variable)
     del ds_var
 
     ds_piControl_fname = find_filename(DIR_DATATEMP, "piControl")
@@ -113,9 +108,9 @@ if __name__ == '__main__':
 
     ## TODO: Concatenate files if necessary
 
-    # save and remove from memory to speed-up and save space
+    # save to the store (chunked per time step and compressed) and remove from memory
     ## TODO: make sure to save to correct file name (should be correct now)
     # ds_piControl_fname = "CMIP.source_id.experiment_id.member_id.table_id.variable_id.gr.nc"
     ds_piControl_fname_save = ".".join(wget_piControl.split(".")[:-1]) + ".nc"
-    ds_piControl.to_netcdf(os.path.join(DIR_DATATEMP, ds_piControl_fname_save))
+    write_dataset(ds_piControl, DIR_DATATEMP, ds_piControl_fname_save, variable)
     del ds_piControl
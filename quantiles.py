@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" quantiles.py
+
+Streaming percentiles of the Sobel signal (1 / sb[3]), for choosing the hysteresis
+thresholds of data sets without a control run. The values are counted in
+logarithmically spaced bins (a mergeable histogram), such that every percentile is
+known within a fixed relative error, without copying or sorting the whole signal.
+
+Example:
+    sketch = signal_quantiles(sb)
+    upper_threshold, lower_threshold = sketch.percentile([99.99, 95])
+"""
+# ---------------------------------------------------------------------------
+import numpy as np
+
+
+class QuantileSketch:
+    """Mergeable histogram of positive values with logarithmic bins. Bin i holds the
+    values in (gamma**(i-1), gamma**i], with gamma = (1 + alpha) / (1 - alpha), such
+    that the centre of a bin is within a relative error alpha of all its values.
+    Zeros are counted separately.
+
+    Optional:
+        relative_accuracy (float): relative error alpha of the percentiles
+    """
+
+    def __init__(self, relative_accuracy=1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.counts = np.zeros(0, dtype=np.int64)
+        # index of the first bin in counts
+        self.offset = 0
+        self.zeros = 0
+
+    @property
+    def count(self):
+        """Number of non-zero values"""
+        return int(self.counts.sum())
+
+    def _grow(self, low, high):
+        """Make room for the bins low to high (inclusive)"""
+        if self.counts.size == 0:
+            self.offset = low
+            self.counts = np.zeros(high - low + 1, dtype=np.int64)
+            return
+        new_offset = min(low, self.offset)
+        new_size = max(high + 1, self.offset + self.counts.size) - new_offset
+        if new_offset != self.offset or new_size != self.counts.size:
+            counts = np.zeros(new_size, dtype=np.int64)
+            start = self.offset - new_offset
+            counts[start:start + self.counts.size] = self.counts
+            self.counts, self.offset = counts, new_offset
+
+    def add(self, values):
+        """Add values to the sketch. Zeros are counted separately, masked, negative and
+        non-finite values are ignored.
+
+        Args:
+            values (array like): values of any shape
+        """
+        values = np.ma.filled(np.ma.masked_invalid(values).astype(np.float64), np.nan).ravel()
+        with np.errstate(invalid="ignore"):
+            self.zeros += int(np.count_nonzero(values == 0))
+            values = values[values > 0]
+        if values.size == 0:
+            return
+        index = np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+        low, high = int(index.min()), int(index.max())
+        self._grow(low, high)
+        self.counts[low - self.offset:high - self.offset + 1] += np.bincount(
+            index - low, minlength=high - low + 1
+        )
+
+    def merge(self, other):
+        """Add the counts of another sketch with the same relative accuracy"""
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches with a different relative accuracy cannot be merged")
+        self.zeros += other.zeros
+        if other.counts.size == 0:
+            return
+        self._grow(other.offset, other.offset + other.counts.size - 1)
+        start = other.offset - self.offset
+        self.counts[start:start + other.counts.size] += other.counts
+
+    def percentile(self, q, include_zeros=False):
+        """Percentile(s) of the values, like np.percentile with the nearest rank
+
+        Args:
+            q (float or list): percentile(s) in [0, 100]
+        Optional:
+            include_zeros (boolean): whether the zeros count as values, by default the
+                percentiles are those of the non-zero values
+
+        Returns:
+            percentile (float or np.ndarray): value(s) within the relative accuracy
+        """
+        q = np.asarray(q, dtype=np.float64)
+        zeros = self.zeros if include_zeros else 0
+        n = zeros + self.count
+        if n == 0:
+            raise ValueError("No values were added to the sketch")
+        rank = np.round(q / 100 * (n - 1)).astype(np.int64)
+
+        cumulative = np.cumsum(self.counts)
+        index = np.searchsorted(cumulative, rank - zeros, side="right")
+        index = np.minimum(index, self.counts.size - 1)
+        centre = 2 * self.gamma**(index + self.offset) / (self.gamma + 1)
+        result = np.where(rank < zeros, 0.0, centre)
+        return float(result) if result.ndim == 0 else result
+
+
+def signal_quantiles(gradient, block_size=120, relative_accuracy=1e-3):
+    """Sketch of the signal 1 / gradient[3], accumulated block by block along time
+
+    Args:
+        gradient (array like): output of sobel_filter or gradients.sobel_gradients
+            (4, time, lat, lon), may be memory mapped
+    Optional:
+        block_size (int): number of time steps per block
+        relative_accuracy (float): relative error of the percentiles
+
+    Returns:
+        sketch (QuantileSketch): sketch of the signal
+    """
+    sketch = QuantileSketch(relative_accuracy=relative_accuracy)
+    n_time = gradient.shape[1]
+    for start in range(0, n_time, block_size):
+        with np.errstate(divide="ignore"):
+            sketch.add(1 / np.asarray(gradient[3, start:start + block_size], dtype=np.float64))
+    return sketch
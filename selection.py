@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" selection.py
+
+Lazy selection of a month, season or the annual mean from monthly CMIP6 data. The
+selection is done while reading the netCDF file: for a single month only every
+12th time step is read, and seasonal and annual means are computed a few years at a
+time, instead of loading the full monthly record and slicing it afterwards.
+
+Example:
+    data, time_slice = read_selection(fpath, "tas", month=13, dtype=np.float32)
+    box = DataSet.cmip6(path=Path(fpath), variable="tas")[time_slice].box
+"""
+# ---------------------------------------------------------------------------
+import netCDF4
+import numpy as np
+
+MONTHS_PER_YEAR = 12
+
+# months of the seasons as offsets from January of the same year, DJF uses the
+# December of the previous year
+SEASONS = {
+    "DJF": (-1, 0, 1),
+    "MAM": (2, 3, 4),
+    "JJA": (5, 6, 7),
+    "SON": (8, 9, 10)
+}
+
+
+def selection_months(month):
+    """Months (offsets from January) that are averaged for a selection
+
+    Args:
+        month (int or str): 1-12 for a single month, 13 for the annual mean or a
+            season ("DJF", "MAM", "JJA" or "SON")
+
+    Returns:
+        offsets (tuple): month offsets, e.g. (5, 6, 7) for "JJA"
+    """
+    if month in SEASONS:
+        return SEASONS[month]
+    if month == 13:
+        return tuple(range(MONTHS_PER_YEAR))
+    if isinstance(month, (int, np.integer)) and 1 <= month <= 12:
+        return (int(month) - 1,)
+    raise ValueError(f"Unknown month selection: {month}")
+
+
+def selection_years(n_time, month):
+    """Years for which the selection is complete
+
+    Args:
+        n_time (int): number of (monthly) time steps in the file
+        month (int or str): see selection_months
+
+    Returns:
+        first_year, n_years (tuple): first year (index) and number of years
+    """
+    offsets = selection_months(month)
+    first_year = 1 if min(offsets) < 0 else 0
+    last_year = (n_time - 1 - max(offsets)) // MONTHS_PER_YEAR
+    return first_year, max(last_year - first_year + 1, 0)
+
+
+def selection_slice(n_time, month):
+    """Slice of the time axis of the (monthly) box that gives one time step per
+    selected year, e.g. for DataSet[time_slice].box
+
+    Args:
+        n_time (int): number of time steps in the file
+        month (int or str): see selection_months
+
+    Returns:
+        time_slice (slice): for a single month the month itself, otherwise the first
+            month of the season or year
+    """
+    offsets = selection_months(month)
+    first_year, n_years = selection_years(n_time, month)
+    start = first_year * MONTHS_PER_YEAR + min(offsets)
+    return slice(start, start + n_years * MONTHS_PER_YEAR, MONTHS_PER_YEAR)
+
+
+def read_selection(fpath, variable, month=13, dtype=np.float64, years_per_read=10):
+    """Read the selected month, season or annual mean of a variable from a file with
+    monthly data, reading only the time steps that are needed
+
+    Args:
+        fpath (str): path to the netCDF file
+        variable (str): variable from CMIP6
+    Optional:
+        month (int or str): 1-12 for a single month, 13 for the annual mean or a
+            season ("DJF", "MAM", "JJA" or "SON")
+        dtype (np.dtype): data type of the result
+        years_per_read (int): number of years read at once for seasonal and annual
+            means
+
+    Returns:
+        data, time_slice (tuple): masked array (year, lat, lon) and the slice of the
+            time axis of the monthly box that corresponds to it (see selection_slice)
+    """
+    offsets = np.array(selection_months(month))
+    with netCDF4.Dataset(fpath, "r") as dataset:
+        var = dataset.variables[variable]
+        n_time = var.shape[0]
+        time_slice = selection_slice(n_time, month)
+        first_year, n_years = selection_years(n_time, month)
+
+        if len(offsets) == 1:
+            # strided read of a single month
+            data = np.ma.asarray(var[time_slice], dtype=dtype)
+        else:
+            data = np.ma.masked_all((n_years,) + var.shape[1:], dtype=dtype)
+            for year in range(0, n_years, years_per_read):
+                years = np.arange(year, min(year + years_per_read, n_years)) + first_year
+                start = years[0] * MONTHS_PER_YEAR + offsets.min()
+                stop = years[-1] * MONTHS_PER_YEAR + offsets.max() + 1
+                block = np.ma.asarray(var[start:stop], dtype=np.float64)
+                # time steps of the selected months relative to start
+                index = (
+                    (years[:, None] - years[0]) * MONTHS_PER_YEAR + offsets - offsets.min()
+                )
+                data[year:year + len(years)] = block[index].mean(axis=1)
+    return data, time_slice
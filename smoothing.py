@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" smoothing.py
+
+Multi-threaded Gaussian smoothing with hypercc's gaussian_filter. The time axis is
+split into bands, each extended with a halo of time steps that holds the Gaussian
+kernel in time, and the bands are smoothed with gaussian_filter on a pool of
+threads; scipy.ndimage releases the GIL while filtering. The smoothing in latitude
+and longitude does not mix time steps, and every time step of a band is at least
+the kernel radius away from the edges of its halo, so it is computed from exactly
+the same values with the same arithmetic as by a single gaussian_filter call. The
+output is therefore bitwise identical to the serial gaussian_filter for any number
+of workers, see tests/test_smoothing.py.
+"""
+# ---------------------------------------------------------------------------
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from hypercc.filters import gaussian_filter
+
+# the Gaussian kernel is truncated at this many standard deviations (scipy default)
+TRUNCATE = 4.0
+
+
+def time_halo(box, sigma_t, truncate=TRUNCATE):
+    """Number of time steps needed on either side of a band to smooth it exactly
+
+    Args:
+        box (Box): box of the data
+        sigma_t (pint.Quantity): smoothing scale in time
+    Optional:
+        truncate (float): truncation of the Gaussian kernel in standard deviations
+
+    Returns:
+        halo (int): number of time steps
+    """
+    sigma_pixels = (sigma_t / box.resolution[0]).to('dimensionless').magnitude
+    return int(np.ceil(truncate * sigma_pixels)) + 1
+
+
+def bands(n, workers):
+    """Split range(n) into contiguous bands, one per worker
+
+    Returns:
+        bands (list): list of slices
+    """
+    edges = np.linspace(0, n, min(n, workers) + 1).astype(int)
+    return [slice(start, stop) for start, stop in zip(edges[:-1], edges[1:])]
+
+
+def gaussian_smooth(box, data, sigma, workers=1, halo=None):
+    """hypercc's gaussian_filter on bands of time steps on a pool of threads
+
+    Args:
+        box (Box): box of the data, which is also passed to gaussian_filter for every
+            band, such that the smoothing scales in pixels are the same
+        data (np.ndarray): (masked) data (time, lat, lon)
+        sigma (list): smoothing scales [sigma_t, sigma_d, sigma_d] (pint quantities)
+    Optional:
+        workers (int): number of threads, 1 runs gaussian_filter on the whole array.
+            The result does not depend on the number of workers
+        halo (int): number of time steps of the halo, by default computed from
+            sigma_t (see time_halo)
+
+    Returns:
+        smooth_data (np.ndarray): the same as gaussian_filter(box, data, sigma)
+    """
+    if workers == 1:
+        return gaussian_filter(box, data, sigma)
+    n_time = data.shape[0]
+    if halo is None:
+        halo = time_halo(box, sigma[0])
+
+    def smooth_band(band):
+        start = max(band.start - halo, 0)
+        stop = min(band.stop + halo, n_time)
+        smooth_data = gaussian_filter(box, data[start:stop], sigma)
+        return smooth_data[band.start - start:band.stop - start]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(smooth_band, bands(n_time, workers)))
+    if any(np.ma.isMaskedArray(part) for part in parts):
+        return np.ma.concatenate(parts)
+    return np.concatenate(parts)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" store.py
+
+Store of the preprocessed CMIP6 data: one chunked and compressed netCDF4 file per
+data set, together with an index (index.json) of all data sets in the store. The
+variable is chunked per time step (one map per chunk), which is how the edge
+detection reads it: selection.read_selection reads every 12th month or a block of
+years, and only the chunks of those time steps are read and decompressed. New
+members, scenarios or variables are new files that are added to the index, so
+existing files are never rewritten and files can be read by several processes at
+the same time.
+
+Example:
+    write_dataset(ds, DIR_DATA, "CMIP.IPSL-CM6A-LR.1pctCO2.r1i1p1f1.Amon.tas.gr.nc")
+    fpaths = find_datasets(DIR_DATA, source_id="IPSL-CM6A-LR", variable_id="tas")
+    fpath_piControl = find_piControl(DIR_DATA, fname)
+"""
+# ---------------------------------------------------------------------------
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+
+import netCDF4
+
+from drs_index import parse_drs, piControl_drs
+
+INDEX_NAME = "index.json"
+
+# fast compression, the shuffle filter makes floats compress much better
+COMPRESSION = {
+    "zlib": True,
+    "complevel": 1,
+    "shuffle": True
+}
+
+
+def dataset_facets(fname):
+    """Facets of a data set from its file name, which is the name of its wget script
+    (see download_esgf.wget_fname) with the extension .nc, optionally with the
+    institution after the activity
+
+    Args:
+        fname (str): e.g. "CMIP.IPSL-CM6A-LR.1pctCO2.r1i1p1f1.Amon.tas.gr.nc" or
+            "CMIP.IPSL.IPSL-CM6A-LR.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+
+    Returns:
+        facets (dict): facet: value (see drs_index.Drs, plus institution_id if it is
+            in the name), empty if fname does not follow the convention
+    """
+    fname = os.path.basename(fname)
+    drs = parse_drs(fname)
+    if drs is None or drs.activity_id is None or not fname.endswith(".nc"):
+        return {}
+    facets = drs._asdict()
+    fields = fname.split(".")
+    if len(fields) == 9:
+        facets["institution_id"] = fields[1]
+    return facets
+
+
+def chunk_sizes(shape):
+    """Chunks of a variable: one full (lat, lon) map per chunk
+
+    Args:
+        shape (tuple): shape of the variable, the last two dimensions are lat and lon
+
+    Returns:
+        chunks (tuple): chunk size of every dimension
+    """
+    return tuple(1 for _ in shape[:-2]) + tuple(shape[-2:])
+
+
+@contextmanager
+def _locked_index(dir_store):
+    """Lock the index of a store, such that processes adding data sets at the same
+    time do not overwrite each others entries
+    """
+    with open(os.path.join(dir_store, INDEX_NAME + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_index(dir_store):
+    """Return the index of a store: file name -> entry (see index_entry)"""
+    index_path = os.path.join(dir_store, INDEX_NAME)
+    if not os.path.isfile(index_path):
+        return {}
+    with open(index_path, "r") as reader:
+        return json.load(reader)
+
+
+def _write_index(dir_store, index):
+    index_path = os.path.join(dir_store, INDEX_NAME)
+    tmp_path = f"{index_path}.{os.getpid()}"
+    with open(tmp_path, "w") as writer:
+        json.dump(index, writer, indent=1, sort_keys=True)
+    os.replace(tmp_path, index_path)
+
+
+def index_entry(fpath, variable):
+    """Index entry of a file in the store, only the metadata of the file is read
+
+    Args:
+        fpath (str): path to the netCDF file
+        variable (str): variable from CMIP6
+
+    Returns:
+        entry (dict): facets, variable, dimensions, shape, chunks, time units and
+            range, size and modification time of the file
+    """
+    with netCDF4.Dataset(fpath, "r") as dataset:
+        var = dataset.variables[variable]
+        entry = {
+            "variable": variable,
+            "dims": list(var.dimensions),
+            "shape": list(var.shape),
+            "chunks": var.chunking()
+        }
+        if "time" in dataset.variables and dataset.variables["time"].size > 0:
+            time = dataset.variables["time"]
+            entry["time_units"] = getattr(time, "units", None)
+            entry["calendar"] = getattr(time, "calendar", None)
+            entry["time_range"] = [float(time[0]), float(time[-1])]
+    stat = os.stat(fpath)
+    entry.update({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+    entry.update(dataset_facets(fpath))
+    return entry
+
+
+def write_dataset(ds, dir_store, fname, variable=None):
+    """Write a preprocessed data set to the store and add it to the index. The file
+    is written under a temporary name first, such that readers never see a partially
+    written file.
+
+    Args:
+        ds (xr.Dataset): preprocessed data set
+        dir_store (str): directory of the store
+        fname (str): file name, e.g.
+            "CMIP.IPSL.IPSL-CM6A-LR.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+    Optional:
+        variable (str): variable from CMIP6, by default the variable_id of fname
+
+    Returns:
+        fpath (str): path to the file in the store
+    """
+    if variable is None:
+        variable = dataset_facets(fname)["variable_id"]
+    if not os.path.isdir(dir_store):
+        os.makedirs(dir_store)
+
+    encoding = dict(COMPRESSION, chunksizes=chunk_sizes(ds[variable].shape))
+    fpath = os.path.join(dir_store, fname)
+    tmp_path = f"{fpath}.{os.getpid()}.tmp"
+    ds.to_netcdf(
+        tmp_path, format="NETCDF4", encoding={variable: encoding},
+        unlimited_dims=["time"] if "time" in ds[variable].dims else None
+    )
+    os.replace(tmp_path, fpath)
+    add_to_index(dir_store, fname, variable)
+    return fpath
+
+
+def add_to_index(dir_store, fname, variable):
+    """Add (or update) the entry of a file in the store to the index
+
+    Args:
+        dir_store (str): directory of the store
+        fname (str): file name in the store
+        variable (str): variable from CMIP6
+    """
+    entry = index_entry(os.path.join(dir_store, fname), variable)
+    with _locked_index(dir_store):
+        index = read_index(dir_store)
+        index[fname] = entry
+        _write_index(dir_store, index)
+
+
+def rebuild_index(dir_store):
+    """Index all files in the store that follow the file name convention, e.g. after
+    files were copied into the store by hand
+
+    Returns:
+        index (dict): the new index
+    """
+    index = {}
+    for fname in sorted(os.listdir(dir_store)):
+        facets = dataset_facets(fname)
+        if facets:
+            index[fname] = index_entry(os.path.join(dir_store, fname), facets["variable_id"])
+    with _locked_index(dir_store):
+        _write_index(dir_store, index)
+    return index
+
+
+def find_datasets(dir_store, **facets):
+    """Paths of the data sets in the store with the given facets
+
+    Args:
+        dir_store (str): directory of the store
+        **facets: e.g. source_id="IPSL-CM6A-LR", experiment_id="piControl"
+
+    Returns:
+        fpaths (list): sorted paths to the files
+    """
+    return [
+        os.path.join(dir_store, fname)
+        for fname, entry in sorted(read_index(dir_store).items())
+        if all(entry.get(facet) == value for facet, value in facets.items())
+    ]
+
+
+def find_piControl(dir_store, fname):
+    """Path of the piControl data set of a scenario in the store: the same model,
+    member, table, variable and grid
+
+    Args:
+        dir_store (str): directory of the store
+        fname (str): file name of the scenario
+
+    Returns:
+        fpath (str): path to the piControl file, None if it is not in the store
+    """
+    drs = parse_drs(fname)
+    if drs is None:
+        return None
+    fpaths = find_datasets(dir_store, **piControl_drs(drs)._asdict())
+    return fpaths[0] if fpaths else None
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" streaming.py
+
+Out-of-core smoothing and Sobel filtering. The time axis is processed in blocks,
+each extended with a halo of time steps on both sides that is large enough to hold
+the Gaussian (or Sobel) kernel. The result is written block by block, e.g. to a
+memory mapped .npy file, and is identical to filtering the whole array at once
+(see tests/test_streaming.py), while the peak memory is bounded by the block size.
+
+Example:
+    variable = netCDF4.Dataset(fpath).variables["tas"]
+    smooth_data = streaming_smooth(
+        box, variable, [sigma_t, sigma_d, sigma_d],
+        out=open_output("smooth.npy", variable.shape)
+    )
+    sb = streaming_sobel(
+        box, smooth_data, sobel_weights,
+        out=open_output("sobel.npy", (4,) + variable.shape, layout="canny")
+    )
+    dat = canny_view(sb)    # input of hyper_canny, no copy
+"""
+# ---------------------------------------------------------------------------
+import numpy as np
+
+from gradients import empty_gradient, sobel_gradients
+from pipeline import taper as taper_block
+from smoothing import gaussian_smooth, time_halo
+
+
+def open_output(path, shape, dtype=np.float64, layout=None):
+    """Create a memory mapped .npy file to write the output to
+
+    Args:
+        path (str): path to the .npy file
+        shape (tuple): shape of the output
+    Optional:
+        dtype (np.dtype): data type of the output
+        layout (str): "canny" for the output of streaming_sobel, shape (4, time, lat,
+            lon), that is stored as (lon, lat, time, 4) as expected by hyper_canny
+            (see gradients.empty_gradient), None stores shape as is
+
+    Returns:
+        out (np.memmap): writable memory mapped array of the given shape, for layout
+            "canny" a transposed view
+    """
+    if layout == "canny":
+        return np.lib.format.open_memmap(
+            path, mode="w+", dtype=dtype, shape=tuple(shape[::-1])
+        ).transpose([3, 2, 1, 0])
+    if layout is not None:
+        raise ValueError(f"Unknown layout: {layout}")
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(shape))
+
+
+def time_blocks(n_time, block_size, halo):
+    """Generate the blocks of the time axis
+
+    Yields:
+        start, stop, halo_start, halo_stop (tuple): block [start, stop) and the block
+            extended with the halo [halo_start, halo_stop)
+    """
+    for start in range(0, n_time, block_size):
+        stop = min(start + block_size, n_time)
+        yield start, stop, max(start - halo, 0), min(stop + halo, n_time)
+
+
+def streaming_smooth(
+        box, data, sigma, out=None, block_size=120, taper=True, halo=None,
+        dtype=np.float64, workers=1, taper_method="iterative"):
+    """Taper and smooth data block by block along the time axis
+
+    Args:
+        box (Box): box of the full data set. The full box is passed to the filters
+            for every block, such that the smoothing scales in pixels are the same
+        data (array like): data (time, lat, lon) that can be sliced along time, e.g.
+            a netCDF4 variable, memory mapped array or np.ndarray
+        sigma (list): smoothing scales [sigma_t, sigma_d, sigma_d]
+    Optional:
+        out (array like): output of the same shape as data, e.g. from open_output
+        block_size (int): number of time steps per block
+        taper (boolean): whether to smooth over continental boundaries first (see
+            pipeline.taper, which does not mix time steps)
+        halo (int): number of time steps of the halo, by default computed from
+            sigma_t (about 4 sigma_t)
+        dtype (np.dtype): data type used for the computation and, if out is not
+            given, of the output (e.g. np.float32 to halve the memory)
+        workers (int): number of threads of the Gaussian smoothing of a block (see
+            smoothing.gaussian_smooth)
+        taper_method (str): "iterative" (taper_masked_area) or "nearest" (see
+            tapering.taper_nearest, the tables are computed once for all blocks)
+
+    Returns:
+        out (array like): smoothed data
+    """
+    n_time = data.shape[0]
+    if out is None:
+        out = np.empty(data.shape, dtype=dtype)
+    if halo is None:
+        halo = time_halo(box, sigma[0])
+
+    for start, stop, halo_start, halo_stop in time_blocks(n_time, block_size, halo):
+        block = np.ma.array(data[halo_start:halo_stop], dtype=dtype)
+        if taper:
+            block = taper_block(block, method=taper_method)
+        smooth_block = gaussian_smooth(box, block, sigma, workers=workers)
+        out[start:stop] = np.ma.getdata(smooth_block)[start - halo_start:stop - halo_start]
+    return out
+
+
+def streaming_sobel(
+        box, smooth_data, weight, out=None, block_size=120, dtype=None, layout="time"):
+    """Fused Sobel filter (see gradients.sobel_gradients) block by block along the
+    time axis
+
+    Args:
+        box (Box): box of the full data set
+        smooth_data (array like): smoothed data (time, lat, lon)
+        weight (list): weights of the dimensions (pint quantities)
+    Optional:
+        out (array like): output of shape (4, time, lat, lon), e.g. from open_output
+        block_size (int): number of time steps per block
+        dtype (np.dtype): data type of the output if out is not given, by default the
+            data type of smooth_data
+        layout (str): memory layout of the output if out is not given, see
+            gradients.empty_gradient
+
+    Returns:
+        out (array like): directions of the pixel based Sobel transform and the
+            inverse magnitude of the physical Sobel transform
+    """
+    n_time = smooth_data.shape[0]
+    if out is None:
+        out = empty_gradient(
+            smooth_data.shape, dtype=dtype or smooth_data.dtype, layout=layout
+        )
+
+    # the Sobel stencil only reaches one time step to either side
+    for start, stop, halo_start, halo_stop in time_blocks(n_time, block_size, 1):
+        # computed in the data type of smooth_data and only then converted to that
+        # of out, like sobel_gradients(box, smooth_data, weight).astype(out.dtype)
+        block = np.asarray(smooth_data[halo_start:halo_stop])
+        gradient = sobel_gradients(box, block, weight)
+        out[:, start:stop] = gradient[:, start - halo_start:stop - halo_start]
+    return out
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" tapering.py
+
+Single pass replacement of taper_masked_area(data, [0, 5, 5], 50). Instead of 50
+smoothing sweeps over the whole array, every masked grid cell is filled with the
+value of its nearest valid grid cell, found with a distance transform, after which
+the filled area is smoothed once. The nearest-neighbour tables only depend on the
+mask, which is the same for every time step, scenario and control run of a model,
+so they are cached per grid and mask. The tables stored on disk are bounded in total
+size, the least recently used tables are removed first.
+"""
+# ---------------------------------------------------------------------------
+from collections import OrderedDict
+import hashlib
+import os
+
+import numpy as np
+from scipy import ndimage
+
+# boundary conditions in (time, lat, lon), lon is periodic
+TAPER_MODE = ("reflect", "reflect", "wrap")
+
+# number of tables kept in memory
+MEMORY_CACHE_SIZE = 8
+
+# maximum total size in bytes of the tables stored in a cache directory
+DISK_CACHE_SIZE = 1024**3
+
+_tables = OrderedDict()
+
+
+def mask_key(mask):
+    """Cache key of a (lat, lon) mask, which includes the shape of the grid"""
+    sha1 = hashlib.sha1(str(mask.shape).encode())
+    sha1.update(np.packbits(mask).tobytes())
+    return sha1.hexdigest()
+
+
+def nearest_tables(mask):
+    """Index tables that map every masked grid cell to its nearest valid grid cell
+
+    Args:
+        mask (np.ndarray): boolean (lat, lon) mask, True where masked
+
+    Returns:
+        tables (dict): "target" (flat indices of the masked cells), "source" (flat
+            indices of their nearest valid cells) and "distance" (in grid cells)
+    """
+    n_lat, n_lon = mask.shape
+    # pad in longitude, such that the nearest cell may be across the date line
+    pad = n_lon // 2
+    padded = np.concatenate([mask[:, -pad:], mask, mask[:, :pad]], axis=1) if pad else mask
+    distance, (lat_index, lon_index) = ndimage.distance_transform_edt(
+        padded, return_indices=True
+    )
+    distance = distance[:, pad:pad + n_lon]
+    lat_index = lat_index[:, pad:pad + n_lon]
+    lon_index = (lon_index[:, pad:pad + n_lon] - pad) % n_lon
+
+    target = np.flatnonzero(mask)
+    source = np.ravel_multi_index(
+        (lat_index.flat[target], lon_index.flat[target]), mask.shape
+    )
+    return {"target": target, "source": source, "distance": distance.flat[target]}
+
+
+def cached_tables(mask, cache_dir=None):
+    """Return the nearest_tables of mask from memory, cache_dir or by computing them
+
+    Args:
+        mask (np.ndarray): boolean (lat, lon) mask
+    Optional:
+        cache_dir (str): directory in which the tables are also stored
+    """
+    key = mask_key(mask)
+    if key in _tables:
+        _tables.move_to_end(key)
+        return _tables[key]
+
+    cache_path = None if cache_dir is None else os.path.join(cache_dir, f"taper.{key}.npz")
+    if cache_path is not None and os.path.isfile(cache_path):
+        with np.load(cache_path) as npz:
+            tables = dict(npz)
+        # mark as recently used
+        os.utime(cache_path)
+    else:
+        tables = nearest_tables(mask)
+        if cache_path is not None:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # other processes may read the same tables, write them atomically
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as writer:
+                np.savez(writer, **tables)
+            os.replace(tmp_path, cache_path)
+            evict_tables(cache_dir, keep=cache_path)
+
+    _tables[key] = tables
+    if len(_tables) > MEMORY_CACHE_SIZE:
+        _tables.popitem(last=False)
+    return tables
+
+
+def evict_tables(cache_dir, max_size=DISK_CACHE_SIZE, keep=None):
+    """Remove the least recently used tables from cache_dir until their total size
+    is at most max_size
+
+    Args:
+        cache_dir (str): cache directory
+    Optional:
+        max_size (int): maximum total size in bytes
+        keep (str): path of a table that is not removed (the one just written)
+    """
+    tables = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith("taper.") and entry.name.endswith(".npz"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                tables.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    size = sum(table_size for _, table_size, _ in tables)
+    for _, table_size, path in sorted(tables):
+        if size <= max_size:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        size -= table_size
+
+
+def taper_nearest(data, sigma=(0, 5, 5), cache_dir=None):
+    """Fill the masked area of data in place with the nearest valid values, smoothed
+    once with a Gaussian of width sigma. The valid values and the mask itself are
+    not changed.
+
+    Args:
+        data (np.ma.MaskedArray): data (time, lat, lon)
+    Optional:
+        sigma (tuple): width of the smoothing of the filled area in grid cells
+            (time, lat, lon), the same as the sigma of taper_masked_area
+        cache_dir (str): directory in which the tables are also stored
+
+    Returns:
+        data (np.ma.MaskedArray): the same array
+    """
+    mask = np.ma.getmaskarray(data)
+    if not mask.any():
+        return data
+    values = np.ma.getdata(data)
+    flat_mask = mask.reshape(mask.shape[0], -1)
+
+    # the mask is usually the same for every time step, otherwise the time steps are
+    # grouped by mask
+    if (flat_mask == flat_mask[0]).all():
+        groups = [(slice(None), mask[0])]
+    else:
+        unique, inverse = np.unique(flat_mask, axis=0, return_inverse=True)
+        groups = [
+            (np.flatnonzero(inverse.ravel() == i), unique[i].reshape(mask.shape[1:]))
+            for i in range(len(unique))
+        ]
+
+    for time_index, group_mask in groups:
+        if group_mask.all():
+            # nothing to fill from
+            continue
+        tables = cached_tables(group_mask, cache_dir=cache_dir)
+        target = np.unravel_index(tables["target"], group_mask.shape)
+        source = np.unravel_index(tables["source"], group_mask.shape)
+        if isinstance(time_index, np.ndarray):
+            time_index = time_index[:, None]
+        values[(time_index,) + target] = values[(time_index,) + source]
+
+    if any(sigma):
+        smooth_values = ndimage.gaussian_filter(values, sigma, mode=TAPER_MODE)
+        values[mask] = smooth_values[mask]
+    return data
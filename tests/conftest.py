@@ -0,0 +1,72 @@
+import importlib
+import os
+import sys
+
+import netCDF4
+import numpy as np
+import pytest
+
+# the modules are at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def requires(name):
+    """Import a dependency that is not always installed (hypercc, hyper_canny). The
+    test is skipped if it is missing, except on CI (the CI environment variable is
+    set), where the test fails instead, such that the comparisons with hypercc
+    always run there
+    """
+    if os.environ.get("CI"):
+        return importlib.import_module(name)
+    return pytest.importorskip(name)
+
+
+def write_cmip6_file(fpath, n_years=120, shift_year=60, resolution=4.0, seed=0):
+    """Yearly tas on a regular grid with noise, a warming trend and an abrupt shift
+    over part of the northern hemisphere, written like a preprocessed CMIP6 file
+    """
+    rng = np.random.default_rng(seed)
+    lat = np.arange(-90 + resolution / 2, 90, resolution)
+    lon = np.arange(0, 360, resolution)
+    years = np.arange(n_years)
+    tas = 280 + 30 * np.cos(np.radians(lat))[None, :, None] + 0.01 * years[:, None, None]
+    tas = tas + rng.normal(0, 0.5, (n_years, lat.size, lon.size))
+    region = (lat[:, None] > 30) & (lat[:, None] < 70) & (lon[None, :] < 120)
+    tas[shift_year:] += 3 * region
+
+    with netCDF4.Dataset(fpath, "w") as dataset:
+        dataset.createDimension("time", None)
+        dataset.createDimension("lat", lat.size)
+        dataset.createDimension("lon", lon.size)
+        time = dataset.createVariable("time", "f8", ("time",))
+        time.units = "days since 1850-01-01"
+        time.calendar = "noleap"
+        time[:] = 365 * years + 182.5
+        dataset.createVariable("lat", "f8", ("lat",))[:] = lat
+        dataset["lat"].units = "degrees_north"
+        dataset.createVariable("lon", "f8", ("lon",))[:] = lon
+        dataset["lon"].units = "degrees_east"
+        variable = dataset.createVariable("tas", "f4", ("time", "lat", "lon"))
+        variable.units = "K"
+        variable[:] = tas
+    return fpath
+
+
+@pytest.fixture
+def cmip6_file(tmp_path):
+    return str(write_cmip6_file(
+        tmp_path / "CMIP.NOAA-GFDL.GFDL-ESM4.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+    ))
+
+
+@pytest.fixture
+def cmip6_box(cmip6_file):
+    """Box and data of cmip6_file, read with hypercc"""
+    requires("hypercc")
+    from pathlib import Path
+    from hypercc.data.data_set import DataSet
+
+    box = DataSet.cmip6(path=Path(cmip6_file), variable="tas").box
+    with netCDF4.Dataset(cmip6_file, "r") as dataset:
+        data = np.ma.masked_array(dataset["tas"][:].astype(np.float64))
+    return box, data
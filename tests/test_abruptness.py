@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from abruptness import compute_abruptness, event_summary
+
+
+def reference_abruptness(m, data, years, cutoff_length, chunk_max_length, chunk_min_length):
+    # the per-pixel loop of analysis_cmip6.py before compute_abruptness
+    idx = np.where(m)
+    indices = np.asarray(idx)
+    abruptness3d = m * 0.0
+    for result in range(np.shape(idx)[1]):
+        [dim0, dim1, dim2] = indices[:, result]
+        index = dim0
+        chunk1_data = data[0:index - cutoff_length, dim1, dim2]
+        chunk2_data = data[index + cutoff_length + 1:, dim1, dim2]
+        chunk1_years = years[0:index - cutoff_length]
+        chunk2_years = years[index + cutoff_length + 1:]
+
+        if np.size(chunk1_data) > chunk_max_length:
+            chunk1_start = np.size(chunk1_data) - chunk_max_length
+        else:
+            chunk1_start = 0
+        if np.size(chunk2_data) > chunk_max_length:
+            chunk2_end = chunk_max_length
+        else:
+            chunk2_end = np.size(chunk2_data)
+
+        chunk1_data_short = chunk1_data[chunk1_start:]
+        chunk2_data_short = chunk2_data[0:chunk2_end]
+
+        N1 = np.size(chunk1_data_short)
+        N2 = np.size(chunk2_data_short)
+        if not ((N1 < chunk_min_length) or (N2 < chunk_min_length)):
+            chunk1_years_short = chunk1_years[chunk1_start:] - years[dim0]
+            chunk2_years_short = chunk2_years[0:chunk2_end] - years[dim0]
+            _, intercept_chunk1, _, _, _ = stats.linregress(chunk1_years_short, chunk1_data_short)
+            _, intercept_chunk2, _, _, _ = stats.linregress(chunk2_years_short, chunk2_data_short)
+            mean_std = (np.nanstd(chunk1_data_short) + np.nanstd(chunk2_data_short)) / 2
+            abruptness3d[dim0, dim1, dim2] = abs(intercept_chunk1 - intercept_chunk2) / mean_std
+    return abruptness3d
+
+
+@pytest.fixture
+def edges():
+    rng = np.random.default_rng(0)
+    n_time = 120
+    years = np.arange(1850, 1850 + n_time)
+    data = rng.normal(size=(n_time, 6, 7)).cumsum(axis=0) * 0.1
+    # abrupt shifts at different times, including close to the start and end
+    shift = rng.integers(0, n_time, size=(6, 7))
+    data += 5 * (np.arange(n_time)[:, None, None] >= shift)
+    m = np.zeros(data.shape, dtype=bool)
+    m[shift, np.arange(6)[:, None], np.arange(7)] = True
+    m[rng.random(m.shape) < 0.02] = True
+    m[[0, 1, 2, n_time - 1], 0, 0] = True
+    return m, data, years
+
+
+@pytest.mark.parametrize("cutoff_length, chunk_max_length, chunk_min_length", [
+    (2, 30, 15),
+    (0, 20, 5),
+    (5, 50, 2)
+])
+def test_matches_per_pixel_loop(edges, cutoff_length, chunk_max_length, chunk_min_length):
+    m, data, years = edges
+    expected = reference_abruptness(
+        m, data, years, cutoff_length, chunk_max_length, chunk_min_length
+    )
+    assert np.count_nonzero(expected) > 0
+    for batch_size in [7, 100000]:
+        result = compute_abruptness(
+            m, data, years, cutoff_length=cutoff_length,
+            chunk_max_length=chunk_max_length, chunk_min_length=chunk_min_length,
+            batch_size=batch_size
+        )
+        assert np.array_equal(result > 0, expected > 0)
+        assert np.allclose(result, expected, rtol=1e-10, atol=0)
+
+
+def test_event_summary_matches_loops():
+    rng = np.random.default_rng(1)
+    years = np.arange(2000, 2030)
+    m = rng.random((30, 4, 5)) < 0.2
+    abruptness3d = np.where(m, rng.random(m.shape), 0.0)
+    # a grid cell without edges and one with edges but no positive abruptness
+    m[:, 0, 0] = False
+    abruptness3d[:, 0, 0] = 0
+    m[:, 0, 1] = False
+    m[[3, 8], 0, 1] = True
+    abruptness3d[:, 0, 1] = 0
+
+    summary = event_summary(m, abruptness3d, years)
+
+    # the loops of analysis_cmip6.py before event_summary
+    abruptness = np.max(abruptness3d, axis=0)
+    mask_max = m * 0
+    for dim0, dim1, dim2 in zip(*np.where(m)):
+        if abruptness3d[dim0, dim1, dim2] == abruptness[dim1, dim2] and abruptness[dim1, dim2] > 0:
+            mask_max[dim0, dim1, dim2] = 1
+    years_maxpeak = (years[:, None, None] * mask_max).sum(axis=0)
+
+    assert np.array_equal(summary["abruptness"], abruptness)
+    assert np.array_equal(summary["year"], years_maxpeak)
+    assert np.array_equal(summary["count"], m.sum(axis=0))
+    for lat, lon in np.ndindex(abruptness.shape):
+        if abruptness[lat, lon] > 0:
+            index = np.where(abruptness3d[:, lat, lon] == abruptness[lat, lon])[0]
+            assert summary["time_index"][lat, lon] == index[0]
+
+    # no peak: no time index and no year
+    assert summary["time_index"][0, 0] == summary["time_index"][0, 1] == -1
+    assert summary["year"][0, 0] == summary["year"][0, 1] == 0
+    assert summary["count"][0, 1] == 2
+
+
+def test_event_summary_without_edges():
+    m = np.zeros((10, 2, 3), dtype=bool)
+    summary = event_summary(m, np.zeros(m.shape), np.arange(10))
+    assert np.all(summary["time_index"] == -1)
+    assert np.all(summary["abruptness"] == 0)
+    assert np.all(summary["count"] == 0)
+
+
+def test_event_summary_takes_earliest_of_equal_maxima():
+    m = np.zeros((10, 1, 1), dtype=bool)
+    m[[2, 5, 7], 0, 0] = True
+    abruptness3d = np.zeros(m.shape)
+    abruptness3d[[2, 5, 7], 0, 0] = [1.0, 3.0, 3.0]
+    summary = event_summary(m, abruptness3d, np.arange(1990, 2000))
+    assert summary["time_index"][0, 0] == 5
+    assert summary["year"][0, 0] == 1995
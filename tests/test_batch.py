@@ -0,0 +1,53 @@
+import os
+import time
+
+from conftest import requires
+
+requires("hypercc")
+requires("hyper_canny")
+from batch_cmip6 import Job, job_name, run_jobs  # noqa: E402
+
+# one job of the GFDL group kills its worker, like a job that runs out of memory
+JOBS = [
+    Job("GFDL-ESM4", "1pctCO2", "tas", "r1i1p1f1", "Amon", "gr"),
+    Job("GFDL-ESM4", "abrupt-4xCO2", "tas", "r1i1p1f1", "Amon", "gr"),
+    Job("GFDL-ESM4", "historical", "tas", "r1i1p1f1", "Amon", "gr"),
+    Job("IPSL.IPSL-CM6A-LR", "1pctCO2", "tas", "r1i1p1f1", "Amon", "gr"),
+]
+BAD_JOB = JOBS[1]
+
+
+def run_fake(job, month):
+    """Stand-in for run_job that records every run of a job"""
+    with open(os.path.join(os.environ["BATCH_TEST_DIR"], job_name(job)), "a") as writer:
+        writer.write(f"{os.getpid()}\n")
+    if job == BAD_JOB:
+        # give the other jobs in the pool time to finish first
+        time.sleep(0.5)
+        os._exit(1)
+    return {"status": "success", "duration": 0}
+
+
+def runs(tmp_path, job):
+    fpath = tmp_path / job_name(job)
+    return len(fpath.read_text().split()) if fpath.exists() else 0
+
+
+def test_worker_that_dies(tmp_path, monkeypatch):
+    # the workers are started fresh (spawn) and find the directory in the environment
+    monkeypatch.setenv("BATCH_TEST_DIR", str(tmp_path))
+    report = run_jobs(JOBS, workers=4, retries=1, run=run_fake)
+
+    assert set(report) == {job_name(job) for job in JOBS}
+    for job in JOBS:
+        if job == BAD_JOB:
+            continue
+        assert report[job_name(job)]["status"] == "success"
+        assert report[job_name(job)]["attempts"] == 1
+        # also the jobs of the same piControl group are not run again
+        assert runs(tmp_path, job) == 1
+
+    bad = report[job_name(BAD_JOB)]
+    assert bad["status"] == "failed"
+    assert bad["error"] == "worker process died"
+    assert bad["attempts"] == 2
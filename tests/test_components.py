@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from components import component_statistics, connected_to_seed
+
+
+@pytest.fixture
+def edges():
+    rng = np.random.default_rng(0)
+    m = ndimage.binary_dilation(rng.random((40, 20, 30)) < 0.001, iterations=2)
+    abruptness3d = np.where(m, rng.random(m.shape), 0.0)
+    return m, abruptness3d
+
+
+@pytest.mark.parametrize("size_threshold", [0, 24, 60])
+def test_component_statistics_matches_per_label_loops(edges, size_threshold):
+    m, abruptness3d = edges
+    labels, n_features = ndimage.label(m, ndimage.generate_binary_structure(3, 3))
+    assert n_features > 10
+
+    # the loops of analysis_cmip6.py before component_statistics
+    big_enough = [x for x in range(1, n_features + 1) if (labels == x).sum() > size_threshold]
+    expected_labels = np.where(np.isin(labels, big_enough), labels, 0)
+
+    result_labels, table = component_statistics(
+        labels, n_features, abruptness3d, size_threshold=size_threshold
+    )
+    assert np.array_equal(result_labels, expected_labels)
+    assert table["label"].tolist() == big_enough
+
+    for row, label in enumerate(big_enough):
+        ind = np.nonzero(labels == label)
+        assert table["size"][row] == ind[0].size
+        for axis, (low, high) in enumerate([
+                ("time_start", "time_end"), ("lat_min", "lat_max"), ("lon_min", "lon_max")]):
+            assert table[low][row] == ind[axis].min()
+            assert table[high][row] == ind[axis].max()
+        for axis, key in enumerate(["centroid_time", "centroid_lat", "centroid_lon"]):
+            assert np.isclose(table[key][row], ind[axis].mean())
+        assert table["abruptness"][row] == abruptness3d[ind].max()
+
+
+def test_component_statistics_without_events():
+    labels = np.zeros((5, 4, 3), dtype=np.int32)
+    labels[2, 1, 1] = 1
+    labels, table = component_statistics(labels, 1, size_threshold=1)
+    assert not labels.any()
+    assert table["label"].size == 0
+    assert "abruptness" not in table
+
+
+def reference_flood_fill(m, lsm, seed):
+    # the loop of the atmospheric-river notebook before connected_to_seed
+    # scikit-image is no longer a dependency of the notebooks
+    flood_fill = pytest.importorskip("skimage.morphology").flood_fill
+    mask_sum = m + lsm
+    mask_sum[mask_sum > 1] = 1
+    mask_sum = mask_sum.astype(int)
+    mask_floodfilled = mask_sum * 0
+    for timeind_flood in range(0, np.size(mask_floodfilled, axis=0)):
+        mask_floodfilled[timeind_flood] = flood_fill(mask_sum[timeind_flood, :, :], seed, 2)
+    mask_floodfilled[mask_floodfilled < 2] = 0
+    mask_floodfilled[mask_floodfilled == 2] = 1
+    return mask_floodfilled - lsm
+
+
+@pytest.mark.parametrize("block_size, workers", [(240, 1), (7, 1), (5, 3)])
+def test_connected_to_seed_matches_flood_fill(block_size, workers):
+    rng = np.random.default_rng(1)
+    m = (rng.random((30, 25, 40)) < 0.4).astype(int)
+    # land along the northern boundary, containing the seed
+    lsm = np.zeros((25, 40), dtype=int)
+    lsm[:3] = 1
+    lsm[3:8, 30:] = 1
+    seed = (0, 39)
+
+    expected = reference_flood_fill(m, lsm, seed)
+    result = connected_to_seed(m, lsm > 0, seed, block_size=block_size, workers=workers)
+    assert np.array_equal(result, expected == 1)
+    assert result.any() and not result.all()
+
+
+
+def test_connected_to_seed_with_coast_per_time_step(tmp_path):
+    rng = np.random.default_rng(2)
+    m = (rng.random((12, 20, 30)) < 0.4).astype(int)
+    lsm = np.zeros(m.shape, dtype=int)
+    lsm[:, :2] = 1
+    lsm[::2, 2:6, 20:] = 1
+    seed = (0, 0)
+
+    expected = np.stack([
+        reference_flood_fill(m[t:t + 1], lsm[t], seed)[0] for t in range(m.shape[0])
+    ])
+    out = np.lib.format.open_memmap(
+        str(tmp_path / "mask_result.npy"), mode="w+", dtype=bool, shape=m.shape
+    )
+    result = connected_to_seed(m, lsm > 0, seed, out=out, block_size=5, workers=2)
+    assert result is out
+    assert np.array_equal(out, expected == 1)
@@ -0,0 +1,103 @@
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+from control_cache import ControlCache
+
+
+def hash_files(args):
+    cache_dir, fpaths = args
+    cache = ControlCache(cache_dir)
+    return [cache.file_hash(fpath) for fpath in fpaths]
+
+
+def test_hash_index_of_concurrent_processes(tmp_path):
+    fpaths = []
+    for i in range(32):
+        fpath = tmp_path / f"control{i}.nc"
+        fpath.write_bytes(os.urandom(1024))
+        fpaths.append(str(fpath))
+    cache_dir = str(tmp_path / "cache")
+    ControlCache(cache_dir)
+
+    # every process adds its own files to the index
+    with multiprocessing.get_context("fork").Pool(8) as pool:
+        pool.map(hash_files, [(cache_dir, fpaths[i::8]) for i in range(8)])
+
+    with open(os.path.join(cache_dir, "hashes.json")) as reader:
+        assert set(json.load(reader)) == set(fpaths)
+
+
+def store_and_load(args):
+    cache_dir, worker = args
+    cache = ControlCache(cache_dir, max_size=3 * 80 * 1024)
+    data = np.ma.masked_array(np.full(10000, worker, dtype=float), mask=False)
+    for i in range(10):
+        key = f"entry{worker}.{i}"
+        cache.store(key, {"worker": worker}, {"i": i}, smooth_data=data)
+        for other in range(4):
+            entry = cache.load(f"entry{other}.{i}")
+            # an entry is either evicted as a whole or complete
+            if entry is not None:
+                assert entry["calibration"] == {"worker": other}
+                assert np.array_equal(entry["smooth_data"], np.full(10000, other))
+    return True
+
+
+def test_load_while_other_processes_evict(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    ControlCache(cache_dir)
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        assert all(pool.map(store_and_load, [(cache_dir, worker) for worker in range(4)]))
+
+
+def test_key_store_load(tmp_path):
+    fpath = tmp_path / "control.nc"
+    fpath.write_bytes(os.urandom(1024))
+    cache = ControlCache(str(tmp_path / "cache"))
+    settings = ("tas", 13, "1 year", "100 km", 3)
+    key = cache.key(str(fpath), *settings)
+    assert cache.load(key) is None
+
+    data = np.ma.masked_array(np.arange(24.0).reshape(2, 3, 4), mask=False)
+    data[:, 0, 0] = np.ma.masked
+    cache.store(key, {"gamma": [1.0, 2.0]}, {"upper": 0.5, "lower": 0.25}, smooth_data=data)
+
+    # the same file and settings give the same key
+    entry = cache.load(cache.key(str(fpath), *settings))
+    assert entry["calibration"] == {"gamma": [1.0, 2.0]}
+    assert entry["thresholds"] == {"upper": 0.5, "lower": 0.25}
+    assert np.array_equal(entry["smooth_data"].data, data.data)
+    assert np.array_equal(entry["smooth_data"].mask, data.mask)
+
+    # another selection, other settings or another content are other entries
+    assert cache.key(str(fpath), "tas", 1, "1 year", "100 km", 3) != key
+    assert cache.key(str(fpath), "tas", "DJF", "1 year", "100 km", 3) != key
+    assert cache.key(str(fpath), *settings, dtype=np.float32) != key
+    fpath.write_bytes(os.urandom(1024))
+    assert cache.key(str(fpath), *settings) != key
+
+
+def test_evicts_least_recently_used(tmp_path):
+    data = np.ma.masked_array(np.zeros(1000), mask=False)
+    cache = ControlCache(str(tmp_path / "cache"), max_size=10**6)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.store(key, {}, {}, smooth_data=data)
+        os.utime(os.path.join(cache.dir, key, "entry.pkl"), (i, i))
+    # loading marks "a" as the most recently used entry
+    assert cache.load("a") is not None
+
+    entry_size = sum(
+        os.path.getsize(os.path.join(cache.dir, "a", fname))
+        for fname in os.listdir(os.path.join(cache.dir, "a"))
+    )
+    cache.max_size = 2 * entry_size
+    cache.evict()
+    assert [cache.load(key) is not None for key in "abc"] == [True, False, True]
+
+    # the loads above used "c" after "a"
+    cache.max_size = entry_size
+    cache.evict()
+    assert [cache.load(key) is not None for key in "abc"] == [False, False, True]
@@ -0,0 +1,56 @@
+import netCDF4
+import numpy as np
+import pytest
+import xarray as xr
+
+from coordinates import alias_coordinates, open_aliased
+
+
+@pytest.fixture
+def xy_file(tmp_path):
+    """Sea ice like file of which the coordinates are called x and y"""
+    fpath = str(tmp_path / "siconc.nc")
+    with netCDF4.Dataset(fpath, "w") as dataset:
+        dataset.createDimension("time", 3)
+        dataset.createDimension("y", 4)
+        dataset.createDimension("x", 5)
+        x = dataset.createVariable("x", "f8", ("x",))
+        x[:] = np.linspace(0, 288, 5)
+        x.units = "degrees_east"
+        y = dataset.createVariable("y", "f8", ("y",))
+        y[:] = np.linspace(-60, 60, 4)
+        y.units = "degrees_north"
+        siconc = dataset.createVariable("siconc", "f4", ("time", "y", "x"), fill_value=1e20)
+        siconc[:] = np.arange(60, dtype="f4").reshape(3, 4, 5)
+    return fpath
+
+
+def test_alias_coordinates_keeps_x_y(xy_file):
+    assert alias_coordinates(xy_file) == {"lat": "y", "lon": "x"}
+
+    with netCDF4.Dataset(xy_file) as dataset:
+        np.testing.assert_array_equal(dataset["x"][:], np.linspace(0, 288, 5))
+        np.testing.assert_array_equal(dataset["y"][:], np.linspace(-60, 60, 4))
+        np.testing.assert_array_equal(dataset["lon"][:], dataset["x"][:])
+        np.testing.assert_array_equal(dataset["lat"][:], dataset["y"][:])
+        assert dataset["lat"].units == "degrees_north"
+        assert dataset["siconc"].coordinates == "lat lon"
+
+    with xr.open_dataset(xy_file) as ds:
+        assert {"x", "y", "lat", "lon"} <= set(ds.coords)
+        assert list(ds.data_vars) == ["siconc"]
+        np.testing.assert_array_equal(ds.siconc.values, np.arange(60).reshape(3, 4, 5))
+
+    # a second call does not change the file
+    assert alias_coordinates(xy_file) == {}
+    with netCDF4.Dataset(xy_file) as dataset:
+        assert dataset["siconc"].coordinates == "lat lon"
+
+
+def test_open_aliased_does_not_change_the_file(xy_file):
+    with open_aliased(xy_file) as ds:
+        np.testing.assert_array_equal(ds.lat.values, ds.y.values)
+        np.testing.assert_array_equal(ds.lon.values, ds.x.values)
+        assert {"lat", "lon"} <= set(ds.coords)
+    with netCDF4.Dataset(xy_file) as dataset:
+        assert set(dataset.variables) == {"x", "y", "siconc"}
@@ -0,0 +1,164 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import download_esgf
+from download_esgf import URL_NODES, fetch_wget, search_and_download_wget, wget_fname
+
+FACETS = "source_id,experiment_id,variable"
+
+
+def dataset_id(i, experiment_id="1pctCO2"):
+    return (
+        f"CMIP6.CMIP.NOAA-GFDL.GFDL-ESM4.{experiment_id}.r{i}i1p1f1.Amon.tas.gr.v20180701"
+        "|esgdata.gfdl.noaa.gov"
+    )
+
+
+class FakeResult:
+    """Search result of a search on url"""
+
+    def __init__(self, dataset_id, url=URL_NODES[0]):
+        self.dataset_id = dataset_id
+        self.context = SimpleNamespace(connection=SimpleNamespace(url=url))
+
+
+class FakeFileContext:
+    def __init__(self, dataset_id, node, index):
+        self.facet_constraints = {"dataset_id": dataset_id}
+        self.node = node
+        self.index = index
+
+    def get_download_script(self, facets=None):
+        self.index.calls.append((self.facet_constraints["dataset_id"], self.node))
+        if (self.facet_constraints["dataset_id"], self.node) in self.index.failing or \
+                self.node in self.index.failing:
+            raise RuntimeError(f"{self.node} is not available")
+        return "#!/bin/bash\n"
+
+
+class FakeIndex:
+    """Index nodes that serve wget scripts, except for the failing (dataset_id, node)
+    pairs or nodes. The node of the search is called "search"
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def file_context(self, result, url_node=None):
+        return FakeFileContext(result.dataset_id, url_node or "search", self)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = FakeIndex()
+    monkeypatch.setattr(download_esgf, "file_context", index.file_context)
+    return index
+
+
+def test_failover_skips_search_node(index, tmp_path):
+    index.failing = {"search"}
+    success, attempts, error = fetch_wget(
+        FakeResult(dataset_id(1), url=URL_NODES[0] + "/"), FACETS, str(tmp_path),
+        retries=3, backoff=0
+    )
+    assert success and attempts == 2 and error is None
+    assert [node for _, node in index.calls] == ["search", URL_NODES[1]]
+    assert os.path.isfile(tmp_path / (wget_fname(dataset_id(1)) + ".sh"))
+
+
+def test_all_nodes_fail(index, tmp_path):
+    index.failing = {"search"} | set(URL_NODES)
+    success, attempts, error = fetch_wget(
+        FakeResult(dataset_id(1)), FACETS, str(tmp_path), retries=3, backoff=0
+    )
+    assert not success and attempts == 3 and isinstance(error, RuntimeError)
+    assert not os.listdir(tmp_path)
+
+
+def test_search_and_download(index, tmp_path):
+    index.failing = {(dataset_id(3), node) for node in ["search"] + URL_NODES}
+    n_results = 20
+
+    class FakeSearch:
+        def search(self, facets=None):
+            # pages of results arrive one by one
+            for i in range(1, n_results + 1):
+                yield FakeResult(dataset_id(i))
+
+    report = search_and_download_wget(
+        FakeSearch(), FACETS, str(tmp_path), workers=4, retries=2, backoff=0
+    )
+    assert report["results"] == n_results
+    assert [failed for failed, _ in report["failed"]] == [dataset_id(3)]
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        wget_fname(dataset_id(i)) + ".sh" for i in range(1, n_results + 1) if i != 3
+    )
+
+
+class FakeConnection:
+    """Index node with the given data sets, records the constraints of every search"""
+
+    url = URL_NODES[0]
+
+    def __init__(self, dataset_ids):
+        self.dataset_ids = list(dataset_ids)
+        self.searches = []
+
+    def new_context(self, **constraints):
+        self.searches.append(constraints)
+        connection = self
+
+        class Context:
+            def search(self, facets=None):
+                for dataset_id in connection.dataset_ids:
+                    yield SimpleNamespace(dataset_id=dataset_id)
+        return Context()
+
+
+def test_catalog_search(monkeypatch, tmp_path):
+    from esgf_catalog import SearchCatalog
+    now = [1000.0]
+    monkeypatch.setattr(download_esgf.time, "time", lambda: now[0])
+
+    search = {"project": "CMIP6", "experiment_id": "piControl", "facets": FACETS}
+    catalog = SearchCatalog(str(tmp_path / "catalog.sqlite"), ttl=100, full_refresh_ttls=3)
+    conn = FakeConnection([dataset_id(1, "piControl"), dataset_id(2, "piControl")])
+
+    results = download_esgf.catalog_search(conn, search, catalog)
+    # the first result is available before the search is finished
+    assert next(results).dataset_id == dataset_id(1, "piControl")
+    assert [result.dataset_id for result in results] == [dataset_id(2, "piControl")]
+    assert "from_timestamp" not in conn.searches[0]
+
+    # fresh: from the catalog only
+    now[0] = 1050
+    assert len(list(download_esgf.catalog_search(conn, search, catalog))) == 2
+    assert len(conn.searches) == 1
+
+    # stale: incremental
+    now[0] = 1150
+    conn.dataset_ids = [dataset_id(3, "piControl")]
+    assert len(list(download_esgf.catalog_search(conn, search, catalog))) == 3
+    assert "from_timestamp" in conn.searches[1]
+
+    # full refresh after 3 * ttl, 2 was retracted
+    now[0] = 1300
+    conn.dataset_ids = [dataset_id(1, "piControl"), dataset_id(3, "piControl")]
+    results = [result.dataset_id for result in download_esgf.catalog_search(conn, search, catalog)]
+    assert "from_timestamp" not in conn.searches[2]
+    assert results == [dataset_id(1, "piControl"), dataset_id(3, "piControl")]
+
+
+def test_download_catalog_results(index, tmp_path):
+    from esgf_catalog import SearchCatalog
+    catalog = SearchCatalog(":memory:")
+    search = {"experiment_id": "1pctCO2"}
+    catalog.update(search, [dataset_id(1)])
+    results = [download_esgf.CatalogResult(dataset_id(1), FakeConnection([]))]
+
+    report = download_esgf.download_wgets(results, FACETS, str(tmp_path), catalog=catalog)
+    assert report["results"] == 1 and not report["failed"]
+    assert catalog.find()[0]["script_path"] == str(tmp_path / (wget_fname(dataset_id(1)) + ".sh"))
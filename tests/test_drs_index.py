@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from download_esgf import wget_fname
+from drs_index import Drs, DrsIndex, find_file, parse_drs, piControl_drs
+
+DATASET_IDS = [
+    "CMIP6.CMIP.NOAA-GFDL.GFDL-ESM4.1pctCO2.r1i1p1f1.Amon.tas.gr.v20180701"
+    "|esgdata.gfdl.noaa.gov",
+    "CMIP6.ScenarioMIP.NOAA-GFDL.GFDL-ESM4.ssp585.r1i1p1f1.Amon.tas.gr1.v20180701"
+    "|esgdata.gfdl.noaa.gov",
+    "CMIP6.DAMIP.NCAR.CESM2.hist-GHG.r1i1p1f1.Omon.tos.gn.v20200206"
+    "|esgf-data.ucar.edu",
+    "CMIP6.C4MIP.IPSL.IPSL-CM6A-LR.1pctCO2-bgc.r1i1p1f1.Lmon.lai.gr.v20180914"
+    "|vesg.ipsl.upmc.fr",
+]
+
+
+@pytest.mark.parametrize("dataset_id", DATASET_IDS)
+def test_parse_wget_fname(dataset_id):
+    fields = dataset_id.split("|")[0].split(".")
+    fname = wget_fname(dataset_id) + ".sh"
+    assert parse_drs(fname) == Drs(fields[1], *fields[3:9])
+
+
+def test_parse_other_names():
+    assert parse_drs(
+        "/data/CMIP.NOAA-GFDL.GFDL-ESM4.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+    ) == Drs("CMIP", "GFDL-ESM4", "1pctCO2", "r1i1p1f1", "Amon", "tas", "gr")
+    assert parse_drs(
+        "tas_Amon_GFDL-ESM4_1pctCO2_r1i1p1f1_gr_000101-010012.nc"
+    ) == Drs(None, "GFDL-ESM4", "1pctCO2", "r1i1p1f1", "Amon", "tas", "gr")
+    assert parse_drs("catalog.sqlite") is None
+
+
+@pytest.mark.parametrize("dataset_id", DATASET_IDS)
+def test_claim(tmp_path, dataset_id):
+    index = DrsIndex(str(tmp_path), extension="sh")
+    fname = wget_fname(dataset_id) + ".sh"
+    assert index.claim(fname)
+    if fname.endswith(".gr.sh"):
+        # gn is not written when gr is there
+        assert not index.claim(fname[:-len("gr.sh")] + "gn.sh")
+
+
+def test_claim_unparsable(tmp_path):
+    index = DrsIndex(str(tmp_path), extension="sh")
+    assert index.claim("wget_script.sh")
+    assert index.find() == []
+
+
+def test_piControl_of_scenario(tmp_path):
+    scenario = wget_fname(DATASET_IDS[1]) + ".sh"
+    piControl = "CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.tas.gr1.sh"
+    (tmp_path / piControl).write_text("")
+    (tmp_path / "CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.pr.gr1.sh").write_text("")
+    index = DrsIndex(str(tmp_path), extension="sh")
+    assert index.get(piControl_drs(parse_drs(scenario))) == piControl
+    assert find_file(str(tmp_path), extension="sh", variable_id="tas") == piControl
+
+
+def test_file_added_without_mtime_change(tmp_path):
+    # e.g. on NFS with attribute caching or on filesystems with coarse timestamps
+    tas = "CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.tas.gr.sh"
+    (tmp_path / tas).write_text("")
+    index = DrsIndex(str(tmp_path), extension="sh")
+    assert index.find(variable_id="pr") == []
+
+    stat = os.stat(tmp_path)
+    for fname in [
+            "CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.pr.gr.sh",
+            "CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.tas.gn.sh"]:
+        (tmp_path / fname).write_text("")
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(tmp_path).st_mtime_ns == stat.st_mtime_ns
+
+    pr = parse_drs("CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.pr.gr.sh")
+    assert index.get(pr) == "CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.pr.gr.sh"
+    assert index.get(parse_drs(tas)._replace(grid_label="gn")) == (
+        "CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.tas.gn.sh"
+    )
+    assert index.find(variable_id="pr") == ["CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.pr.gr.sh"]
@@ -0,0 +1,63 @@
+import sqlite3
+
+from esgf_catalog import SearchCatalog, parse_dataset_id
+
+SEARCH = {"project": "CMIP6", "experiment_id": "piControl", "variable": "tas"}
+
+
+def dataset_id(source_id, member_id="r1i1p1f1", version="v20180701"):
+    return (
+        f"CMIP6.CMIP.INST.{source_id}.piControl.{member_id}.Amon.tas.gr.{version}"
+        "|esgf.node"
+    )
+
+
+def test_parse_dataset_id():
+    row = parse_dataset_id(dataset_id("GFDL-ESM4"))
+    assert row["master_id"] == "CMIP6.CMIP.INST.GFDL-ESM4.piControl.r1i1p1f1.Amon.tas.gr"
+    assert row["version"] == "v20180701"
+    assert row["data_node"] == "esgf.node"
+    assert row["source_id"] == "GFDL-ESM4"
+
+
+def test_ttl_and_versions():
+    catalog = SearchCatalog(":memory:", ttl=100)
+    assert not catalog.is_fresh(SEARCH)
+    catalog.update(SEARCH, [dataset_id("A"), dataset_id("B")], fetched=1000)
+    assert catalog.is_fresh(SEARCH, now=1050)
+    assert not catalog.is_fresh(SEARCH, now=1100)
+
+    # a newer version replaces the older one, an older version does not
+    catalog.update(SEARCH, [dataset_id("A", version="v20200101")], incremental=True, fetched=1100)
+    catalog.update(SEARCH, [dataset_id("B", version="v20000101")], incremental=True, fetched=1200)
+    assert catalog.dataset_ids(SEARCH) == [
+        dataset_id("A", version="v20200101"), dataset_id("B")
+    ]
+    assert catalog.has_piControl("A", "r1i1p1f1", "tas")
+    assert not catalog.has_piControl("A", "r2i1p1f1", "tas")
+
+
+def test_full_refresh_removes_retracted():
+    catalog = SearchCatalog(":memory:", ttl=100, full_refresh_ttls=4)
+    catalog.update(SEARCH, [dataset_id("A"), dataset_id("B")], fetched=1000)
+    catalog.update(SEARCH, [dataset_id("C")], incremental=True, fetched=1200)
+    assert not catalog.needs_full_refresh(SEARCH, now=1300)
+    assert catalog.needs_full_refresh(SEARCH, now=1400)
+
+    # B was retracted
+    catalog.update(SEARCH, [dataset_id("A"), dataset_id("C")], fetched=1400)
+    assert not catalog.needs_full_refresh(SEARCH, now=1500)
+    assert not catalog.has_piControl("B", "r1i1p1f1", "tas")
+    assert [row["source_id"] for row in catalog.find(experiment_id="piControl")] == ["A", "C"]
+
+
+def test_catalog_of_older_version(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE queries (key TEXT PRIMARY KEY, search TEXT NOT NULL, "
+            "fetched REAL NOT NULL)"
+        )
+    with SearchCatalog(path) as catalog:
+        catalog.update(SEARCH, [dataset_id("A")], incremental=True, fetched=1000)
+        assert catalog.needs_full_refresh(SEARCH, now=1000)
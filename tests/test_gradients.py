@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from conftest import requires
+
+requires("hypercc")
+from hypercc.filters import sobel_filter  # noqa: E402
+from hypercc.units import unit  # noqa: E402
+
+from gradients import physical_gradient, sobel_gradients  # noqa: E402
+
+WEIGHT = [unit("1 year"), unit("1 km"), unit("1 km")]
+
+
+@pytest.mark.parametrize("layout", ["time", "canny"])
+def test_matches_sobel_filter(cmip6_box, layout):
+    box, data = cmip6_box
+    sb = sobel_filter(box, data, weight=WEIGHT)
+    pixel_sb = sobel_filter(box, data, physical=False)
+    pixel_sb[3] = sb[3]
+
+    gradient = sobel_gradients(box, data, WEIGHT, layout=layout)
+    np.testing.assert_allclose(gradient[:3], pixel_sb[:3], rtol=1e-6, atol=1e-9)
+    # the magnitudes are those of sobel_filter, on which the calibration is based
+    assert np.array_equal(gradient[3], sb[3])
+    np.testing.assert_allclose(
+        physical_gradient(box, gradient, WEIGHT), sb[:3] / sb[3], rtol=1e-6, atol=1e-12
+    )
+
+
+def test_zero_gradient(cmip6_box):
+    box, data = cmip6_box
+    gradient = sobel_gradients(box, np.full(data.shape, 280.0), WEIGHT)
+    assert np.all(gradient[:3] == 0)
+    # the signal 1 / |g| is exactly zero, as with sobel_filter
+    with np.errstate(divide="ignore"):
+        assert np.all(1 / gradient[3] == 0)
+    assert np.all(physical_gradient(box, gradient, WEIGHT) == 0)
@@ -0,0 +1,68 @@
+from datetime import date
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from mogreps import DiskCache, fetch_data, make_client, make_data_object_names
+
+BUCKET = "mogreps-uk"
+SIZE = 1000
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """Public bucket with 8 objects of SIZE bytes on an in-process S3 stand-in"""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket=BUCKET)
+        names = make_data_object_names(
+            "mogreps-uk", date(2016, 1, 1), date(2016, 1, 2), [0, 12], [0], [3, 6]
+        )
+        for i, name in enumerate(names):
+            s3.put_object(Bucket=BUCKET, Key=name, Body=bytes([i]) * SIZE, ACL="public-read")
+        yield names
+
+
+def test_make_data_object_names():
+    names = make_data_object_names(
+        "mogreps-uk", date(2016, 1, 31), date(2016, 2, 1), [3], [0, 1], [0]
+    )
+    assert names == [
+        "prods_op_mogreps-uk_20160131_03_00_000.nc",
+        "prods_op_mogreps-uk_20160131_03_01_000.nc",
+        "prods_op_mogreps-uk_20160201_03_00_000.nc",
+        "prods_op_mogreps-uk_20160201_03_01_000.nc",
+    ]
+
+
+def test_fetch_and_cache(bucket, tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=100 * SIZE)
+    client = make_client(max_pool_connections=4)
+    paths = fetch_data(BUCKET, bucket + ["missing.nc"], cache=cache, workers=4, client=client)
+    assert paths["missing.nc"] is None
+    for i, name in enumerate(bucket):
+        assert paths[name].read_bytes() == bytes([i]) * SIZE
+    assert cache.stats == {"hits": 0, "misses": 9, "evictions": 0}
+
+    fetch_data(BUCKET, bucket[:3], cache=cache, workers=4, client=client)
+    assert cache.stats["hits"] == 3
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_returned_paths_are_not_evicted(bucket, tmp_path):
+    # the request is larger than the cache
+    cache = DiskCache(tmp_path, max_bytes=3 * SIZE)
+    client = make_client(max_pool_connections=4)
+    paths = fetch_data(BUCKET, bucket[:-1], cache=cache, workers=4, client=client)
+    assert all(path.exists() for path in paths.values())
+    assert cache.stats["evictions"] == 0
+
+    # the next download evicts the files of the previous request
+    fetch_data(BUCKET, bucket[-1:], cache=cache, client=client)
+    assert cache.stats["evictions"] == len(bucket) - 3
+    assert (tmp_path / bucket[-1]).exists()
+    assert cache.size <= 3 * SIZE
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("hypercc")
+pytest.importorskip("hyper_canny")
+import pipeline  # noqa: E402
+from pipeline import StageGraph  # noqa: E402
+
+
+def double(x):
+    return 2 * x
+
+
+def triple(x):
+    return 3 * x
+
+
+def make_graph(cache_dir, func=double, max_size=pipeline.CACHE_SIZE):
+    graph = StageGraph(cache_dir=str(cache_dir), max_size=max_size)
+    graph.add_input("x", np.arange(1000.0))
+    graph.add_stage("y", func, ("x",), persist=True)
+    return graph
+
+
+def test_persistent_output_is_reused(tmp_path):
+    assert np.array_equal(make_graph(tmp_path).get("y"), 2 * np.arange(1000.0))
+    graph = make_graph(tmp_path)
+    graph.get("y")
+    assert graph.status["y"] == {"cache": 1}
+    assert not [fname for fname in os.listdir(tmp_path) if fname.endswith(".tmp")]
+
+
+def test_code_change_invalidates(tmp_path, monkeypatch):
+    fingerprint = make_graph(tmp_path).fingerprint("y")
+
+    # a different implementation under the same name
+    triple.__qualname__ = double.__qualname__
+    triple.__module__ = double.__module__
+    assert make_graph(tmp_path, func=triple).fingerprint("y") != fingerprint
+
+    # a different version of the pipeline code
+    monkeypatch.setattr(pipeline, "code_version", lambda: "other")
+    assert make_graph(tmp_path).fingerprint("y") != fingerprint
+
+
+def test_cache_is_bounded(tmp_path):
+    # room for a single output
+    max_size = 12000
+    for offset in range(3):
+        graph = StageGraph(cache_dir=str(tmp_path), max_size=max_size)
+        graph.add_input("x", np.arange(1000.0) + offset)
+        graph.add_stage("y", double, ("x",), persist=True)
+        graph.get("y")
+    outputs = [fname for fname in os.listdir(tmp_path) if fname.endswith(".pkl")]
+    assert outputs == [f"y.{graph.fingerprint('y')}.pkl"]
@@ -0,0 +1,44 @@
+import numpy as np
+
+from conftest import requires
+
+requires("hypercc")
+requires("hyper_canny")
+from hypercc.units import unit  # noqa: E402
+
+from gradients import sobel_gradients  # noqa: E402
+from pipeline import edge_detection_graph, smooth, taper  # noqa: E402
+
+SIGMA_T = unit("10 year")
+SIGMA_D = unit("500 km")
+WEIGHTS = [unit("1 year"), unit("10 km"), unit("10 km")]
+
+
+def run_pipeline(box, data, dtype, upper_threshold, lower_threshold):
+    graph = edge_detection_graph(
+        box, data, np.arange(data.shape[0]), SIGMA_T, SIGMA_D, WEIGHTS,
+        upper_threshold, lower_threshold, dtype=dtype
+    )
+    return graph.get("edges").astype(bool), graph.get("abruptness")
+
+
+def test_float32_edges_and_abruptness(cmip6_box):
+    box, data = cmip6_box
+    sb = sobel_gradients(box, smooth(box, taper(data), [SIGMA_T, SIGMA_D, SIGMA_D]), WEIGHTS)
+    signal = 1 / sb[3]
+    upper_threshold, lower_threshold = np.quantile(signal, [0.99, 0.95])
+
+    edges64, abruptness64 = run_pipeline(
+        box, data, np.float64, upper_threshold, lower_threshold
+    )
+    edges32, abruptness32 = run_pipeline(
+        box, data, np.float32, upper_threshold, lower_threshold
+    )
+    assert edges64.sum() > 0
+
+    # only pixels with a signal at the threshold may flip
+    assert (edges32 != edges64).sum() <= 0.01 * edges64.sum()
+
+    common = edges32 & edges64
+    error = np.abs(abruptness32[common] - abruptness64[common])
+    assert error.max() <= 1e-3 * np.abs(abruptness64[common]).max()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from quantiles import QuantileSketch, signal_quantiles
+
+PERCENTILES = [0, 1, 25, 50, 75, 95, 99.99, 100]
+
+
+def reference_signal(gradient):
+    # the notebooks before the sketch
+    signal = 1 / gradient[3]
+    signal_no0 = np.ma.masked_equal(np.asarray(signal).reshape(-1), 0)
+    return signal, signal_no0.compressed()
+
+
+@pytest.mark.parametrize("relative_accuracy", [1e-2, 1e-3])
+def test_percentiles_within_relative_accuracy(relative_accuracy):
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=-3, sigma=2, size=100000)
+    values[rng.random(values.size) < 0.2] = 0
+
+    sketch = QuantileSketch(relative_accuracy=relative_accuracy)
+    # blocks of different sizes and a merged sketch give the same counts
+    other = QuantileSketch(relative_accuracy=relative_accuracy)
+    sketch.add(values[:1000])
+    other.add(values[1000:70000])
+    other.add(values[70000:])
+    sketch.merge(other)
+
+    for include_zeros, reference in [(False, values[values > 0]), (True, values)]:
+        result = sketch.percentile(PERCENTILES, include_zeros=include_zeros)
+        expected = np.percentile(reference, PERCENTILES, method="nearest")
+        assert np.all(np.abs(result - expected) <= relative_accuracy * expected)
+        # the linear interpolation of np.percentile is as close for this many values
+        expected = np.percentile(reference, PERCENTILES)
+        assert np.allclose(result, expected, rtol=2 * relative_accuracy)
+
+
+def test_ignores_masked_and_invalid_values():
+    values = np.ma.masked_array([0.0, 1.0, 2.0, np.inf, np.nan, -1.0, 3.0], mask=False)
+    values[2] = np.ma.masked
+    sketch = QuantileSketch()
+    sketch.add(values)
+    assert sketch.zeros == 1
+    assert sketch.count == 2
+    assert np.allclose(sketch.percentile([0, 100]), [1.0, 3.0], rtol=1e-3)
+    with pytest.raises(ValueError):
+        QuantileSketch().percentile(50)
+
+
+def test_signal_quantiles_matches_notebook_percentiles():
+    rng = np.random.default_rng(1)
+    gradient = rng.lognormal(size=(4, 50, 10, 12))
+    # sobel_filter gives inf where the gradient is zero
+    gradient[3][rng.random(gradient.shape[1:]) < 0.1] = np.inf
+
+    signal, signal_no0 = reference_signal(gradient)
+    sketch = signal_quantiles(gradient, block_size=7)
+    assert sketch.zeros == np.count_nonzero(signal == 0)
+    for q in [50, 95, 99.99]:
+        expected = np.percentile(signal_no0, q, method="nearest")
+        assert abs(sketch.percentile(q) - expected) <= 1e-3 * expected
+        expected = np.percentile(signal, q, method="nearest")
+        assert abs(sketch.percentile(q, include_zeros=True) - expected) <= 1e-3 * expected
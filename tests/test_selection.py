@@ -0,0 +1,72 @@
+import netCDF4
+import numpy as np
+import pytest
+
+from selection import read_selection, selection_slice
+
+N_YEARS = 7
+
+
+@pytest.fixture
+def monthly_file(tmp_path):
+    """Monthly tas with a masked land cell and an incomplete last year"""
+    rng = np.random.default_rng(0)
+    n_time = N_YEARS * 12 + 5
+    tas = rng.normal(280, 10, (n_time, 3, 4))
+    fpath = str(tmp_path / "tas_Amon.nc")
+    with netCDF4.Dataset(fpath, "w") as dataset:
+        dataset.createDimension("time", None)
+        dataset.createDimension("lat", 3)
+        dataset.createDimension("lon", 4)
+        var = dataset.createVariable(
+            "tas", "f4", ("time", "lat", "lon"), fill_value=np.float32(1e20)
+        )
+        var[:] = np.ma.masked_array(tas, mask=np.zeros(tas.shape, dtype=bool))
+        var[:, 0, 0] = np.ma.masked
+    with netCDF4.Dataset(fpath) as dataset:
+        return fpath, dataset.variables["tas"][:]
+
+
+@pytest.mark.parametrize("month", [1, 7, 12])
+def test_single_month(monthly_file, month):
+    fpath, monthly = monthly_file
+    data, time_slice = read_selection(fpath, "tas", month)
+    # the slicing of the full monthly record in analysis_cmip6.py
+    expected = monthly[month - 1::12]
+    assert np.array_equal(np.ma.getmaskarray(data), np.ma.getmaskarray(expected))
+    assert np.array_equal(data.compressed(), expected.compressed().astype(np.float64))
+    assert np.arange(monthly.shape[0])[time_slice].tolist() == list(
+        range(month - 1, monthly.shape[0], 12)
+    )
+
+
+@pytest.mark.parametrize("years_per_read", [1, 3, 10])
+def test_annual_mean(monthly_file, years_per_read):
+    fpath, monthly = monthly_file
+    data, time_slice = read_selection(fpath, "tas", 13, years_per_read=years_per_read)
+    # the mean over the twelve months of every complete year
+    expected = np.ma.stack([
+        monthly[12 * year:12 * (year + 1)].astype(np.float64).mean(axis=0)
+        for year in range(N_YEARS)
+    ])
+    assert data.shape == expected.shape
+    assert np.array_equal(np.ma.getmaskarray(data), np.ma.getmaskarray(expected))
+    assert np.allclose(data.compressed(), expected.compressed())
+    # one time step per year, at January
+    assert time_slice == slice(0, 12 * N_YEARS, 12)
+    assert time_slice == selection_slice(monthly.shape[0], 13)
+
+
+def test_season_uses_december_of_previous_year(monthly_file):
+    fpath, monthly = monthly_file
+    data, time_slice = read_selection(fpath, "tas", "DJF", dtype=np.float32)
+    expected = np.ma.stack([
+        monthly[12 * year - 1:12 * year + 2].astype(np.float64).mean(axis=0)
+        for year in range(1, N_YEARS + 1)
+    ])
+    assert data.dtype == np.float32
+    assert np.allclose(data.compressed(), expected.compressed())
+    assert time_slice == slice(11, 11 + 12 * N_YEARS, 12)
+
+    with pytest.raises(ValueError):
+        read_selection(fpath, "tas", 14)
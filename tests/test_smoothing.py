@@ -0,0 +1,20 @@
+import numpy as np
+
+from conftest import requires
+
+requires("hypercc")
+from hypercc.filters import gaussian_filter  # noqa: E402
+from hypercc.units import unit  # noqa: E402
+
+from smoothing import gaussian_smooth  # noqa: E402
+
+SIGMA = [unit("10 year"), unit("500 km"), unit("500 km")]
+
+
+def test_matches_gaussian_filter(cmip6_box):
+    box, data = cmip6_box
+    reference = gaussian_filter(box, data, SIGMA)
+    for workers in (1, 2, 3, 8):
+        smooth_data = gaussian_smooth(box, data, SIGMA, workers=workers)
+        assert np.array_equal(np.ma.getdata(smooth_data), np.ma.getdata(reference))
+        assert np.array_equal(np.ma.getmaskarray(smooth_data), np.ma.getmaskarray(reference))
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import xarray as xr
+
+from store import (
+    INDEX_NAME, dataset_facets, find_datasets, find_piControl, read_index,
+    rebuild_index, write_dataset)
+
+SCENARIO = "CMIP.GFDL-ESM4.1pctCO2.r1i1p1f1.Amon.tas.gr.nc"
+PICONTROL = "CMIP.GFDL-ESM4.piControl.r1i1p1f1.Amon.tas.gr.nc"
+
+
+def dataset(n_time=24):
+    return xr.Dataset(
+        {"tas": (("time", "lat", "lon"), np.ones((n_time, 4, 8), dtype=np.float32))},
+        coords={
+            "time": np.arange(n_time, dtype=float), "lat": np.linspace(-60, 60, 4),
+            "lon": np.arange(0, 360, 45.0)
+        }
+    )
+
+
+def test_dataset_facets():
+    assert dataset_facets(SCENARIO) == {
+        "activity_id": "CMIP", "source_id": "GFDL-ESM4", "experiment_id": "1pctCO2",
+        "member_id": "r1i1p1f1", "table_id": "Amon", "variable_id": "tas",
+        "grid_label": "gr"
+    }
+    facets = dataset_facets("ScenarioMIP.NOAA-GFDL.GFDL-ESM4.ssp585.r1i1p1f1.Amon.tas.gr1.nc")
+    assert facets["institution_id"] == "NOAA-GFDL"
+    assert facets["activity_id"] == "ScenarioMIP"
+    assert dataset_facets("CMIP.GFDL-ESM4.1pctCO2.r1i1p1f1.Amon.tas.gr.sh") == {}
+    assert dataset_facets("tas_Amon_GFDL-ESM4_1pctCO2_r1i1p1f1_gr_000101-010012.nc") == {}
+
+
+def test_write_and_find(tmp_path):
+    dir_store = str(tmp_path)
+    write_dataset(dataset(), dir_store, SCENARIO)
+    write_dataset(dataset(), dir_store, PICONTROL)
+
+    assert find_datasets(dir_store, source_id="GFDL-ESM4", experiment_id="1pctCO2") == [
+        os.path.join(dir_store, SCENARIO)
+    ]
+    assert find_piControl(dir_store, SCENARIO) == os.path.join(dir_store, PICONTROL)
+    assert read_index(dir_store)[SCENARIO]["chunks"] == [1, 4, 8]
+
+    os.remove(os.path.join(dir_store, INDEX_NAME))
+    assert sorted(rebuild_index(dir_store)) == [SCENARIO, PICONTROL]
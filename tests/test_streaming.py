@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from conftest import requires
+
+requires("hypercc")
+requires("hyper_canny")
+from hypercc.filters import gaussian_filter  # noqa: E402
+from hypercc.units import unit  # noqa: E402
+
+from gradients import canny_view, sobel_gradients  # noqa: E402
+from pipeline import taper  # noqa: E402
+from streaming import open_output, streaming_smooth, streaming_sobel  # noqa: E402
+
+SIGMA = [unit("3 year"), unit("500 km"), unit("500 km")]
+WEIGHT = [unit("1 year"), unit("10 km"), unit("10 km")]
+
+
+@pytest.mark.parametrize("block_size", [7, 25, 1000])
+def test_smooth_matches_gaussian_filter(cmip6_box, block_size):
+    box, data = cmip6_box
+    reference = np.ma.getdata(gaussian_filter(box, data, SIGMA))
+    smooth_data = streaming_smooth(box, data, SIGMA, block_size=block_size, taper=False)
+    assert np.array_equal(smooth_data, reference)
+
+
+def test_taper_and_smooth_to_memmap(cmip6_box, tmp_path):
+    box, data = cmip6_box
+    data = data.copy()
+    data[:, 10:15, 20:30] = np.ma.masked
+    reference = np.ma.getdata(gaussian_filter(box, taper(data), SIGMA))
+
+    out = open_output(str(tmp_path / "smooth.npy"), data.shape)
+    streaming_smooth(box, data, SIGMA, out=out, block_size=25)
+    out.flush()
+    assert np.array_equal(np.load(str(tmp_path / "smooth.npy")), reference)
+
+
+@pytest.mark.parametrize("layout", ["time", "canny"])
+def test_sobel_matches_sobel_gradients(cmip6_box, tmp_path, layout):
+    box, data = cmip6_box
+    smooth_data = np.ma.getdata(gaussian_filter(box, data, SIGMA))
+    reference = sobel_gradients(box, smooth_data, WEIGHT).astype(np.float32)
+
+    out = open_output(
+        str(tmp_path / "sobel.npy"), (4,) + smooth_data.shape, dtype=np.float32,
+        layout=layout if layout == "canny" else None
+    )
+    gradient = streaming_sobel(box, smooth_data, WEIGHT, out=out, block_size=25)
+    assert np.array_equal(gradient, reference)
+    if layout == "canny":
+        # the input of hyper_canny is the memory mapped file itself
+        assert np.shares_memory(canny_view(gradient), out)
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+from tapering import cached_tables, evict_tables, nearest_tables, taper_nearest
+
+
+def masked_field(n_time=20, n_lat=45, n_lon=90, seed=0):
+    """Smooth field with a continent and an island masked"""
+    rng = np.random.default_rng(seed)
+    lat = np.linspace(-88, 88, n_lat)
+    lon = np.linspace(0, 356, n_lon)
+    values = (
+        280 + 30 * np.cos(np.radians(lat))[None, :, None]
+        + 5 * np.sin(np.radians(lon))[None, None, :]
+        + rng.normal(0, 0.2, (n_time, 1, 1))
+    )
+    values = np.broadcast_to(values, (n_time, n_lat, n_lon)).copy()
+    mask = np.zeros((n_lat, n_lon), dtype=bool)
+    mask[10:30, 5:30] = True
+    mask[35:38, 60:64] = True
+    return np.ma.masked_array(values, mask=np.broadcast_to(mask, values.shape).copy())
+
+
+def test_valid_values_unchanged():
+    data = masked_field()
+    valid = ~np.ma.getmaskarray(data)
+    expected = np.ma.getdata(data)[valid].copy()
+    tapered = taper_nearest(data.copy())
+    assert np.array_equal(np.ma.getdata(tapered)[valid], expected)
+    assert np.array_equal(np.ma.getmaskarray(tapered), ~valid)
+
+
+def test_matches_taper_masked_area():
+    pytest.importorskip("hypercc")
+    from hypercc.filters import taper_masked_area
+
+    data = masked_field()
+    reference = data.copy()
+    taper_masked_area(reference, [0, 5, 5], 50)
+    tapered = taper_nearest(data.copy(), (0, 5, 5))
+
+    # the filled values next to the coast are used by the smoothing of the valid
+    # grid cells, further inland both methods may differ more
+    mask = np.ma.getmaskarray(data)[0]
+    tables = nearest_tables(mask)
+    coast = np.zeros(mask.size, dtype=bool)
+    coast[tables["target"][tables["distance"] <= 5]] = True
+    coast = coast.reshape(mask.shape)
+
+    error = np.abs(np.ma.getdata(tapered) - np.ma.getdata(reference))[:, coast]
+    scale = np.ptp(np.ma.compressed(data))
+    assert error.mean() <= 0.02 * scale
+    assert error.max() <= 0.1 * scale
+
+
+def test_disk_cache_is_bounded(tmp_path):
+    cache_dir = str(tmp_path)
+    masks = []
+    for i in range(4):
+        mask = np.zeros((45, 90), dtype=bool)
+        mask[i:i + 10, :20] = True
+        masks.append(mask)
+        cached_tables(mask, cache_dir=cache_dir)
+    paths = sorted(
+        (os.path.join(cache_dir, name) for name in os.listdir(cache_dir)),
+        key=os.path.getmtime
+    )
+    assert len(paths) == 4
+
+    max_size = sum(os.path.getsize(path) for path in paths[-2:])
+    evict_tables(cache_dir, max_size=max_size, keep=paths[0])
+    remaining = set(os.path.join(cache_dir, name) for name in os.listdir(cache_dir))
+    assert paths[0] in remaining
+    assert sum(os.path.getsize(path) for path in remaining) <= max_size
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from transforms import anomaly, climatology, cumulative_sum, running_mean
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    data = np.ma.masked_array(rng.normal(size=(50, 4, 5)), mask=False)
+    # land is masked at every time step, some ocean values are missing
+    data[:, 0, 0] = np.ma.masked
+    data[rng.random(data.shape) < 0.05] = np.ma.masked
+    return data
+
+
+def reference_cumulative_sum(data):
+    # the loop of the ERA5 T2m notebook
+    data_int = data * 0.0
+    for timeind in range(0, np.shape(data)[0]):
+        data_int[timeind, :, :] = np.sum(data[0:timeind, :, :], axis=0)
+    return data_int
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 120])
+def test_cumulative_sum(data, block_size):
+    expected = np.ma.filled(reference_cumulative_sum(data), 0.0)
+    result = cumulative_sum(data, exclusive=True, block_size=block_size)
+    assert np.allclose(np.ma.getdata(result), expected)
+    assert np.array_equal(np.ma.getmaskarray(result), np.ma.getmaskarray(data))
+
+    inclusive = cumulative_sum(data, block_size=block_size)
+    assert np.allclose(np.ma.getdata(inclusive), np.cumsum(data.filled(0.0), axis=0))
+
+    # in place
+    cumulative_sum(data, exclusive=True, out=data, block_size=block_size)
+    assert np.allclose(data.data, expected)
+
+
+@pytest.mark.parametrize("window", [1, 5, 15])
+@pytest.mark.parametrize("block_size", [1, 7, 120])
+def test_running_mean(data, window, block_size):
+    half = window // 2
+    expected = np.stack([
+        np.ma.mean(data[max(t - half, 0):t + half + 1], axis=0).filled(0.0)
+        for t in range(data.shape[0])
+    ])
+    result = running_mean(data, window, block_size=block_size)
+    assert np.allclose(np.ma.getdata(result), expected)
+
+    running_mean(data, window, out=data, block_size=block_size)
+    assert np.allclose(data.data, expected)
+
+    with pytest.raises(ValueError):
+        running_mean(data, 4)
+
+
+@pytest.mark.parametrize("block_size", [5, 7, 120])
+def test_climatology_and_anomaly(data, block_size):
+    period = 12
+    expected = np.stack([
+        np.ma.mean(data[phase::period], axis=0).filled(0.0) for phase in range(period)
+    ])
+    assert np.allclose(climatology(data, period, block_size=block_size), expected)
+
+    phase = np.arange(data.shape[0]) % period
+    expected = data.filled(0.0) - expected[phase]
+    result = anomaly(data, period, block_size=block_size)
+    assert np.allclose(np.ma.getdata(result), expected)
+    assert np.array_equal(np.ma.getmaskarray(result), np.ma.getmaskarray(data))
@@ -0,0 +1,126 @@
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+
+import pytest
+
+from wget_engine import Downloader, WgetFile, parse_wget_script
+
+CONTENT = bytes(range(256)) * 4096
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves CONTENT with range requests. The first request of /truncated only sends
+    half of the file, the first request of /corrupt sends wrong bytes
+    """
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        n_requests = sum(path == self.path for path, _ in self.server.requests)
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+        body = CONTENT[start:]
+        if self.path == "/corrupt" and n_requests == 1:
+            body = bytes(len(body))
+
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.path == "/truncated" and n_requests == 1:
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def downloader(tmp_path):
+    return Downloader(str(tmp_path), workers=4, retries=3, timeout=10, backoff=0)
+
+
+def test_resume(server, tmp_path):
+    (tmp_path / "a.nc.part").write_bytes(CONTENT[:1000])
+    result = downloader(tmp_path).fetch(WgetFile("a.nc", url(server, "/a"), "sha256", SHA256))
+    assert result.status == "downloaded"
+    assert result.bytes == len(CONTENT) - 1000
+    assert server.requests == [("/a", "bytes=1000-")]
+    assert (tmp_path / "a.nc").read_bytes() == CONTENT
+    assert not (tmp_path / "a.nc.part").exists()
+
+
+def test_truncated(server, tmp_path):
+    result = downloader(tmp_path).fetch(
+        WgetFile("t.nc", url(server, "/truncated"), "sha256", SHA256)
+    )
+    assert result.status == "downloaded"
+    assert result.attempts == 2
+    # the second request continues after the received part
+    assert server.requests[1][1] is not None
+    assert (tmp_path / "t.nc").read_bytes() == CONTENT
+
+
+def test_corrupt(server, tmp_path):
+    result = downloader(tmp_path).fetch(
+        WgetFile("c.nc", url(server, "/corrupt"), "sha256", SHA256)
+    )
+    assert result.status == "downloaded"
+    assert result.attempts == 2
+    # a corrupt part is not resumed
+    assert server.requests[1] == ("/corrupt", None)
+    assert (tmp_path / "c.nc").read_bytes() == CONTENT
+
+
+def test_skip_verified(server, tmp_path):
+    (tmp_path / "s.nc").write_bytes(CONTENT)
+    result = downloader(tmp_path).fetch(WgetFile("s.nc", url(server, "/s"), "sha256", SHA256))
+    assert result.status == "skipped"
+    assert server.requests == []
+
+
+def test_missing_and_unknown_checksums(server, tmp_path):
+    files = [
+        WgetFile("empty.nc", url(server, "/empty"), "", ""),
+        WgetFile("unknown.nc", url(server, "/unknown"), "crc99", "1234"),
+        WgetFile("ok.nc", url(server, "/ok"), "sha256", SHA256),
+    ]
+    results = downloader(tmp_path).download(files)
+    assert [result.status for result in results] == ["downloaded", "failed", "downloaded"]
+    assert not os.path.exists(tmp_path / "unknown.nc")
+
+
+def test_parse_wget_script(tmp_path):
+    script = tmp_path / "wget.sh"
+    script.write_text(
+        "#!/bin/bash\n"
+        "download_files=\"$(cat <<EOF--dataset.file.url.chksum_type.chksum\n"
+        "'a.nc' 'http://host/a.nc' 'SHA256' 'ABC'\n"
+        "'b.nc' 'http://host/b.nc' '' ''\n"
+        "EOF--dataset.file.url.chksum_type.chksum\n"
+        ")\"\n"
+    )
+    assert parse_wget_script(str(script)) == [
+        WgetFile("a.nc", "http://host/a.nc", "sha256", "abc"),
+        WgetFile("b.nc", "http://host/b.nc", "", ""),
+    ]
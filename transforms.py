@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" transforms.py
+
+Transforms of the data along time that are applied before the smoothing, e.g. to
+detect edges in accumulated fields (cumulative sum), in a running mean or in the
+anomaly with respect to the climatology. All transforms take linear time in the
+number of time steps and process the data in blocks along time, so they can run on
+memory mapped or netCDF data and in place (out=data).
+
+Example:
+    # data_int[t] = np.sum(data[0:t], axis=0) for every t
+    data_int = cumulative_sum(data, exclusive=True)
+    smooth_data = gaussian_filter(box, data_int, [sigma_t, sigma_d, sigma_d])
+"""
+# ---------------------------------------------------------------------------
+import numpy as np
+
+
+def _output(data, out):
+    """Output array: a float copy of the shape (and mask) of data if out is None"""
+    if out is None:
+        dtype = data.dtype if np.issubdtype(data.dtype, np.floating) else np.float64
+        out = np.empty(data.shape, dtype=dtype)
+        if np.ma.isMaskedArray(data):
+            out = np.ma.masked_array(out, mask=np.ma.getmaskarray(data).copy())
+    return out
+
+
+def _read(data, start, stop):
+    """Block of data as float64 with masked values set to zero, and whether the
+    values are valid (not masked)
+    """
+    block = np.ma.asarray(data[start:stop], dtype=np.float64)
+    return np.ma.filled(block, 0.0), ~np.ma.getmaskarray(block)
+
+
+def _write(out, start, stop, values):
+    np.ma.getdata(out)[start:stop] = values
+
+
+def cumulative_sum(data, exclusive=False, out=None, block_size=120):
+    """Cumulative sum along time, masked values count as zero
+
+    Args:
+        data (array like): data (time, lat, lon)
+    Optional:
+        exclusive (boolean): if True, out[t] is the sum of data[0:t] (so out[0] is
+            zero), otherwise of data[0:t+1]
+        out (array like): output, may be data itself to transform in place
+        block_size (int): number of time steps per block
+
+    Returns:
+        out (array like): cumulative sum
+    """
+    out = _output(data, out)
+    total = np.zeros(data.shape[1:], dtype=np.float64)
+    for start in range(0, data.shape[0], block_size):
+        stop = min(start + block_size, data.shape[0])
+        block, _ = _read(data, start, stop)
+        summed = np.cumsum(block, axis=0)
+        summed += total
+        total = summed[-1].copy()
+        if exclusive:
+            summed -= block
+        _write(out, start, stop, summed)
+    return out
+
+
+def running_mean(data, window, out=None, block_size=120):
+    """Centred running mean along time over window time steps, shorter windows are
+    used at the start and end. Masked values are left out of the mean.
+
+    Args:
+        data (array like): data (time, lat, lon)
+        window (int): odd number of time steps of the window
+    Optional:
+        out (array like): output, may be data itself to transform in place
+        block_size (int): number of time steps per block
+
+    Returns:
+        out (array like): running mean
+    """
+    if window < 1 or window % 2 == 0:
+        raise ValueError("window must be a positive odd number of time steps")
+    out = _output(data, out)
+    half = window // 2
+    n_time = data.shape[0]
+    # the last half time steps of the previous block, kept because out may be data
+    tail = np.zeros((0,) + data.shape[1:])
+    tail_count = np.zeros((0,) + data.shape[1:])
+
+    for start in range(0, n_time, block_size):
+        stop = min(start + block_size, n_time)
+        ahead = min(stop + half, n_time)
+        block, valid = _read(data, start, ahead)
+        values = np.concatenate([tail, block])
+        counts = np.concatenate([tail_count, valid])
+        # values holds the time steps first_time to ahead
+        first_time = start - len(tail)
+
+        cumulative = np.zeros((len(values) + 1,) + values.shape[1:])
+        np.cumsum(values, axis=0, out=cumulative[1:])
+        cumulative_count = np.zeros_like(cumulative)
+        np.cumsum(counts, axis=0, out=cumulative_count[1:])
+
+        index = np.arange(start, stop) - first_time
+        low = np.maximum(index - half, 0)
+        high = np.minimum(index + half + 1, len(values))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (
+                (cumulative[high] - cumulative[low])
+                / (cumulative_count[high] - cumulative_count[low])
+            )
+        keep = slice(max(stop - half, 0) - first_time, stop - first_time)
+        tail, tail_count = values[keep], counts[keep]
+        _write(out, start, stop, np.nan_to_num(mean, nan=0.0))
+    return out
+
+
+def climatology(data, period, block_size=120):
+    """Mean of every phase of a periodic cycle, e.g. the mean of every calendar month
+
+    Args:
+        data (array like): data (time, lat, lon), starting at phase 0
+        period (int): number of time steps of a cycle, e.g. 12 for monthly data or
+            92 for daily June-August data
+    Optional:
+        block_size (int): number of time steps per block
+
+    Returns:
+        clim (np.ndarray): mean of every phase (period, lat, lon)
+    """
+    total = np.zeros((period,) + data.shape[1:])
+    count = np.zeros((period,) + data.shape[1:])
+    for start in range(0, data.shape[0], block_size):
+        stop = min(start + block_size, data.shape[0])
+        phase = np.arange(start, stop) % period
+        values, valid = _read(data, start, stop)
+        np.add.at(total, phase, values)
+        np.add.at(count, phase, valid)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nan_to_num(total / count, nan=0.0)
+
+
+def anomaly(data, period, out=None, block_size=120):
+    """Anomaly with respect to the climatology (see climatology)
+
+    Args:
+        data (array like): data (time, lat, lon), starting at phase 0
+        period (int): number of time steps of a cycle
+    Optional:
+        out (array like): output, may be data itself to transform in place
+        block_size (int): number of time steps per block
+
+    Returns:
+        out (array like): data minus the climatology of its phase
+    """
+    clim = climatology(data, period, block_size=block_size)
+    out = _output(data, out)
+    for start in range(0, data.shape[0], block_size):
+        stop = min(start + block_size, data.shape[0])
+        values, _ = _read(data, start, stop)
+        _write(out, start, stop, values - clim[np.arange(start, stop) % period])
+    return out
+
+
+# transforms by name, e.g. for pipeline.edge_detection_graph
+TRANSFORMS = {
+    "cumulative_sum": cumulative_sum,
+    "running_mean": running_mean,
+    "anomaly": anomaly
+}
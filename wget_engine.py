@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+# Created By: Sjoerd Terpstra
+# Created Date: 17/10/2026
+# ---------------------------------------------------------------------------
+""" wget_engine.py
+
+Download the files of ESGF wget scripts without running the scripts. The file names,
+urls and checksums are read from the scripts and the files of several scripts are
+downloaded at the same time by a pool of threads, with a limit on the number of
+connections per host and optionally on the total bandwidth. Interrupted downloads
+are resumed with HTTP range requests and every file is verified with its checksum
+before it is moved to its final name.
+
+Example:
+    downloader = Downloader(DIR_DATATEMP, workers=8, per_host=4)
+    results = downloader.download(
+        parse_wget_script(wget_var_path) + parse_wget_script(wget_piControl_path)
+    )
+    print_report(results)
+"""
+# ---------------------------------------------------------------------------
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import http.client
+import os
+import shlex
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# marks the start and end of the file list in the wget scripts of ESGF
+FILE_LIST_MARKER = "EOF--dataset.file.url.chksum_type.chksum"
+
+BLOCK_SIZE = 1024**2
+
+WgetFile = namedtuple("WgetFile", ["fname", "url", "checksum_type", "checksum"])
+
+# result of a single download, status is "downloaded", "skipped" or "failed"
+DownloadResult = namedtuple(
+    "DownloadResult", ["file", "status", "bytes", "seconds", "attempts", "error"]
+)
+
+
+class ChecksumError(Exception):
+    """The checksum of a downloaded file does not match the wget script"""
+
+
+class IncompleteDownload(Exception):
+    """The connection was closed before the whole file was received, the part that
+    was received is kept and resumed
+    """
+
+
+def parse_wget_script(fpath):
+    """Read the file list of an ESGF wget script
+
+    Args:
+        fpath (str): path to the wget script
+
+    Returns:
+        files (list): list of WgetFile
+    """
+    files = []
+    in_list = False
+    with open(fpath, "r") as reader:
+        for line in reader:
+            if FILE_LIST_MARKER in line:
+                if in_list:
+                    break
+                in_list = True
+                continue
+            if not in_list or not line.strip():
+                continue
+            # the checksum (type) may be missing
+            fname, url, checksum_type, checksum = (shlex.split(line) + ["", ""])[:4]
+            files.append(WgetFile(fname, url, checksum_type.lower(), checksum.lower()))
+    return files
+
+
+def file_checksum(fpath, checksum_type="sha256"):
+    """Return the hexadecimal checksum (e.g. sha256 or md5) of the content of fpath"""
+    checksum = hashlib.new(checksum_type)
+    with open(fpath, "rb") as reader:
+        for block in iter(lambda: reader.read(BLOCK_SIZE), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+class RateLimiter:
+    """Limit the total number of bytes per second of all threads together
+
+    Args:
+        bytes_per_second (float): maximum rate, None for no limit
+    """
+
+    def __init__(self, bytes_per_second=None):
+        self.bytes_per_second = bytes_per_second
+        self._lock = threading.Lock()
+        # time at which the bytes consumed so far are paid for
+        self._next = time.monotonic()
+
+    def consume(self, n_bytes):
+        """Wait until n_bytes may be used"""
+        if not self.bytes_per_second:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now) + n_bytes / self.bytes_per_second
+            delay = self._next - now
+        time.sleep(delay)
+
+
+class Downloader:
+    """Concurrent downloader of the files of ESGF wget scripts
+
+    Args:
+        dir (str): directory to save the files in
+    Optional:
+        workers (int): number of files downloaded at the same time
+        per_host (int): maximum number of connections to a single host
+        bytes_per_second (float): maximum total bandwidth, None for no limit
+        retries (int): number of attempts per file
+        timeout (float): timeout of the connection in seconds
+        backoff (float): seconds to wait before the first retry, doubled for every
+            next retry
+    """
+
+    def __init__(
+            self, dir, workers=8, per_host=2, bytes_per_second=None, retries=3,
+            timeout=60, backoff=5):
+        self.dir = dir
+        self.workers = workers
+        self.per_host = per_host
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.limiter = RateLimiter(bytes_per_second)
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir)
+
+    def _host_slot(self, url):
+        """Semaphore limiting the connections to the host of url"""
+        host = urllib.parse.urlsplit(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    def _verified(self, file, fpath):
+        if not (file.checksum_type and file.checksum):
+            # the wget script has no checksum for this file, nothing to verify
+            return True
+        return file_checksum(fpath, file.checksum_type) == file.checksum
+
+    def _fetch(self, file, part_path):
+        """Download file.url to part_path, continuing after the bytes already in
+        part_path. Returns the number of downloaded bytes.
+        """
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        request = urllib.request.Request(file.url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as error:
+            if error.code == 416 and offset:
+                # the part is already complete (or invalid, which the checksum shows)
+                return 0
+            raise
+
+        with response:
+            content_range = response.headers.get("Content-Range", "")
+            if offset and not (
+                    response.status == 206 and content_range.startswith(f"bytes {offset}-")):
+                # the server ignored the range, start from the beginning
+                offset = 0
+            n_bytes = 0
+            with open(part_path, "ab" if offset else "wb") as writer:
+                for block in iter(lambda: response.read(BLOCK_SIZE), b""):
+                    self.limiter.consume(len(block))
+                    writer.write(block)
+                    n_bytes += len(block)
+            length = response.headers.get("Content-Length")
+        if length is not None and n_bytes < int(length):
+            raise IncompleteDownload(f"received {n_bytes} of {length} bytes of {file.fname}")
+        return n_bytes
+
+    def fetch(self, file):
+        """Download a single file, with resume and checksum verification
+
+        Args:
+            file (WgetFile): file to download
+
+        Returns:
+            result (DownloadResult): result of the download
+        """
+        fpath = os.path.join(self.dir, file.fname)
+        part_path = fpath + ".part"
+        start = time.monotonic()
+        if file.checksum and file.checksum_type and \
+                file.checksum_type not in hashlib.algorithms_available:
+            # the file could never be verified, downloading it won't help
+            return DownloadResult(file, "failed", 0, 0.0, 0, ChecksumError(
+                f"unsupported checksum type {file.checksum_type!r} of {file.fname}"
+            ))
+        if os.path.isfile(fpath) and self._verified(file, fpath):
+            return DownloadResult(file, "skipped", 0, 0.0, 0, None)
+
+        n_bytes = 0
+        error = None
+        for attempt in range(1, self.retries + 1):
+            try:
+                with self._host_slot(file.url):
+                    n_bytes += self._fetch(file, part_path)
+                if not self._verified(file, part_path):
+                    # a corrupt part cannot be resumed
+                    os.remove(part_path)
+                    raise ChecksumError(f"{file.checksum_type} of {file.fname} does not match")
+                os.replace(part_path, fpath)
+                return DownloadResult(
+                    file, "downloaded", n_bytes, time.monotonic() - start, attempt, None
+                )
+            except (
+                    OSError, http.client.HTTPException, ChecksumError,
+                    IncompleteDownload) as exception:
+                error = exception
+                if isinstance(exception, urllib.error.HTTPError) and \
+                        400 <= exception.code < 500 and exception.code not in (408, 429):
+                    # the file does not exist or access is denied, retrying won't help
+                    return DownloadResult(
+                        file, "failed", n_bytes, time.monotonic() - start, attempt, error
+                    )
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2**(attempt - 1))
+        return DownloadResult(
+            file, "failed", n_bytes, time.monotonic() - start, self.retries, error
+        )
+
+    def download(self, files):
+        """Download files concurrently
+
+        Args:
+            files (list): list of WgetFile, e.g. of several wget scripts
+
+        Returns:
+            results (list): DownloadResult of every file, in the order of files
+        """
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(files)))) as executor:
+            return list(executor.map(self.fetch, files))
+
+
+def download_wget_scripts(fpaths, dir, **kwargs):
+    """Download the files of several wget scripts at the same time
+
+    Args:
+        fpaths (list): paths to the wget scripts
+        dir (str): directory to save the files in
+    Optional:
+        **kwargs: options of Downloader
+
+    Returns:
+        results (list): list of DownloadResult
+    """
+    files = []
+    for fpath in fpaths:
+        files.extend(parse_wget_script(fpath))
+    return Downloader(dir, **kwargs).download(files)
+
+
+def print_report(results, seconds=None):
+    """Print the status of every file and the total throughput
+
+    Args:
+        results (list): list of DownloadResult
+    Optional:
+        seconds (float): wall time of the downloads, for the throughput
+    """
+    for result in results:
+        line = f"{result.status:>10} {result.file.fname}"
+        if result.status == "failed":
+            line += f" ({result.error})"
+        print(line)
+    n_failed = sum(result.status == "failed" for result in results)
+    mib = sum(result.bytes for result in results) / 1024**2
+    print(f"{len(results) - n_failed}/{len(results)} files, {mib:.1f} MiB", end="")
+    print(f" in {seconds:.1f} s ({mib / seconds:.1f} MiB/s)" if seconds else "")